@@ -1,6 +1,67 @@
 from django.apps import AppConfig
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.db.models.signals import class_prepared, m2m_changed, post_save
 
 
 class BooksApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "books_api"
+
+    def ready(self):
+        from books_api import (
+            cache,
+            database,
+            deletion,
+            documents,
+            metrics,
+            search,
+            stats,
+            versions,
+            write_plans,
+        )
+        from books_api.models import Author, Book, Category, Publisher
+
+        # Keep the pre-computed write plans in step with the app registry
+        class_prepared.connect(write_plans.on_class_prepared)
+        setting_changed.connect(write_plans.on_setting_changed)
+
+        write_plans.build_write_plans(self)
+
+        # Evict cached responses built from rows that have since changed
+        setting_changed.connect(cache.on_setting_changed)
+        for model_class in (Book, Author, Category, Publisher):
+            post_save.connect(cache.on_post_save, sender=model_class)
+        cache.connect_delete_receivers()
+        deletion.rows_deleted.connect(cache.on_rows_deleted)
+        m2m_changed.connect(cache.on_m2m_changed)
+
+        # Stamp both ends of a changed many-to-many link as updated
+        m2m_changed.connect(versions.on_m2m_changed)
+
+        # Keep the full-text search index in step with the rows it is built from
+        for model_class in (Book, Author, Category, Publisher):
+            post_save.connect(search.on_post_save, sender=model_class)
+        deletion.rows_deleted.connect(search.on_rows_deleted)
+        m2m_changed.connect(search.on_m2m_changed)
+
+        # Rebuild the stored response documents of Books whose rendering has
+        # changed. Connected after versions, whose new stamps they include.
+        setting_changed.connect(documents.on_setting_changed)
+        for model_class in (Book, Author, Category, Publisher):
+            post_save.connect(documents.on_post_save, sender=model_class)
+        documents.connect_delete_receivers()
+        deletion.rows_deleted.connect(documents.on_rows_deleted)
+        m2m_changed.connect(documents.on_m2m_changed)
+
+        # Stop serving cached statistics once any of the rows they cover change
+        for model_class in (Book, Author, Category, Publisher):
+            post_save.connect(stats.on_change, sender=model_class)
+        deletion.rows_deleted.connect(stats.on_rows_deleted)
+        m2m_changed.connect(stats.on_m2m_changed)
+
+        # Tune each new SQLite connection as configured by the database profile
+        connection_created.connect(database.on_connection_created)
+
+        # Count the queries of each request served, for books_api.metrics
+        connection_created.connect(metrics.on_connection_created)
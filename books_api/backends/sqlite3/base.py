@@ -0,0 +1,42 @@
+"""
+Django's SQLite backend, with the "transaction_mode" option added in Django
+5.1 backported:
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "books_api.backends.sqlite3",
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+            ...
+        }
+    }
+
+Django starts transactions with a plain BEGIN, which defers taking the write
+lock until the first write. A transaction that reads before it writes, such
+as bulk_patch_objects()'s, then can't wait for the lock with the busy
+timeout: if another connection has written since the read, SQLite fails it
+straight away with "database is locked". BEGIN IMMEDIATE takes the write lock
+up front, where the busy timeout applies.
+
+Once on Django 5.1, the ENGINE can go back to django.db.backends.sqlite3,
+keeping the same OPTIONS.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.transaction_mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not an argument sqlite3.connect() accepts
+        params.pop("transaction_mode", None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
@@ -0,0 +1,387 @@
+"""
+A cache of serialised GET responses, invalidated by model signals.
+
+Each cached response is tagged with the objects rendered in its body (for
+example a Book, its Publisher and its Authors) and, for list responses, with
+the listed model as a whole. Saving, deleting or re-linking an object then
+evicts exactly the responses tagged with it, so a response is never served
+after the rows it was built from have changed.
+
+The cache is opt-in, and is configured with the BOOKS_API_RESPONSE_CACHE
+setting:
+
+    BOOKS_API_RESPONSE_CACHE = {
+        # "locmem" (the default) keeps responses in a per-process LRU, "django"
+        # keeps them in one of the CACHES, so that processes can share them.
+        "BACKEND": "locmem",
+        # Bound on the number of responses kept by the "locmem" backend
+        "MAX_ENTRIES": 1000,
+        # The CACHES alias used by the "django" backend
+        "CACHE_ALIAS": "default",
+        # Seconds a response is kept for. Defaults to 300 for the "django"
+        # backend, and to None, for as long as it is valid, for "locmem".
+        "TIMEOUT": 300,
+    }
+
+The "locmem" backend is for single-process deployments. Each process keeps
+its own responses and only evicts them on the writes it makes itself, so
+with several worker processes, one would keep serving a response after
+another had changed the rows it was built from. Deployments with more than
+one process should use the "django" backend with a shared cache, such as
+Redis or memcached, or at least bound how stale responses can get with a
+TIMEOUT.
+
+The counts of hits, misses and evictions are exported by books_api.metrics.
+
+Writes that bypass model signals, such as QuerySet.bulk_create() and
+bulk_update(), must call invalidate_instances() or invalidate_tags()
+themselves; the bulk helpers in books_api.helpers do.
+
+Deletes made with books_api.deletion.delete_queryset(), as the delete helpers
+make them, are invalidated once per delete by on_rows_deleted(). The per-row
+delete receivers, for other deletes, are only connected while the cache is
+enabled, since any delete receiver stops Django deleting cascaded rows
+without loading them.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.fields.related import ForeignKey
+from django.db.models.signals import post_delete, pre_delete
+
+from books_api.deletion import TRACKED_MODELS, Deletion, batched_delete_in_progress
+from books_api.versions import linked_pks
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    content_type: str
+    content: bytes
+    tags: frozenset[str]
+
+
+def object_tag(model_class: type[Model], pk) -> str:
+    return f"{model_class._meta.label_lower}:{pk}"
+
+
+def reverse_tag(model_class: type[Model], pk) -> str:
+    """
+    Tag of responses rendering the objects whose foreign keys point to an
+    object, such as a Publisher listing its Books.
+    """
+    return f"{model_class._meta.label_lower}:{pk}:reverse"
+
+
+def collection_tag(model_class: type[Model]) -> str:
+    return f"{model_class._meta.label_lower}:*"
+
+
+class LocMemResponseCache:
+    """
+    A bounded, least recently used store of responses, with an index from
+    each tag to the keys of the responses carrying it. Given a timeout,
+    responses older than it are treated as misses. Only invalidations made
+    in this process reach it (see the module docstring).
+    """
+
+    def __init__(
+        self, max_entries: int = 1000, timeout: Optional[float] = None
+    ) -> None:
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._expires_at: dict[str, float] = {}
+        self._keys_by_tag: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            expires_at = self._expires_at.get(key)
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            if self.timeout is not None:
+                self._expires_at[key] = time.monotonic() + self.timeout
+            for tag in entry.tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expires_at.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._expires_at.pop(key, None)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class DjangoResponseCache:
+    """
+    Responses kept in one of the CACHES. Cache backends can't enumerate keys
+    by tag, so each tag instead has a version number, which invalidation
+    bumps. An entry records the versions of its tags when it was stored, and
+    is treated as a miss once any of them has moved on.
+
+    Evictions are up to the cache backend, so aren't counted here.
+    """
+
+    def __init__(self, cache_alias: str = "default", timeout: int = 300) -> None:
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        stored = self.cache.get(self._entry_key(key))
+        if stored is not None:
+            entry, tag_versions = stored
+            if self._tag_versions(entry.tags) == tag_versions:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        self.cache.set(
+            self._entry_key(key),
+            (entry, self._tag_versions(entry.tags)),
+            self.timeout,
+        )
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            try:
+                self.cache.incr(self._tag_key(tag))
+            except ValueError:
+                # Nothing has been stored under this tag yet
+                pass
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def _tag_versions(self, tags: Iterable[str]) -> dict[str, int]:
+        keys = {tag: self._tag_key(tag) for tag in tags}
+        versions = self.cache.get_many(keys.values())
+        # A tag whose version has itself been evicted restarts from the
+        # current time, rather than from a number an older entry may hold.
+        missing = {key: time.time_ns() for key in keys.values() if key not in versions}
+        if missing:
+            self.cache.set_many(missing, None)
+            versions.update(missing)
+        return {tag: versions[key] for tag, key in keys.items()}
+
+    @staticmethod
+    def _entry_key(key: str) -> str:
+        return "books_api:response:" + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"books_api:tag:{tag}"
+
+
+_response_cache = None
+_response_cache_configured = False
+
+
+def get_response_cache():
+    """
+    The response cache configured by BOOKS_API_RESPONSE_CACHE, or None if
+    response caching isn't enabled.
+    """
+    global _response_cache, _response_cache_configured
+
+    if not _response_cache_configured:
+        config = getattr(settings, "BOOKS_API_RESPONSE_CACHE", None)
+        if config is None:
+            _response_cache = None
+        elif config.get("BACKEND", "locmem") == "django":
+            _response_cache = DjangoResponseCache(
+                config.get("CACHE_ALIAS", "default"), config.get("TIMEOUT", 300)
+            )
+        else:
+            _response_cache = LocMemResponseCache(
+                config.get("MAX_ENTRIES", 1000), config.get("TIMEOUT")
+            )
+        _response_cache_configured = True
+
+    return _response_cache
+
+
+def on_setting_changed(setting: str, **kwargs) -> None:
+    global _response_cache_configured
+    if setting in ("BOOKS_API_RESPONSE_CACHE", "CACHES"):
+        _response_cache_configured = False
+    if setting == "BOOKS_API_RESPONSE_CACHE":
+        connect_delete_receivers()
+
+
+def connect_delete_receivers() -> None:
+    """
+    Connect the per-row delete receivers if response caching is enabled, and
+    disconnect them if not.
+    """
+    enabled = getattr(settings, "BOOKS_API_RESPONSE_CACHE", None) is not None
+    for model_class in TRACKED_MODELS:
+        if enabled:
+            pre_delete.connect(on_pre_delete, sender=model_class)
+            post_delete.connect(on_post_delete, sender=model_class)
+        else:
+            pre_delete.disconnect(on_pre_delete, sender=model_class)
+            post_delete.disconnect(on_post_delete, sender=model_class)
+
+
+def invalidate_tags(tags: Iterable[str]) -> None:
+    """
+    Evict the responses carrying any of tags, both now and once the current
+    transaction commits, so that a response cached from another connection's
+    view of the rows before the commit is not kept either.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+
+    tags = set(tags)
+    cache.invalidate(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.invalidate(tags))
+
+
+def instance_tags(instance: Model, created: bool = False) -> set[str]:
+    """
+    The tags of the responses affected by saving instance: those rendering
+    it and those listing it under the objects its foreign keys point to.
+    Creating an instance also changes the lists of its model.
+    """
+    tags = {object_tag(type(instance), instance.pk)}
+    for field_meta in instance._meta.concrete_fields:
+        if isinstance(field_meta, ForeignKey):
+            related_pk = getattr(instance, field_meta.attname)
+            if related_pk is not None:
+                tags.add(reverse_tag(field_meta.related_model, related_pk))
+    if created:
+        tags.add(collection_tag(type(instance)))
+    return tags
+
+
+def invalidate_instances(instances: Iterable[Model], created: bool = False) -> None:
+    tags: set[str] = set()
+    for instance in instances:
+        tags |= instance_tags(instance, created)
+    invalidate_tags(tags)
+
+
+def _linked_tags(instance: Model, through: Optional[type[Model]] = None) -> set[str]:
+    return {
+        object_tag(related_model, pk)
+        for related_model, pks in linked_pks(instance, through).items()
+        for pk in pks
+    }
+
+
+def on_post_save(sender: type[Model], instance: Model, created: bool, **kwargs) -> None:
+    invalidate_instances([instance], created)
+
+
+def on_pre_delete(sender: type[Model], instance: Model, **kwargs) -> None:
+    # Deleting an object removes its many-to-many links without sending
+    # m2m_changed, so the objects it is linked to are found while the links
+    # still exist.
+    if get_response_cache() is not None and not batched_delete_in_progress():
+        instance._response_cache_linked_tags = _linked_tags(instance)
+
+
+def on_post_delete(sender: type[Model], instance: Model, **kwargs) -> None:
+    if batched_delete_in_progress():
+        return
+    tags = instance_tags(instance, created=True)
+    tags |= getattr(instance, "_response_cache_linked_tags", set())
+    invalidate_tags(tags)
+
+
+def on_rows_deleted(sender: type[Model], deletion: Deletion, **kwargs) -> None:
+    """
+    Evict the responses rendering any deleted row, listing its model, or
+    listing the rows under the objects they pointed to or were linked to.
+    """
+    if get_response_cache() is None:
+        return
+
+    tags: set[str] = set()
+    for model_class, pks in deletion.deleted.items():
+        tags.add(collection_tag(model_class))
+        tags |= {object_tag(model_class, pk) for pk in pks}
+    for model_class, pks in deletion.referenced.items():
+        tags |= {reverse_tag(model_class, pk) for pk in pks}
+    for model_class, pks in deletion.unlinked.items():
+        tags |= {object_tag(model_class, pk) for pk in pks}
+    invalidate_tags(tags)
+
+
+def on_m2m_changed(
+    sender: type[Model],
+    instance: Model,
+    action: str,
+    model: type[Model],
+    pk_set: Optional[set],
+    **kwargs,
+) -> None:
+    if instance._meta.app_label != "books_api" or get_response_cache() is None:
+        return
+
+    if action == "pre_clear":
+        instance._response_cache_linked_tags = _linked_tags(instance, sender)
+    elif action in ("post_add", "post_remove"):
+        invalidate_tags(
+            {object_tag(type(instance), instance.pk)}
+            | {object_tag(model, pk) for pk in pk_set}
+        )
+    elif action == "post_clear":
+        invalidate_tags(
+            {object_tag(type(instance), instance.pk)}
+            | getattr(instance, "_response_cache_linked_tags", set())
+        )
@@ -0,0 +1,83 @@
+"""
+Per-connection SQLite tuning, and pinning reads to the primary database.
+
+Most of SQLite's settings, such as its page cache size and busy timeout,
+last only as long as the connection they are set on. The PRAGMAs named by
+the BOOKS_API_SQLITE_PRAGMAS setting are therefore applied to every new
+connection, as it is opened:
+
+    BOOKS_API_SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "busy_timeout": 20000,
+    }
+
+The production database profile in django_books_api.settings sets these.
+
+When read replicas are configured, reads are routed to them (see
+django_books_api.db_routers) except while pinned to the primary, which
+writes are: a write's own reads, such as fetching the object a PATCH
+modifies, must see the primary's current rows rather than a replica's
+possibly lagging copy.
+"""
+
+import functools
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+# A context variable rather than a thread local, so that pinning carries over
+# to the threads async code runs the ORM in
+_primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+def apply_pragmas(connection: BaseDatabaseWrapper, pragmas: dict) -> None:
+    # Executed on the DB-API connection directly, so that the PRAGMAs aren't
+    # logged as queries of whatever caused the connection to be opened
+    for name, value in pragmas.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}").fetchall()
+
+
+def on_connection_created(sender, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    if connection.vendor != "sqlite":
+        return
+    apply_pragmas(connection, getattr(settings, "BOOKS_API_SQLITE_PRAGMAS", {}))
+
+
+def primary_pinned() -> bool:
+    return _primary_pinned.get()
+
+
+@contextmanager
+def pin_to_primary() -> Iterator[None]:
+    """Route every read made within the block to the primary database."""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def on_primary(func: Callable) -> Callable:
+    """
+    Decorate a sync or async function so that it runs pinned to the
+    primary database.
+    """
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with pin_to_primary():
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pin_to_primary():
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,154 @@
+"""
+Deletes whose side effects are handled once per delete, rather than once
+per deleted row.
+
+Django deletes cascaded rows without loading them ("fast deletes") only
+when no pre_delete or post_delete receivers are connected for their model.
+Per-row receivers also run once for every row a delete takes out, cascades
+included, so deleting a Publisher with hundreds of Books would run each of
+them hundreds of times, with queries of their own.
+
+delete_queryset() instead collects what a delete takes out, finds the rows
+deleted and the links removed with a few queries, deletes, and sends
+rows_deleted once, with a Deletion describing it all. The response cache,
+search index, Book documents and statistics catch up from that (see their
+on_rows_deleted() receivers). The delete helpers in books_api.helpers delete
+this way.
+
+The response cache and Book documents also keep per-row delete receivers,
+for deletes made some other way, such as Model.delete() from a shell. Those
+are connected only while the feature is enabled, and stand aside while
+delete_queryset() runs (see batched_delete_in_progress()).
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from django.db import connections, transaction
+from django.db.models import Model, QuerySet
+from django.db.models.deletion import Collector
+from django.dispatch import Signal
+
+from books_api.models import Author, Book, Category, Publisher
+
+# Sent once per delete_queryset(), after the rows have been deleted, with
+# deletion=Deletion
+rows_deleted = Signal()
+
+# The models whose deleted rows are reported, and the through tables whose
+# removed links are
+TRACKED_MODELS = (Book, Author, Category, Publisher)
+LINK_MODELS = (Author.books.through, Category.books.through)
+
+_deleting: ContextVar[bool] = ContextVar("books_api_deleting", default=False)
+
+
+def batched_delete_in_progress() -> bool:
+    """Whether the current delete is reported by rows_deleted."""
+    return _deleting.get()
+
+
+@dataclass
+class Deletion:
+    using: str
+    # The primary keys of the rows deleted, cascades included, by model
+    deleted: dict[type[Model], set] = field(default_factory=dict)
+    # The primary keys of the objects the deleted rows' foreign keys pointed
+    # to, by model
+    referenced: dict[type[Model], set] = field(default_factory=dict)
+    # The primary keys of the objects left behind that lost a many-to-many
+    # link to a deleted row, by model
+    unlinked: dict[type[Model], set] = field(default_factory=dict)
+
+    def pks(self, model_class: type[Model]) -> set:
+        return self.deleted.get(model_class, set())
+
+
+def delete_queryset(queryset: QuerySet) -> Deletion:
+    """
+    Delete the rows of queryset and everything cascading from them, then
+    send rows_deleted. Returns the Deletion sent.
+    """
+    # As QuerySet.delete() prepares its query
+    queryset = queryset._chain()
+    queryset._for_write = True
+    queryset.query.select_for_update = False
+    queryset.query.select_related = False
+    queryset.query.clear_ordering(force=True)
+
+    using = queryset.db
+    collector = Collector(using=using, origin=queryset)
+    collector.collect(queryset)
+
+    token = _deleting.set(True)
+    try:
+        with transaction.atomic(using=using, savepoint=False):
+            deletion = describe(collector, using)
+            collector.delete()
+            rows_deleted.send(sender=queryset.model, deletion=deletion)
+    finally:
+        _deleting.reset(token)
+    return deletion
+
+
+def describe(collector: Collector, using: str) -> Deletion:
+    """What a collected delete takes out, read before it runs."""
+    deletion = Deletion(using)
+    links: list[QuerySet] = []
+
+    for model_class, instances in collector.data.items():
+        if model_class in TRACKED_MODELS:
+            deletion.deleted.setdefault(model_class, set()).update(
+                instance.pk for instance in instances
+            )
+    for queryset in collector.fast_deletes:
+        if queryset.model in TRACKED_MODELS:
+            deletion.deleted.setdefault(queryset.model, set()).update(
+                queryset.values_list("pk", flat=True)
+            )
+        elif queryset.model in LINK_MODELS:
+            links.append(queryset)
+
+    for model_class, pks in deletion.deleted.items():
+        foreign_keys = [
+            field_meta
+            for field_meta in model_class._meta.concrete_fields
+            if field_meta.many_to_one and field_meta.related_model in TRACKED_MODELS
+        ]
+        if not foreign_keys:
+            continue
+        for chunk in _chunks(list(pks), using):
+            for row in (
+                model_class._base_manager.using(using)
+                .filter(pk__in=chunk)
+                .values_list(*(field_meta.attname for field_meta in foreign_keys))
+            ):
+                for field_meta, pk in zip(foreign_keys, row):
+                    if pk is not None:
+                        deletion.referenced.setdefault(
+                            field_meta.related_model, set()
+                        ).add(pk)
+
+    for queryset in links:
+        foreign_keys = [
+            field_meta
+            for field_meta in queryset.model._meta.concrete_fields
+            if field_meta.many_to_one
+        ]
+        for row in queryset.values_list(
+            *(field_meta.attname for field_meta in foreign_keys)
+        ):
+            for field_meta, pk in zip(foreign_keys, row):
+                if pk not in deletion.pks(field_meta.related_model):
+                    deletion.unlinked.setdefault(field_meta.related_model, set()).add(
+                        pk
+                    )
+
+    return deletion
+
+
+def _chunks(pks: list, using: str) -> Iterator[list]:
+    chunk_size = connections[using].features.max_query_params or len(pks) or 1
+    for start in range(0, len(pks), chunk_size):
+        yield pks[start : start + chunk_size]
@@ -0,0 +1,253 @@
+"""
+Book response bodies rendered ahead of time ("documents").
+
+Rendering a Book with a depth-2 schema means loading its publisher and
+authors and then validating each of them with pydantic, on every request.
+When the BOOKS_API_BOOK_DOCUMENTS setting is enabled, the routes set up with
+books_api.operations.serve_book_documents() instead send the JSON that was
+stored for each Book when it, or anything it renders, last changed.
+
+Documents are kept per response schema, as each route may render Books
+differently. A schema is registered by serve_book_documents(), under a key
+that changes whenever the schema does, so that documents rendered with an
+older version of a schema are never served.
+
+Model signals rebuild the documents of the Books affected by each change: a
+Book's own, and those of every Book linked to a changed Author, Category or
+Publisher. Writes that bypass signals must call rebuild_changed()
+themselves; the bulk helpers in books_api.helpers do. Deletes made with
+books_api.deletion.delete_queryset() are followed once per delete, from its
+rows_deleted signal; the per-row delete receivers, for other deletes, are
+only connected while documents are enabled. The book_documents
+management command backfills and verifies documents, and reports how stale
+they are (see staleness()), as books_api.metrics does on /metrics.
+"""
+
+import hashlib
+import json
+from importlib import import_module
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import DateTimeField, F, Max, Model
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+from pydantic import BaseModel
+
+from books_api.deletion import Deletion, batched_delete_in_progress
+from books_api.models import Author, Book, BookDocument, Category
+from books_api.querysets import with_related_lookups
+from books_api.renderers import render_json
+from books_api.search import linked_book_pks
+from books_api.serialisation import compile_extractor
+
+_schemas: dict[str, type[BaseModel]] = {}
+
+
+def documents_enabled() -> bool:
+    return getattr(settings, "BOOKS_API_BOOK_DOCUMENTS", False)
+
+
+def connect_delete_receivers() -> None:
+    """
+    Connect the per-row delete receivers if documents are enabled, and
+    disconnect them if not.
+    """
+    for model_class in (Author, Category):
+        if documents_enabled():
+            pre_delete.connect(on_pre_delete, sender=model_class)
+            post_delete.connect(on_post_delete, sender=model_class)
+        else:
+            pre_delete.disconnect(on_pre_delete, sender=model_class)
+            post_delete.disconnect(on_post_delete, sender=model_class)
+
+
+def on_setting_changed(setting: str, **kwargs) -> None:
+    if setting == "BOOKS_API_BOOK_DOCUMENTS":
+        connect_delete_receivers()
+
+
+def register_schema(schema: type[BaseModel]) -> str:
+    """Register schema for Book documents, returning its key."""
+    fingerprint = hashlib.md5(
+        json.dumps(schema.model_json_schema(), sort_keys=True).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    key = f"{schema.__name__}:{fingerprint[:12]}"
+    _schemas[key] = schema
+    return key
+
+
+def registered_schemas() -> dict[str, type[BaseModel]]:
+    # Schemas are registered as the URLconf sets up its routes, which outside
+    # of requests (in management commands, for example) may not have happened
+    import_module(settings.ROOT_URLCONF)
+    return _schemas
+
+
+def render_document(book: Book, schema: type[BaseModel]) -> str:
+    """Book serialised with schema, exactly as the API renders it."""
+    extract = compile_extractor(schema, Book)
+    data = schema.from_orm(book).model_dump() if extract is None else extract(book)
+    return render_json(data).decode()
+
+
+def build_documents(
+    pks: Iterable,
+    using: str = DEFAULT_DB_ALIAS,
+    keys: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    (Re)build the documents of the Books with the given primary keys, for
+    the schemas registered under the given keys, or all of them. Returns the
+    number of documents written.
+    """
+    pks = list(set(pks))
+    schemas = registered_schemas()
+    if keys is not None:
+        schemas = {key: schemas[key] for key in keys}
+    chunk_size = connections[using].features.max_query_params or len(pks) or 1
+
+    written = 0
+    for key, schema in schemas.items():
+        for start in range(0, len(pks), chunk_size):
+            books = with_related_lookups(
+                Book.objects.using(using).filter(
+                    pk__in=pks[start : start + chunk_size]
+                ),
+                schema,
+            )
+            built_at = timezone.now()
+            documents = [
+                BookDocument(
+                    book_id=book.pk,
+                    schema=key,
+                    content=render_document(book, schema),
+                    built_at=built_at,
+                )
+                for book in books
+            ]
+            BookDocument.objects.using(using).bulk_create(
+                documents,
+                update_conflicts=True,
+                unique_fields=["book", "schema"],
+                update_fields=["content", "built_at"],
+            )
+            written += len(documents)
+    return written
+
+
+def rebuild_changed(
+    model_class: type[Model], pks: Iterable, using: str = DEFAULT_DB_ALIAS
+) -> None:
+    """
+    Rebuild the documents rendering the objects of model_class with the
+    given primary keys, after they were written without sending signals.
+    """
+    if not documents_enabled():
+        return
+
+    pks = list(pks)
+    chunk_size = connections[using].features.max_query_params or len(pks) or 1
+    for start in range(0, len(pks), chunk_size):
+        build_documents(
+            linked_book_pks(model_class, pks[start : start + chunk_size], using),
+            using,
+        )
+
+
+def staleness(key: str, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """
+    How far the documents of one schema have fallen behind the rows they
+    are rendered from: the number of Books without a document, the number
+    of documents built before their Book, its publisher or any of its
+    authors or categories last changed, and the largest such gap in seconds.
+
+    Changes that leave no newer "updated_at" stamp behind, such as deleting
+    an Author, aren't seen here; verifying the documents finds those.
+    """
+    source_updated_at = Greatest(
+        F("book__updated_at"),
+        F("book__publisher__updated_at"),
+        Coalesce(Max("book__authors__updated_at"), F("book__updated_at")),
+        Coalesce(Max("book__categories__updated_at"), F("book__updated_at")),
+        output_field=DateTimeField(),
+    )
+    stale = (
+        BookDocument.objects.using(using)
+        .filter(schema=key)
+        .annotate(source_updated_at=source_updated_at)
+        .filter(built_at__lt=F("source_updated_at"))
+        .values_list("source_updated_at", "built_at")
+    )
+    lags = [(updated - built).total_seconds() for updated, built in stale]
+
+    missing = (
+        Book.objects.using(using)
+        .exclude(pk__in=BookDocument.objects.filter(schema=key).values("book_id"))
+        .count()
+    )
+    return {
+        "missing": missing,
+        "stale": len(lags),
+        "max_lag_seconds": max(lags, default=0.0),
+    }
+
+
+def on_post_save(
+    sender: type[Model], instance: Model, created: bool, using: str, **kwargs
+) -> None:
+    # A new Author, Category or Publisher isn't rendered by any Book yet
+    if isinstance(instance, Book) or not created:
+        rebuild_changed(type(instance), [instance.pk], using)
+
+
+def on_pre_delete(sender: type[Model], instance: Model, using: str, **kwargs) -> None:
+    # Deleting an Author or Category removes its links to Books without
+    # sending m2m_changed, so the Books are found while the links still
+    # exist. A deleted Book's documents are deleted along with it.
+    if documents_enabled() and not batched_delete_in_progress():
+        instance._documents_linked_book_pks = linked_book_pks(
+            type(instance), [instance.pk], using
+        )
+
+
+def on_post_delete(sender: type[Model], instance: Model, using: str, **kwargs) -> None:
+    rebuild_changed(Book, getattr(instance, "_documents_linked_book_pks", []), using)
+
+
+def on_rows_deleted(sender: type[Model], deletion: Deletion, **kwargs) -> None:
+    rebuild_changed(Book, deletion.unlinked.get(Book, set()), deletion.using)
+
+
+def on_m2m_changed(
+    sender: type[Model],
+    instance: Model,
+    action: str,
+    model: type[Model],
+    pk_set: Optional[set],
+    using: str,
+    **kwargs,
+) -> None:
+    # Both ends of a changed link have their "updated_at" stamp bumped (see
+    # books_api.versions), which every Book rendering either of them shows
+    if not documents_enabled() or sender not in (
+        Author.books.through,
+        Category.books.through,
+    ):
+        return
+
+    if action == "pre_clear":
+        links = sender.objects.using(using).filter(
+            **{f"{type(instance)._meta.model_name}_id": instance.pk}
+        )
+        instance._documents_cleared_pks = set(
+            links.values_list(f"{model._meta.model_name}_id", flat=True)
+        )
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if action == "post_clear":
+            pk_set = getattr(instance, "_documents_cleared_pks", set())
+        rebuild_changed(type(instance), [instance.pk], using)
+        rebuild_changed(model, pk_set, using)
@@ -0,0 +1,71 @@
+"""
+Streaming export of the whole Book catalogue.
+
+Rather than building one list of every Book and then one JSON document from
+it, the table is walked in primary key order with QuerySet.iterator(), with
+related rows prefetched one chunk at a time, and serialised as it goes. Peak
+memory therefore depends on the chunk size, not on the size of the table.
+"""
+
+import json
+from typing import Iterator, Literal
+
+from ninja.responses import NinjaJSONEncoder
+
+from books_api.models import Book
+from books_api.querysets import with_related_lookups
+from books_api.schemas import BookExportSchema
+
+ExportFormat = Literal["ndjson", "json"]
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def iter_book_documents(chunk_size: int = 2000) -> Iterator[str]:
+    """
+    Yield each Book, with its publisher, authors and categories, as a
+    JSON encoded string.
+    """
+    books = with_related_lookups(Book.objects.order_by("pk"), BookExportSchema)
+
+    for book in books.iterator(chunk_size=chunk_size):
+        yield json.dumps(BookExportSchema.from_orm(book).dict(), cls=NinjaJSONEncoder)
+
+
+def iter_book_export(
+    export_format: ExportFormat = "ndjson", chunk_size: int = 2000
+) -> Iterator[str]:
+    """
+    Yield the export body in pieces of up to chunk_size books, either as
+    newline delimited JSON or as the items of a single JSON array.
+    """
+    separator = "\n" if export_format == "ndjson" else ","
+
+    if export_format == "json":
+        yield "["
+
+    batch: list[str] = []
+    first_batch = True
+    for document in iter_book_documents(chunk_size):
+        batch.append(document)
+        if len(batch) == chunk_size:
+            yield _join_batch(batch, separator, export_format, first_batch)
+            batch, first_batch = [], False
+
+    if batch:
+        yield _join_batch(batch, separator, export_format, first_batch)
+
+    if export_format == "json":
+        yield "]"
+
+
+def _join_batch(
+    batch: list[str], separator: str, export_format: ExportFormat, first_batch: bool
+) -> str:
+    if export_format == "ndjson":
+        return separator.join(batch) + separator
+    # Array items after the first batch need separating from the previous batch
+    return ("" if first_batch else separator) + separator.join(batch)
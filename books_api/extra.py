@@ -3,21 +3,287 @@ This example is to demonstrate how views/routes that were
 not created by AutoDojo can be included in a Ninja API
 """
 
-from django.http import HttpRequest
-from ninja import Router
+from pathlib import Path
+from typing import Optional
 
-from books_api.models import Book
+from django.http import HttpRequest, StreamingHttpResponse
+from ninja import Field, File, Query, Router, Schema
+from ninja.files import UploadedFile
+from ninja.pagination import paginate
+
+from books_api import imports, jobs, relations, search, stats
+from books_api.database import on_primary
+from books_api.export import EXPORT_CONTENT_TYPES, ExportFormat, iter_book_export
+from books_api.helpers import (
+    bulk_create_objects,
+    bulk_delete_objects,
+    bulk_patch_objects,
+)
+from books_api.imports import FeedFormat
+from books_api.models import Author, Book, Job
+from books_api.pagination import CursorPagination
+from books_api.querysets import with_related_lookups
+from books_api.schemas import (
+    AuthorStatsSchema,
+    BookBulkCreateResultSchema,
+    BookBulkInSchema,
+    BookBulkPatchResultSchema,
+    BookBulkPatchSchema,
+    BookOutSchema,
+    BookStatsSchema,
+    BulkDeleteResultSchema,
+    CategoryStatsSchema,
+    ErrorSchema,
+    FormatStatsSchema,
+    ImportResultSchema,
+    JobSchema,
+    PrimaryKeyListSchema,
+    PublisherStatsSchema,
+    RelatedIdsQuerySchema,
+    StatsFilterSchema,
+)
 
 router = Router(tags=["Book"])
 
+# Routes for the other models, mounted alongside their AutoDojo routers
+author_router = Router(tags=["Author"])
+category_router = Router(tags=["Category"])
+publisher_router = Router(tags=["Publisher"])
+
+# Statistics over the catalogue, mounted at "/stats/"
+stats_router = Router(tags=["Stats"])
+
+# The status of background jobs, mounted at "/jobs/"
+jobs_router = Router(tags=["Jobs"])
+
+
+def add_bulk_delete_route(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Add a "DELETE /bulk" route to router, deleting every instance of the
+    model whose id is listed in the request body.
+    """
+
+    def bulk_delete(
+        request: HttpRequest, payload: PrimaryKeyListSchema, background: bool = False
+    ):
+        if background:
+            return 202, jobs.submit(
+                "bulk_delete",
+                {"app_label": app_label, "model_name": model_name, "ids": payload.ids},
+            )
+        return bulk_delete_objects(app_label, model_name, payload.ids)
+
+    bulk_delete.__doc__ = (
+        f'Delete every {model_name} listed in "ids", reporting which were '
+        "deleted and which didn't exist. With background=true, the deletes "
+        "are queued as a job instead, whose status is returned with 202."
+    )
 
-@router.get("/{int:id}/authors", response={200: list[int]})
-def get_book_authors(request: HttpRequest, id: int):
+    router.add_api_operation(
+        "/bulk",
+        ["DELETE"],
+        bulk_delete,
+        response={200: BulkDeleteResultSchema, 202: JobSchema},
+        operation_id=f"bulk_delete_{model_name.lower()}",
+        url_name=f"bulk_delete_{model_name.lower()}",
+    )
+
+
+@router.get("/{int:id}/authors", response={200: list[int], 404: ErrorSchema})
+async def get_book_authors(request: HttpRequest, id: int):
     """
     This endpoint was manually added to demonstrate that normal
     use of view functions can work alongside those automatically
-    generated by AutoDojo
+    generated by AutoDojo. It is also an example of an async view,
+    using the async ORM interface.
     """
-    authors = Book.objects.get(pk=id).authors.values_list("id")
-    author_ids = [a[0] for a in authors]
+    # Read straight from the through table, looking for the Book itself only
+    # when it has no authors
+    author_ids = [
+        author_id
+        async for author_id in Author.books.through.objects.filter(book_id=id)
+        .order_by("author_id")
+        .values_list("author_id", flat=True)
+    ]
+    if not author_ids and not await Book.objects.filter(pk=id).aexists():
+        return 404, {"api_error": "Requested Book object does not exist"}
     return author_ids
+
+
+@router.get("/authors", response={200: dict[str, list[int]]})
+def get_authors_of_books(request: HttpRequest, params: Query[RelatedIdsQuerySchema]):
+    """
+    The ids of the authors of each Book listed in "ids", with one query.
+    Books without authors, or that don't exist, have none.
+    """
+    return relations.book_author_ids(params.ids)
+
+
+@router.get("/categories", response={200: dict[str, list[int]]})
+def get_categories_of_books(request: HttpRequest, params: Query[RelatedIdsQuerySchema]):
+    """
+    The ids of the categories of each Book listed in "ids", with one query.
+    Books without categories, or that don't exist, have none.
+    """
+    return relations.book_category_ids(params.ids)
+
+
+@author_router.get("/books", response={200: dict[str, list[int]]})
+def get_books_of_authors(request: HttpRequest, params: Query[RelatedIdsQuerySchema]):
+    """
+    The ids of the Books of each author listed in "ids", with one query.
+    Authors without Books, or that don't exist, have none.
+    """
+    return relations.author_book_ids(params.ids)
+
+
+@publisher_router.get("/books", response={200: dict[str, list[int]]})
+def get_books_of_publishers(request: HttpRequest, params: Query[RelatedIdsQuerySchema]):
+    """
+    The ids of the Books of each publisher listed in "ids", with one query.
+    Publishers without Books, or that don't exist, have none.
+    """
+    return relations.publisher_book_ids(params.ids)
+
+
+@router.patch("/bulk", response={200: list[BookBulkPatchResultSchema]})
+def bulk_patch_books(request: HttpRequest, payload: list[BookBulkPatchSchema]):
+    """
+    Apply many PATCH payloads in one request and one transaction.
+
+    Each item reports the status and body that a PATCH of that single
+    Book would have produced.
+    """
+    results = bulk_patch_objects(
+        "books_api", "Book", [(item.id, item.patch) for item in payload]
+    )
+    return [{"status": status, "response": body} for status, body in results]
+
+
+@router.post("/bulk", response={200: list[BookBulkCreateResultSchema]})
+def bulk_create_books(request: HttpRequest, payload: list[BookBulkInSchema]):
+    """
+    Create many Books, along with their author and category links, in one
+    request and one transaction.
+
+    Items that fail validation (an unknown publisher, author or category, or
+    an ISBN that is already taken) are reported by their index in the
+    request, and are not created. All other items are.
+    """
+    results = bulk_create_objects("books_api", "Book", payload)
+    return [
+        {"index": index, "status": status, "response": body}
+        for index, (status, body) in enumerate(results)
+    ]
+
+
+@router.post(
+    "/import",
+    response={200: ImportResultSchema, 202: JobSchema, 400: ErrorSchema},
+)
+def import_books_feed(
+    request: HttpRequest,
+    file: UploadedFile = File(...),
+    format: Optional[FeedFormat] = None,
+    background: bool = False,
+):
+    """
+    Import a feed of Books, as CSV or JSONL, keyed by ISBN: Books with new
+    ISBNs are created and the others updated. Publishers and authors are
+    given by name. The format is read from the file's extension unless
+    given. See books_api.imports for the columns. With background=true, the
+    import is queued as a job instead, whose status is returned with 202.
+    """
+    if format is None:
+        extension = Path(file.name or "").suffix.lstrip(".").lower()
+        if extension not in {feed_format.value for feed_format in FeedFormat}:
+            return 400, {"api_error": "Unknown feed format; give format=csv or jsonl"}
+        format = FeedFormat(extension)
+
+    if background:
+        path = jobs.store_file(file.file, suffix=f".{format.value}")
+        return 202, jobs.submit("import_books", {"file": path, "format": format.value})
+
+    return imports.import_books(imports.parse_feed(file.file, format)).as_dict()
+
+
+class SearchParams(Schema):
+    q: str = Field(..., min_length=1, max_length=200)
+
+
+@router.get("/search", response=list[BookOutSchema])
+@paginate(CursorPagination, ordering="rank")
+def search_books(request: HttpRequest, params: Query[SearchParams]):
+    """
+    Search Books by title, author names, publisher name and category
+    names, most relevant first. Every word of "q" must match, the last as
+    a prefix of a word.
+    """
+    return with_related_lookups(search.search_books(params.q), BookOutSchema)
+
+
+class ExportParams(Schema):
+    format: ExportFormat = "ndjson"
+    chunk_size: int = Field(2000, ge=1, le=10000)
+
+
+@router.get("/export")
+def export_books(request: HttpRequest, params: Query[ExportParams]):
+    """
+    Stream every Book, with its publisher, authors and categories, either
+    as newline delimited JSON ("ndjson", the default) or as a JSON array.
+    """
+    return StreamingHttpResponse(
+        iter_book_export(params.format, params.chunk_size),
+        content_type=EXPORT_CONTENT_TYPES[params.format],
+    )
+
+
+@stats_router.get("/books", response=BookStatsSchema)
+def get_book_stats(request: HttpRequest, filters: Query[StatsFilterSchema]):
+    """The number of Books, and their average, lowest and highest RRPs."""
+    return stats.cached_stats("books", filters, stats.book_stats)
+
+
+@stats_router.get("/formats", response=list[FormatStatsSchema])
+def get_format_stats(request: HttpRequest, filters: Query[StatsFilterSchema]):
+    """Book statistics for each format, in format order."""
+    return stats.cached_stats("formats", filters, stats.format_stats)
+
+
+@stats_router.get("/publishers", response=list[PublisherStatsSchema])
+def get_publisher_stats(request: HttpRequest, filters: Query[StatsFilterSchema]):
+    """Book statistics for each publisher with Books, most Books first."""
+    return stats.cached_stats("publishers", filters, stats.publisher_stats)
+
+
+@stats_router.get("/categories", response=list[CategoryStatsSchema])
+def get_category_stats(request: HttpRequest, filters: Query[StatsFilterSchema]):
+    """Book statistics for each category with Books, most Books first."""
+    return stats.cached_stats("categories", filters, stats.category_stats)
+
+
+@stats_router.get("/authors", response=list[AuthorStatsSchema])
+def get_author_stats(request: HttpRequest, filters: Query[StatsFilterSchema]):
+    """
+    Book statistics for each author with Books, most Books first. Birth year
+    filters also select which authors are listed.
+    """
+    return stats.cached_stats("authors", filters, stats.author_stats)
+
+
+@jobs_router.get("/{int:id}", response={200: JobSchema, 404: ErrorSchema})
+@on_primary
+def get_job(request: HttpRequest, id: int):
+    """A background job's status, progress and, once finished, result or error."""
+    # Read from the primary, where workers record progress as they go
+    job = Job.objects.filter(pk=id).first()
+    if job is None:
+        return 404, {"api_error": "Requested Job object does not exist"}
+    return job
+
+
+add_bulk_delete_route(router, "books_api", "Book")
+add_bulk_delete_route(author_router, "books_api", "Author")
+add_bulk_delete_route(category_router, "books_api", "Category")
+add_bulk_delete_route(publisher_router, "books_api", "Publisher")
@@ -0,0 +1,90 @@
+"""
+Sparse fieldsets: the subset of a response schema's fields a client asks
+for with a "fields" query parameter, such as
+
+    ?fields=id,title,publisher.name
+
+Dotted paths select the fields of nested objects, here only the name of the
+Book's publisher; naming a nested field on its own selects the whole of it.
+
+A selection is a tuple of (name, subselection) pairs, in the order of the
+schema's fields, where the subselection of a nested field is None when the
+whole of it is selected. Being a tuple, it can key caches, such as that of
+books_api.serialisation.compile_extractor().
+"""
+
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from books_api.querysets import nested_schema, schema_fields
+
+Selection = tuple[tuple[str, Optional["Selection"]], ...]
+
+
+def parse_fields(fields: str, schema: type[BaseModel]) -> Selection:
+    """
+    The selection of schema's fields named by fields, a comma-separated list
+    of field names and dotted paths. Raises ValueError for names the schema
+    doesn't have, and if none are given.
+    """
+    tree: dict = {}
+    for path in fields.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        *parents, name = path.split(".")
+        node = tree
+        for parent in parents:
+            if parent in node and node[parent] is None:
+                # The whole of the parent is already selected
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[name] = None
+
+    if not tree:
+        raise ValueError("No fields selected")
+    return _selection(tree, schema, "")
+
+
+def _selection(tree: dict, schema: type[BaseModel], prefix: str) -> Selection:
+    schema_field_infos = schema_fields(schema)
+    unknown = [name for name in tree if name not in schema_field_infos]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(prefix + name for name in unknown)}"
+        )
+
+    selection = []
+    for name, field_info in schema_field_infos.items():
+        if name not in tree:
+            continue
+        subtree = tree[name]
+        if subtree is None:
+            selection.append((name, None))
+            continue
+
+        related_schema = nested_schema(field_info.annotation)
+        if related_schema is None:
+            raise ValueError(f"{prefix}{name} has no fields to select from")
+        selection.append(
+            (name, _selection(subtree, related_schema, f"{prefix}{name}."))
+        )
+    return tuple(selection)
+
+
+def trim(data: Any, selection: Optional[Selection]) -> Any:
+    """
+    Data serialised with a schema, or a list of it, with only the fields
+    in selection.
+    """
+    if selection is None or data is None:
+        return data
+    if isinstance(data, list):
+        return [trim(item, selection) for item in data]
+    return {
+        name: trim(data[name], subselection)
+        for name, subselection in selection
+        if name in data
+    }
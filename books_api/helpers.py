@@ -1,13 +1,160 @@
 from typing import Optional
 
-from django.apps import apps
+from asgiref.sync import sync_to_async
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Model
-from django.db.models.fields.related import ForeignKey
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Model, QuerySet
 from django.forms import model_to_dict
+from django.utils import timezone
 from ninja import ModelSchema, Schema
 
+from books_api.cache import invalidate_instances, invalidate_tags, object_tag
+from books_api.database import on_primary
+from books_api.deletion import delete_queryset
+from books_api.documents import rebuild_changed
+from books_api.search import index_changed
+from books_api.stats import invalidate as invalidate_stats
+from books_api.versions import bump_versions
+from books_api.write_plans import WritePlan, get_write_plan
 
+
+def existing_values(queryset: QuerySet, field: str, values: set) -> set:
+    """
+    Return which of the supplied values exist in a column, e.g. which of a
+    set of referenced ids exist, using one "field__in" query (or more, if
+    needed to stay within the database's limit on query parameters).
+    """
+    values = list(values)
+    chunk_size = connection.features.max_query_params or len(values) or 1
+
+    found = set()
+    for start in range(0, len(values), chunk_size):
+        found.update(
+            queryset.filter(
+                **{f"{field}__in": values[start : start + chunk_size]}
+            ).values_list(field, flat=True)
+        )
+    return found
+
+
+def value_owners_of(queryset: QuerySet, field: str, values: set) -> dict:
+    """
+    As existing_values(), but mapping each value found to the primary key of
+    the row holding it, for unique columns.
+    """
+    values = list(values)
+    chunk_size = connection.features.max_query_params or len(values) or 1
+
+    owners = {}
+    for start in range(0, len(values), chunk_size):
+        owners.update(
+            queryset.filter(
+                **{f"{field}__in": values[start : start + chunk_size]}
+            ).values_list(field, "pk")
+        )
+    return owners
+
+
+def apply_fields(
+    plan: WritePlan, target_object: Model, patch_fields: dict
+) -> Optional[dict]:
+    """
+    Assign the supplied fields to target_object, following the model's write
+    plan. Foreign key values are resolved to their referenced objects.
+
+    Returns None on success, or an error dictionary if a referenced object
+    doesn't exist.
+    """
+    for attr, value in patch_fields.items():
+        handler = plan.handler(attr)
+
+        if handler.is_foreign_key:
+            try:
+                referenced_object = handler.related_model.objects.get(pk=value)
+            except handler.related_model.DoesNotExist:
+                return {"api_error": handler.related_error}
+
+            setattr(target_object, handler.name, referenced_object)
+        else:
+            setattr(target_object, attr, value)
+
+    return None
+
+
+def save_changed_fields(changed_object: Model, changed_fields: dict) -> None:
+    """
+    Save only the columns named in changed_fields, which is expected to be
+    the result of payload.dict(exclude_unset=True), along with any auto_now
+    fields.
+
+    The object already holds the values that were just written, so it is only
+    re-read from the database for fields whose final value is decided by the
+    database: fields with a db_default, or fields assigned an expression such
+    as F("rrp") + 1.
+    """
+    if not changed_fields:
+        return
+
+    plan = get_write_plan(
+        changed_object._meta.app_label, changed_object._meta.model_name
+    )
+    handlers = [plan.handler(attr) for attr in changed_fields]
+    changed_object.save(
+        update_fields=[handler.name for handler in handlers] + plan.auto_now_fields
+    )
+
+    refresh_fields = [
+        handler.name
+        for handler in handlers
+        if handler.db_default
+        or hasattr(getattr(changed_object, handler.name), "resolve_expression")
+    ]
+    if refresh_fields:
+        changed_object.refresh_from_db(fields=refresh_fields)
+
+
+def save_unique_fields(
+    plan: WritePlan, changed_object: Model, changed_fields: dict
+) -> Optional[dict]:
+    """
+    Save the changed fields as save_changed_fields() does, checking that any
+    unique fields among them don't take a value another object already has.
+
+    The check is left to the database's unique constraint, so that the value
+    compared is the one save() writes (e.g. a Book's normalised ISBN). The
+    save is made in a savepoint, so that a clash can be reported without
+    spoiling any transaction around it, and only when a unique field changed.
+
+    Returns None on success, or an error dictionary naming the clashing field.
+    """
+    unique_names = [
+        plan.handler(attr).name
+        for attr in changed_fields
+        if plan.handler(attr).name in plan.unique_fields
+    ]
+    if not unique_names:
+        save_changed_fields(changed_object, changed_fields)
+        return None
+
+    try:
+        with transaction.atomic():
+            save_changed_fields(changed_object, changed_fields)
+    except IntegrityError:
+        for name in unique_names:
+            if (
+                plan.model.objects.filter(**{name: getattr(changed_object, name)})
+                .exclude(pk=changed_object.pk)
+                .exists()
+            ):
+                return {
+                    "api_error": f"{plan.model._meta.object_name} with this {name} already exists"
+                }
+        raise
+
+    return None
+
+
+@on_primary
 def patch_object(
     app_label: str, model_name: str, pk: int, payload: ModelSchema
 ) -> tuple[int, Model | Optional[dict]]:
@@ -20,50 +167,31 @@ def patch_object(
     object, suitable for JSON response.
 
     If the requested object doesn't, exist, then 404 status will be returned with
-    an error message.
+    an error message, as it will if a referenced object doesn't. If a unique
+    field would take a value another object already has, 409 status will be.
     """
-    model_class = apps.get_model(app_label, model_name)
+    plan = get_write_plan(app_label, model_name)
 
     # Look up the object being modified, if it exists
     try:
-        patched_object = model_class.objects.get(pk=pk)
-    except model_class.DoesNotExist:
-        return 404, {
-            "api_error": f"Requested {model_class._meta.object_name} object does not exist",
-        }
+        patched_object = plan.model.objects.get(pk=pk)
+    except plan.model.DoesNotExist:
+        return 404, {"api_error": plan.not_found_error}
 
     patch_fields = payload.dict(exclude_unset=True)
 
-    for attr, value in patch_fields.items():
-        # Determine if the supplied attribute is a foreign key or not
-        # Check for a field of the supplied attribute name
-        field_meta = model_class._meta.get_field(attr)
-
-        if field_meta.__class__ is ForeignKey:
-            # Ninja appears to take  Model.fk_field and treat "fk_field" and "fk_field_id" the same.
-            # For the purpose of reporting the attribute name, ensure it always ends with "_id" when
-            # used in messages
-            message_attr = attr if attr.endswith("_id") else f"{attr}_id"
-            related_model: Model
-            try:
-                related_model = field_meta.related_model
-                related_model_name = related_model._meta.object_name
-                referenced_object = related_model.objects.get(pk=value)
-            except related_model.DoesNotExist:
-                return 404, {
-                    "api_error": f"{related_model_name} referenced by '{message_attr}' does not exist",
-                }
-
-            setattr(patched_object, attr, referenced_object)
-        else:
-            setattr(patched_object, attr, value)
+    error = apply_fields(plan, patched_object, patch_fields)
+    if error is not None:
+        return 404, error
 
-    patched_object.save()
-    patched_object.refresh_from_db()
+    error = save_unique_fields(plan, patched_object, patch_fields)
+    if error is not None:
+        return 409, error
 
     return 200, patched_object
 
 
+@on_primary
 def delete_object(
     app_label: str, model_name: str, pk: int
 ) -> tuple[int, Model | Optional[dict]]:
@@ -78,60 +206,463 @@ def delete_object(
 
     If the requested object doesn't, exist, then 404 status will be returned.
     """
-    model_class = apps.get_model(app_label, model_name)
+    plan = get_write_plan(app_label, model_name)
 
-    try:
-        deleted_object = model_class.objects.get(pk=pk)
-    except model_class.DoesNotExist:
-        return 404, {
-            "api_error": f"Requested {model_class._meta.object_name} object does not exist",
-        }
-
-    deleted_object.delete()
+    deletion = delete_queryset(plan.model.objects.filter(pk=pk))
+    if not deletion.pks(plan.model):
+        return 404, {"api_error": plan.not_found_error}
 
     return 200, None  # Empty response body on successful delete
 
 
+@on_primary
+def bulk_delete_objects(
+    app_label: str, model_name: str, pks: list[int], chunk_size: Optional[int] = None
+) -> tuple[int, dict]:
+    """
+    Delete every instance of a model whose primary key is in pks.
+
+    Rather than fetching and deleting each object individually, each chunk of
+    primary keys is deleted with one delete_queryset(), which collects any
+    cascaded rows for the whole chunk at once, and brings the response cache
+    and other derived data up to date once for the chunk. Chunks default to the
+    database's limit on query parameters (999 for SQLite), so that the
+    "pk IN (...)" lookups stay within it.
+
+    Returns 200 and a dictionary listing the primary keys that were deleted
+    and those that didn't exist.
+    """
+    plan = get_write_plan(app_label, model_name)
+    chunk_size = chunk_size or connection.features.max_query_params or len(pks) or 1
+
+    unique_pks = list(dict.fromkeys(pks))
+    deleted_pks: set = set()
+
+    with transaction.atomic():
+        for start in range(0, len(unique_pks), chunk_size):
+            deletion = delete_queryset(
+                plan.model.objects.filter(pk__in=unique_pks[start : start + chunk_size])
+            )
+            deleted_pks |= deletion.pks(plan.model)
+
+    return 200, {
+        "deleted": [pk for pk in unique_pks if pk in deleted_pks],
+        "missing": [pk for pk in unique_pks if pk not in deleted_pks],
+    }
+
+
+@on_primary
 def update_object(
     app_label: str, model_name: str, pk: int, payload: ModelSchema
 ) -> tuple[int, Model | Optional[dict]]:
-    model_class = apps.get_model(app_label, model_name)
+    plan = get_write_plan(app_label, model_name)
 
     # Look up the object being modified, if it exists
     try:
-        updated_object = model_class.objects.get(pk=pk)
-    except model_class.DoesNotExist:
-        return 404, {
-            "api_error": f"Requested {model_class._meta.object_name} object does not exist",
-        }
+        updated_object = plan.model.objects.get(pk=pk)
+    except plan.model.DoesNotExist:
+        return 404, {"api_error": plan.not_found_error}
 
     patch_fields = payload.dict(exclude_unset=True)
 
+    error = apply_fields(plan, updated_object, patch_fields)
+    if error is not None:
+        return 404, error
+
+    error = save_unique_fields(plan, updated_object, patch_fields)
+    if error is not None:
+        return 409, error
+
+    return 200, updated_object
+
+
+async def aapply_fields(
+    plan: WritePlan, target_object: Model, patch_fields: dict
+) -> Optional[dict]:
+    """
+    Async version of apply_fields().
+    """
     for attr, value in patch_fields.items():
-        # Determine if the supplied attribute is a foreign key or not
-        # Check for a field of the supplied attribute name
-        field_meta = model_class._meta.get_field(attr)
-
-        if field_meta.__class__ is ForeignKey:
-            # Ninja appears to take  Model.fk_field and treat "fk_field" and "fk_field_id" the same.
-            # For the purpose of reporting the attribute name, ensure it always ends with "_id" when
-            # used in messages.
-            message_attr = attr if attr.endswith("_id") else f"{attr}_id"
-            related_model: Model
+        handler = plan.handler(attr)
+
+        if handler.is_foreign_key:
             try:
-                related_model = field_meta.related_model
-                related_model_name = related_model._meta.object_name
-                referenced_object = related_model.objects.get(pk=value)
-            except related_model.DoesNotExist:
-                return 404, {
-                    "api_error": f"{related_model_name} referenced by '{message_attr}' does not exist",
-                }
+                referenced_object = await handler.related_model.objects.aget(pk=value)
+            except handler.related_model.DoesNotExist:
+                return {"api_error": handler.related_error}
 
-            setattr(updated_object, attr, referenced_object)
+            setattr(target_object, handler.name, referenced_object)
         else:
-            setattr(updated_object, attr, value)
+            setattr(target_object, attr, value)
+
+    return None
 
-    updated_object.save()
-    updated_object.refresh_from_db()
+
+@on_primary
+async def apatch_object(
+    app_label: str, model_name: str, pk: int, payload: ModelSchema
+) -> tuple[int, Model | Optional[dict]]:
+    """
+    Async version of patch_object(), for use from async views.
+
+    The save, and the savepoint around it, run in a thread, as Model.asave()
+    does; the object and any referenced ones are read from the event loop.
+    """
+    plan = get_write_plan(app_label, model_name)
+
+    try:
+        patched_object = await plan.model.objects.aget(pk=pk)
+    except plan.model.DoesNotExist:
+        return 404, {"api_error": plan.not_found_error}
+
+    patch_fields = payload.dict(exclude_unset=True)
+
+    error = await aapply_fields(plan, patched_object, patch_fields)
+    if error is not None:
+        return 404, error
+
+    error = await sync_to_async(save_unique_fields)(plan, patched_object, patch_fields)
+    if error is not None:
+        return 409, error
+
+    return 200, patched_object
+
+
+@on_primary
+async def aupdate_object(
+    app_label: str, model_name: str, pk: int, payload: ModelSchema
+) -> tuple[int, Model | Optional[dict]]:
+    """
+    Async version of update_object(), for use from async views.
+    """
+    plan = get_write_plan(app_label, model_name)
+
+    try:
+        updated_object = await plan.model.objects.aget(pk=pk)
+    except plan.model.DoesNotExist:
+        return 404, {"api_error": plan.not_found_error}
+
+    patch_fields = payload.dict(exclude_unset=True)
+
+    error = await aapply_fields(plan, updated_object, patch_fields)
+    if error is not None:
+        return 404, error
+
+    error = await sync_to_async(save_unique_fields)(plan, updated_object, patch_fields)
+    if error is not None:
+        return 409, error
 
     return 200, updated_object
+
+
+@on_primary
+async def adelete_object(
+    app_label: str, model_name: str, pk: int
+) -> tuple[int, Model | Optional[dict]]:
+    """
+    Async version of delete_object(), for use from async views. The delete
+    runs in a thread, as delete_queryset() collects and deletes within one
+    transaction.
+    """
+    plan = get_write_plan(app_label, model_name)
+
+    deletion = await sync_to_async(delete_queryset)(plan.model.objects.filter(pk=pk))
+    if not deletion.pks(plan.model):
+        return 404, {"api_error": plan.not_found_error}
+
+    return 200, None  # Empty response body on successful delete
+
+
+@on_primary
+def bulk_patch_objects(
+    app_label: str, model_name: str, patches: list[tuple[int, ModelSchema]]
+) -> list[tuple[int, Model | Optional[dict]]]:
+    """
+    Batch equivalent of patch_object(), for applying many PATCH payloads
+    in a single transaction.
+
+    Rather than fetching each object and each referenced foreign key row
+    individually, all targeted objects are loaded with one in_bulk() query,
+    every referenced foreign key is checked with one query per related model
+    and the changes are written with a single bulk_update() covering only
+    the columns that were supplied by at least one payload.
+
+    Values of unique fields are checked against those already taken, and
+    those taken earlier in the same request, with one query per field.
+
+    Returns a list of (status, response) tuples, in the same order as the
+    supplied patches, matching what patch_object() returns for each item.
+    """
+    plan = get_write_plan(app_label, model_name)
+
+    patch_fields_list = [
+        (pk, payload.dict(exclude_unset=True)) for pk, payload in patches
+    ]
+
+    # Gather every referenced foreign key value, per foreign key field, so that
+    # each related model can be checked with a single query.
+    referenced_pks: dict[str, set] = {}
+    for _, patch_fields in patch_fields_list:
+        for attr, value in patch_fields.items():
+            handler = plan.handler(attr)
+            if handler.is_foreign_key:
+                referenced_pks.setdefault(handler.name, set()).add(value)
+
+    # Likewise every value supplied for a unique field, so that values already
+    # taken can be found with a single query per field.
+    unique_values: dict[str, set] = {}
+    for _, patch_fields in patch_fields_list:
+        for attr, value in patch_fields.items():
+            if plan.handler(attr).name in plan.unique_fields:
+                unique_values.setdefault(plan.handler(attr).name, set()).add(value)
+
+    results: list[tuple[int, Model | Optional[dict]]] = []
+
+    with transaction.atomic():
+        target_objects = plan.model.objects.in_bulk([pk for pk, _ in patch_fields_list])
+
+        existing_pks = {
+            name: existing_values(
+                plan.handler(name).related_model.objects.all(), "pk", values
+            )
+            for name, values in referenced_pks.items()
+        }
+        # The primary key of the object holding each value, which may be the
+        # object being patched
+        value_owners = {
+            name: value_owners_of(plan.model.objects.all(), name, values)
+            for name, values in unique_values.items()
+        }
+
+        touched_fields: set[str] = set()
+        patched_objects: dict[int, Model] = {}
+
+        for pk, patch_fields in patch_fields_list:
+            patched_object = target_objects.get(pk)
+            if patched_object is None:
+                results.append((404, {"api_error": plan.not_found_error}))
+                continue
+
+            handlers = [
+                (plan.handler(attr), value) for attr, value in patch_fields.items()
+            ]
+
+            missing_reference = next(
+                (
+                    handler
+                    for handler, value in handlers
+                    if handler.is_foreign_key
+                    and value not in existing_pks[handler.name]
+                ),
+                None,
+            )
+            if missing_reference is not None:
+                results.append((404, {"api_error": missing_reference.related_error}))
+                continue
+
+            taken_value = next(
+                (
+                    handler
+                    for handler, value in handlers
+                    if handler.name in value_owners
+                    and value_owners[handler.name].get(value, pk) != pk
+                ),
+                None,
+            )
+            if taken_value is not None:
+                results.append(
+                    (
+                        409,
+                        {
+                            "api_error": f"{plan.model._meta.object_name} with this {taken_value.name} already exists"
+                        },
+                    )
+                )
+                continue
+
+            for handler, value in handlers:
+                if handler.name in value_owners:
+                    # Later patches within the same request can't take it
+                    value_owners[handler.name][value] = pk
+
+            for handler, value in handlers:
+                # The referenced row is known to exist, so assign the raw key
+                # rather than fetching the related instance.
+                setattr(patched_object, handler.attname, value)
+                touched_fields.add(handler.name)
+
+            patched_objects[pk] = patched_object
+            results.append((200, patched_object))
+
+        if touched_fields:
+            # bulk_update() doesn't stamp auto_now fields the way save() does
+            now = timezone.now()
+            for patched_object in patched_objects.values():
+                for name in plan.auto_now_fields:
+                    setattr(patched_object, name, now)
+
+            plan.model.objects.bulk_update(
+                patched_objects.values(),
+                sorted(touched_fields) + plan.auto_now_fields,
+            )
+            # bulk_update() doesn't send post_save
+            invalidate_instances(patched_objects.values())
+            index_changed(plan.model, patched_objects.keys(), fields=touched_fields)
+            rebuild_changed(plan.model, patched_objects.keys())
+            invalidate_stats()
+
+    return results
+
+
+@on_primary
+def bulk_create_objects(
+    app_label: str, model_name: str, payloads: list[ModelSchema]
+) -> list[tuple[int, Model | Optional[dict]]]:
+    """
+    Create many objects, and their many-to-many links, in a single
+    transaction.
+
+    Payload fields naming a many-to-many relation of the model, in either
+    direction (e.g. "authors" for a Book), are taken as lists of related ids.
+    Foreign key and many-to-many ids, and values of unique fields, are all
+    checked with set-based queries up front, so that invalid items can be
+    reported without creating anything for them. Valid objects are inserted
+    with one bulk_create(), then their links with one bulk_create() per
+    through model.
+
+    Returns a list of (status, response) tuples, in the same order as the
+    supplied payloads: 201 and the new object, or an error status (404 for
+    missing references, 409 for duplicated unique values) and message.
+    """
+    plan = get_write_plan(app_label, model_name)
+    items = [payload.dict() for payload in payloads]
+
+    referenced_pks: dict[str, set] = {}
+    unique_values: dict[str, list] = {name: [] for name in plan.unique_fields}
+    for item in items:
+        for attr, value in item.items():
+            if attr in plan.m2m_handlers:
+                referenced_pks.setdefault(attr, set()).update(value)
+            elif plan.handler(attr).is_foreign_key:
+                referenced_pks.setdefault(plan.handler(attr).name, set()).add(value)
+        for name in plan.unique_fields:
+            unique_values[name].append(item.get(name))
+
+    results: list[tuple[int, Model | Optional[dict]]] = []
+
+    with transaction.atomic():
+        existing_pks = {
+            name: existing_values(
+                (
+                    plan.m2m_handlers[name].related_model
+                    if name in plan.m2m_handlers
+                    else plan.handler(name).related_model
+                ).objects.all(),
+                "pk",
+                values,
+            )
+            for name, values in referenced_pks.items()
+        }
+        taken_values = {
+            name: existing_values(plan.model.objects.all(), name, set(values))
+            for name, values in unique_values.items()
+        }
+
+        new_objects: list[Model] = []
+        new_links: list[tuple[Model, dict]] = []
+
+        for item in items:
+            error = None
+
+            for attr, value in item.items():
+                if attr in plan.m2m_handlers:
+                    handler = plan.m2m_handlers[attr]
+                    if not existing_pks[attr].issuperset(value):
+                        error = 404, {"api_error": handler.related_error}
+                        break
+                elif plan.handler(attr).is_foreign_key:
+                    handler = plan.handler(attr)
+                    if value not in existing_pks[handler.name]:
+                        error = 404, {"api_error": handler.related_error}
+                        break
+
+            if error is None:
+                for name in plan.unique_fields:
+                    value = item.get(name)
+                    if value in taken_values[name]:
+                        error = 409, {
+                            "api_error": f"{plan.model._meta.object_name} with this {name} already exists",
+                        }
+                        break
+
+            if error is not None:
+                results.append(error)
+                continue
+
+            for name in plan.unique_fields:
+                # Later duplicates within the same request are also rejected
+                taken_values[name].add(item.get(name))
+
+            new_object = plan.model(
+                **{
+                    plan.handler(attr).attname: value
+                    for attr, value in item.items()
+                    if attr not in plan.m2m_handlers
+                }
+            )
+            new_objects.append(new_object)
+            new_links.append(
+                (
+                    new_object,
+                    {
+                        attr: value
+                        for attr, value in item.items()
+                        if attr in plan.m2m_handlers
+                    },
+                )
+            )
+            results.append((201, new_object))
+
+        plan.model.objects.bulk_create(new_objects)
+
+        through_rows: dict[type[Model], list[Model]] = {}
+        for new_object, links in new_links:
+            for attr, related_pks in links.items():
+                handler = plan.m2m_handlers[attr]
+                through_rows.setdefault(handler.through, []).extend(
+                    handler.through(
+                        **{
+                            handler.source_column: new_object.pk,
+                            handler.target_column: related_pk,
+                        }
+                    )
+                    for related_pk in dict.fromkeys(related_pks)
+                )
+
+        for through_model, rows in through_rows.items():
+            through_model.objects.bulk_create(rows)
+
+        # bulk_create() sends neither post_save nor m2m_changed. The related
+        # objects now list the new ones, so are stamped as changed too.
+        for attr, handler in plan.m2m_handlers.items():
+            bump_versions(
+                handler.related_model,
+                {pk for _, links in new_links for pk in links.get(attr, ())},
+            )
+        invalidate_instances(new_objects, created=True)
+        invalidate_tags(
+            object_tag(plan.m2m_handlers[attr].related_model, related_pk)
+            for _, links in new_links
+            for attr, related_pks in links.items()
+            for related_pk in related_pks
+        )
+        index_changed(plan.model, [new_object.pk for new_object in new_objects])
+        rebuild_changed(plan.model, [new_object.pk for new_object in new_objects])
+        for attr, handler in plan.m2m_handlers.items():
+            rebuild_changed(
+                handler.related_model,
+                {pk for _, links in new_links for pk in links.get(attr, ())},
+            )
+        invalidate_stats()
+
+    return results
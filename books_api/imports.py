@@ -0,0 +1,337 @@
+"""
+Import of Book feeds, as CSV or JSONL, keyed by ISBN, with publishers and
+authors referred to by name.
+
+Each row gives a Book's isbn, title, format, rrp and publisher name, and
+optionally its authors' names ("First Last"; in CSV, separated by ";").
+A Book whose ISBN already exists is updated, otherwise it is created. Rows
+with authors replace the Book's author links; rows without, including CSV
+rows whose authors cell is blank, leave them be.
+
+Feeds are read lazily and imported in batches, each in a transaction of its
+own, so memory use stays bounded whatever the size of the feed. For each
+batch, the publisher and author names it uses are resolved to ids with one
+query each, the Books are upserted with a single
+bulk_create(update_conflicts=True), and their author links rewritten with
+one delete and one bulk_create() of the through table.
+
+Rows that can't be imported, such as those with invalid values or naming a
+publisher or author that doesn't exist, are rejected, and reported by line
+number, while the others are imported. Names are matched exactly; where
+several publishers or authors share a name, the first created is used.
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from enum import Enum
+from typing import IO, Callable, Iterable, Iterator, Optional, Union
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from ninja import Field, Schema
+from pydantic import ValidationError, field_validator
+
+from books_api.cache import (
+    invalidate_instances,
+    invalidate_tags,
+    object_tag,
+    reverse_tag,
+)
+from books_api.database import on_primary
+from books_api.documents import rebuild_changed
+from books_api.models import Author, Book, BookFormatChoices, Publisher, normalise_isbn
+from books_api.search import index_changed
+from books_api.stats import invalidate as invalidate_stats
+from books_api.versions import bump_versions
+
+# The rejected rows reported by line number; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# The separator of authors' names in a CSV column
+CSV_AUTHOR_SEPARATOR = ";"
+
+
+class FeedFormat(str, Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+class BookFeedRowSchema(Schema):
+    isbn: str = Field(..., max_length=13)
+    title: str = Field(..., max_length=255)
+    format: BookFormatChoices
+    rrp: Decimal = Field(..., max_digits=5, decimal_places=2)
+    publisher: str
+    authors: Optional[list[str]] = None
+
+    @field_validator("isbn", mode="before")
+    @classmethod
+    def clean_isbn(cls, value):
+        return normalise_isbn(value) if isinstance(value, str) else value
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    # (line number, error) of the first MAX_REPORTED_ERRORS rejected rows
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+    def reject(self, line: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, error))
+
+    @property
+    def rows(self) -> int:
+        """The rows read so far, whether imported or rejected."""
+        return self.inserted + self.updated + self.rejected
+
+    def as_dict(self) -> dict:
+        """The result, as rendered with ImportResultSchema."""
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": [{"line": line, "error": error} for line, error in self.errors],
+        }
+
+
+# A row as parsed, with its line number, or the error parsing it
+ParsedRow = tuple[int, Union[dict, str]]
+
+
+def parse_feed(stream: IO[bytes], feed_format: FeedFormat) -> Iterator[ParsedRow]:
+    """The rows of a feed, read from a binary stream as they are needed."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if feed_format == FeedFormat.CSV:
+        yield from _parse_csv(text)
+    else:
+        yield from _parse_jsonl(text)
+
+
+def _parse_csv(text: IO[str]) -> Iterator[ParsedRow]:
+    reader = csv.DictReader(text)
+    for row in reader:
+        # The line the row ended on, past the header
+        line = reader.line_num
+        if None in row:
+            yield line, "More values than columns"
+            continue
+        row = {name: value for name, value in row.items() if value is not None}
+        if "authors" in row:
+            names = [
+                name.strip()
+                for name in row.pop("authors").split(CSV_AUTHOR_SEPARATOR)
+                if name.strip()
+            ]
+            # A blank cell gives no authors, rather than an empty list of them
+            if names:
+                row["authors"] = names
+        yield line, row
+
+
+def _parse_jsonl(text: IO[str]) -> Iterator[ParsedRow]:
+    for line, content in enumerate(text, start=1):
+        if not content.strip():
+            continue
+        try:
+            row = json.loads(content)
+        except ValueError as error:
+            yield line, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line, "Not a JSON object"
+            continue
+        yield line, row
+
+
+def split_name(name: str) -> tuple[str, str]:
+    """An author's (first name, last name), from "First Last"."""
+    first_name, _, last_name = name.strip().rpartition(" ")
+    return first_name, last_name
+
+
+def import_books(
+    rows: Iterable[ParsedRow],
+    batch_size: int = 1000,
+    using: str = DEFAULT_DB_ALIAS,
+    progress: Optional[Callable[[ImportResult], None]] = None,
+) -> ImportResult:
+    """
+    Import parsed feed rows (see parse_feed()), batch_size at a time,
+    calling progress(result so far) after each batch.
+    """
+    result = ImportResult()
+    progress = progress or (lambda result: None)
+    batch: list[ParsedRow] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _import_batch(batch, result, using)
+            progress(result)
+            batch = []
+    if batch:
+        _import_batch(batch, result, using)
+        progress(result)
+    return result
+
+
+@on_primary
+def _import_batch(rows: list[ParsedRow], result: ImportResult, using: str) -> None:
+    valid: dict[str, tuple[int, BookFeedRowSchema]] = {}
+    for line, row in rows:
+        if isinstance(row, str):
+            result.reject(line, row)
+            continue
+        try:
+            item = BookFeedRowSchema(**row)
+        except ValidationError as error:
+            result.reject(line, _validation_message(error))
+            continue
+        if item.isbn in valid:
+            # Only the last row for an ISBN within a batch is imported
+            result.reject(valid[item.isbn][0], "Superseded by a later row")
+        valid[item.isbn] = line, item
+
+    with transaction.atomic(using=using):
+        publisher_ids = _publisher_ids(
+            {item.publisher for _, item in valid.values()}, using
+        )
+        author_ids = _author_ids(
+            {
+                split_name(name)
+                for _, item in valid.values()
+                for name in item.authors or ()
+            },
+            using,
+        )
+
+        books: list[Book] = []
+        links: dict[str, list[int]] = {}
+        for line, item in valid.values():
+            error = None
+            if item.publisher not in publisher_ids:
+                error = f"Unknown publisher: {item.publisher}"
+            else:
+                missing = [
+                    name
+                    for name in item.authors or ()
+                    if split_name(name) not in author_ids
+                ]
+                if missing:
+                    error = f"Unknown authors: {', '.join(missing)}"
+            if error is not None:
+                result.reject(line, error)
+                continue
+
+            books.append(
+                Book(
+                    isbn=item.isbn,
+                    title=item.title,
+                    format=item.format,
+                    rrp=item.rrp,
+                    publisher_id=publisher_ids[item.publisher],
+                )
+            )
+            if item.authors is not None:
+                links[item.isbn] = list(
+                    dict.fromkeys(author_ids[split_name(name)] for name in item.authors)
+                )
+
+        if not books:
+            return
+
+        isbns = [book.isbn for book in books]
+        existing = {
+            isbn: (pk, publisher_id)
+            for isbn, pk, publisher_id in Book.objects.using(using)
+            .filter(isbn__in=isbns)
+            .values_list("isbn", "pk", "publisher_id")
+        }
+        Book.objects.using(using).bulk_create(
+            books,
+            update_conflicts=True,
+            unique_fields=["isbn"],
+            update_fields=["title", "format", "rrp", "publisher", "updated_at"],
+        )
+        book_pks = dict(
+            Book.objects.using(using).filter(isbn__in=isbns).values_list("isbn", "pk")
+        )
+        for book in books:
+            book.pk = book_pks[book.isbn]
+
+        through = Author.books.through
+        linked_pks = [book_pks[isbn] for isbn in links]
+        old_author_pks = set(
+            through.objects.using(using)
+            .filter(book_id__in=linked_pks)
+            .values_list("author_id", flat=True)
+        )
+        through.objects.using(using).filter(book_id__in=linked_pks).delete()
+        through.objects.using(using).bulk_create(
+            through(book_id=book_pks[isbn], author_id=author_pk)
+            for isbn, author_pks in links.items()
+            for author_pk in author_pks
+        )
+        new_author_pks = {pk for author_pks in links.values() for pk in author_pks}
+
+        # Neither bulk_create() nor the delete of through rows send model
+        # signals
+        changed_author_pks = old_author_pks | new_author_pks
+        bump_versions(Author, changed_author_pks)
+        invalidate_instances(
+            [book for book in books if book.isbn not in existing], created=True
+        )
+        invalidate_instances([book for book in books if book.isbn in existing])
+        invalidate_tags(
+            [object_tag(Author, pk) for pk in changed_author_pks]
+            + [
+                # The publishers Books were moved away from
+                reverse_tag(Publisher, publisher_id)
+                for _, publisher_id in existing.values()
+            ]
+        )
+        index_changed(Book, book_pks.values(), using)
+        rebuild_changed(Book, book_pks.values(), using)
+        invalidate_stats()
+
+    result.inserted += sum(1 for book in books if book.isbn not in existing)
+    result.updated += sum(1 for book in books if book.isbn in existing)
+
+
+def _publisher_ids(names: set[str], using: str) -> dict[str, int]:
+    ids: dict[str, int] = {}
+    # Latest first, so the first created of any with the same name is kept
+    for name, pk in (
+        Publisher.objects.using(using)
+        .filter(name__in=names)
+        .order_by("-pk")
+        .values_list("name", "pk")
+    ):
+        ids[name] = pk
+    return ids
+
+
+def _author_ids(names: set[tuple[str, str]], using: str) -> dict[tuple[str, str], int]:
+    ids: dict[tuple[str, str], int] = {}
+    last_names = {last_name for _, last_name in names}
+    for first_name, last_name, pk in (
+        Author.objects.using(using)
+        .filter(last_name__in=last_names)
+        .order_by("-pk")
+        .values_list("first_name", "last_name", "pk")
+    ):
+        if (first_name, last_name) in names:
+            ids[first_name, last_name] = pk
+    return ids
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
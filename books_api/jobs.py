@@ -0,0 +1,313 @@
+"""
+A queue of heavy write operations, such as large imports and bulk deletes
+whose cascades take out thousands of rows, run by worker processes (the
+run_jobs management command) rather than within the request submitting
+them, where they would run into the server's timeouts (see uwsgi.ini).
+
+The queue is the Job table, with no broker besides the database. A job is
+submitted with submit(), naming the handler that runs it and the payload it
+is given, and its progress polled at /api/v2/jobs/{id}:
+
+    job = submit("bulk_delete", {"model_name": "Publisher", "ids": [1, 2]})
+
+Workers claim queued jobs oldest first with a compare-and-set update, which
+only marks a job as running if it is still queued, so that any number of
+worker threads, in any number of processes, can claim jobs in parallel
+without two of them ever running the same one. Running jobs report their
+progress, as rows processed out of a total where known. Their worker also
+stamps a heartbeat every HEARTBEAT_INTERVAL from a thread of its own, so
+that a single long step, such as a chunk of deletes with a large cascade,
+doesn't make a job look abandoned. Jobs whose heartbeat is older than
+STALE_AFTER, their worker having presumably stopped, are queued again, up
+to MAX_ATTEMPTS times in all, and fail after that. A worker finding that its
+job was queued again, or claimed by another worker, in the meantime stops
+running it at its next progress report (see ClaimLost). Handlers must
+therefore be safe to run again after being cut off part-way, as upserting
+imports and deletes are.
+
+On SQLite, running jobs alongside each other, or alongside requests, needs
+the "production" or "production-asgi" BOOKS_API_DATABASE_PROFILE; with
+SQLite's defaults, concurrent writers fail with "database is locked" rather
+than waiting.
+
+Handlers are registered with @job_handler(kind), and called with the job
+and a Progress to report to, returning the job's result:
+
+    @job_handler("bulk_delete")
+    def bulk_delete(job: Job, progress: Progress) -> dict:
+        ...
+
+Uploaded files, such as feeds to import, are kept in
+BOOKS_API_JOB_FILES_DIR until the job using them (as payload["file"]) has
+finished.
+"""
+
+import logging
+import os
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import IO, Callable, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import F
+from django.utils import timezone
+
+from books_api import imports
+from books_api.database import on_primary
+from books_api.helpers import bulk_delete_objects
+from books_api.models import Job, JobStatusChoices
+
+logger = logging.getLogger(__name__)
+
+# How long a running job's heartbeat can go unstamped before it is taken to
+# have been abandoned by its worker
+STALE_AFTER = timedelta(minutes=10)
+
+# How often the worker running a job stamps its heartbeat, well within
+# STALE_AFTER
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+# The most times a job is claimed before it is failed rather than queued again
+MAX_ATTEMPTS = 3
+
+# The ids deleted per transaction by bulk_delete jobs, keeping each of their
+# cascades, and so each hold of the database's write lock, short
+DELETE_CHUNK_SIZE = 100
+
+
+class ClaimLost(Exception):
+    """
+    Raised by Progress.update() once the job it reports on is no longer
+    running under the worker that claimed it.
+    """
+
+
+class Progress:
+    """Records the progress of a running job, as rows processed."""
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def update(self, processed: int, total: Optional[int] = None) -> None:
+        fields = {"rows_processed": processed}
+        if total is not None:
+            fields["rows_total"] = total
+        if not _beat(self.job, **fields):
+            raise ClaimLost(f"Job {self.job.pk} is no longer claimed by this worker")
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Stamps a running job's heartbeat every interval until stopped, or until
+    the job is found to have been claimed away from its worker.
+    """
+
+    def __init__(self, job: Job, interval: timedelta = HEARTBEAT_INTERVAL):
+        super().__init__(name=f"job-{job.pk}-heartbeat", daemon=True)
+        self.job = job
+        self.interval = interval.total_seconds()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    if not _beat(self.job):
+                        return
+                except DatabaseError:
+                    # Such as SQLite's "database is locked", while the job
+                    # holds the write lock for longer than its busy timeout
+                    logger.warning(
+                        "Couldn't stamp the heartbeat of job %s", self.job.pk
+                    )
+        finally:
+            # This thread has connections of its own
+            connections.close_all()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def _beat(job: Job, **fields) -> bool:
+    """
+    Stamp the heartbeat of job, along with any other fields, if its worker
+    still has it claimed, returning whether it had.
+    """
+    return bool(
+        Job.objects.using(job._state.db)
+        .filter(pk=job.pk, status=JobStatusChoices.RUNNING, worker=job.worker)
+        .update(heartbeat_at=timezone.now(), **fields)
+    )
+
+
+JobHandler = Callable[[Job, Progress], dict]
+
+_handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register the decorated function as the handler of jobs of kind."""
+
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        return handler
+
+    return register
+
+
+def submit(kind: str, payload: dict, using: str = DEFAULT_DB_ALIAS) -> Job:
+    """Queue a job, to be run by the handler registered for kind."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.using(using).create(kind=kind, payload=payload)
+
+
+def store_file(stream: IO[bytes], suffix: str = "") -> str:
+    """
+    Copy an uploaded file into BOOKS_API_JOB_FILES_DIR, for a job to read,
+    returning its path.
+    """
+    directory = Path(settings.BOOKS_API_JOB_FILES_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{uuid.uuid4().hex}{suffix}"
+    with open(path, "wb") as stored:
+        while chunk := stream.read(1024 * 1024):
+            stored.write(chunk)
+    return str(path)
+
+
+@on_primary
+def claim(worker: str, using: str = DEFAULT_DB_ALIAS) -> Optional[Job]:
+    """
+    Mark the oldest queued job as running, claimed by worker, and return
+    it; None if there are none queued.
+    """
+    queued = Job.objects.using(using).filter(status=JobStatusChoices.QUEUED)
+    while True:
+        pk = queued.order_by("pk").values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        now = timezone.now()
+        # Only one of the workers racing for a job sees it still queued
+        claimed = queued.filter(pk=pk).update(
+            status=JobStatusChoices.RUNNING,
+            worker=worker,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.using(using).get(pk=pk)
+
+
+@on_primary
+def requeue_stale(
+    stale_after: timedelta = STALE_AFTER, using: str = DEFAULT_DB_ALIAS
+) -> int:
+    """
+    Queue again the running jobs whose heartbeat hasn't been stamped for
+    stale_after, failing those already claimed MAX_ATTEMPTS times. Returns
+    how many were queued again.
+    """
+    stale = Job.objects.using(using).filter(
+        status=JobStatusChoices.RUNNING,
+        heartbeat_at__lt=timezone.now() - stale_after,
+    )
+    for job in stale.filter(attempts__gte=MAX_ATTEMPTS):
+        _finish(job, JobStatusChoices.FAILED, error="Abandoned by its workers")
+    return stale.filter(attempts__lt=MAX_ATTEMPTS).update(
+        status=JobStatusChoices.QUEUED, worker=""
+    )
+
+
+@on_primary
+def run(job: Job, heartbeat_interval: timedelta = HEARTBEAT_INTERVAL) -> None:
+    """
+    Run a claimed job to completion, recording its result or error, while
+    stamping its heartbeat every heartbeat_interval.
+    """
+    handler = _handlers.get(job.kind)
+    if handler is None:
+        _finish(job, JobStatusChoices.FAILED, error=f"Unknown job kind: {job.kind}")
+        return
+    heartbeat = Heartbeat(job, heartbeat_interval)
+    heartbeat.start()
+    try:
+        result = handler(job, Progress(job))
+    except ClaimLost:
+        # Left to the worker that has it now
+        logger.warning("Job %s (%s) was claimed by another worker", job.pk, job.kind)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        _finish(job, JobStatusChoices.FAILED, error=traceback.format_exc(limit=1))
+    else:
+        _finish(job, JobStatusChoices.SUCCEEDED, result=result)
+    finally:
+        heartbeat.stop()
+
+
+def _finish(
+    job: Job,
+    status: JobStatusChoices,
+    result: Optional[dict] = None,
+    error: str = "",
+) -> None:
+    # Left alone if the job has been queued again, and claimed by another
+    # worker, since this one last stamped its heartbeat
+    finished = (
+        Job.objects.using(job._state.db)
+        .filter(pk=job.pk, status=JobStatusChoices.RUNNING, worker=job.worker)
+        .update(status=status, result=result, error=error, finished_at=timezone.now())
+    )
+    if finished and "file" in job.payload:
+        try:
+            os.remove(job.payload["file"])
+        except FileNotFoundError:
+            pass
+
+
+@job_handler("bulk_delete")
+def bulk_delete(job: Job, progress: Progress) -> dict:
+    """
+    Delete every instance of payload["model_name"] whose id is in
+    payload["ids"], DELETE_CHUNK_SIZE at a time, each chunk in a transaction
+    of its own. The result lists the ids deleted and those that didn't
+    exist, as for a "DELETE /bulk" request.
+    """
+    ids = list(dict.fromkeys(job.payload["ids"]))
+    result: dict[str, list[int]] = {"deleted": [], "missing": []}
+    progress.update(0, len(ids))
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        _, chunk_result = bulk_delete_objects(
+            job.payload.get("app_label", "books_api"),
+            job.payload["model_name"],
+            ids[start : start + DELETE_CHUNK_SIZE],
+        )
+        result["deleted"].extend(chunk_result["deleted"])
+        result["missing"].extend(chunk_result["missing"])
+        progress.update(min(start + DELETE_CHUNK_SIZE, len(ids)))
+    return result
+
+
+@job_handler("import_books")
+def import_books(job: Job, progress: Progress) -> dict:
+    """
+    Import the Book feed stored at payload["file"], in payload["format"]
+    (see books_api.imports). The number of rows isn't known up front, so
+    only those read so far are reported.
+    """
+    with open(job.payload["file"], "rb") as stream:
+        result = imports.import_books(
+            imports.parse_feed(stream, imports.FeedFormat(job.payload["format"])),
+            batch_size=job.payload.get("batch_size", 1000),
+            using=job._state.db,
+            progress=lambda result: progress.update(result.rows),
+        )
+    return result.as_dict()
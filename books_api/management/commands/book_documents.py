@@ -0,0 +1,118 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from books_api.documents import (
+    build_documents,
+    registered_schemas,
+    render_document,
+    staleness,
+)
+from books_api.models import Book, BookDocument
+from books_api.querysets import with_related_lookups
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the stored response documents of Books, or verify them "
+        "against the output of the live response schemas. Both report how "
+        "stale the documents are."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["backfill", "verify"])
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='The database holding the documents. Defaults to "default".',
+        )
+        parser.add_argument(
+            "--schema",
+            action="append",
+            dest="keys",
+            metavar="KEY",
+            help=(
+                "The key of a registered schema to work on, as reported. May be "
+                "given more than once. Defaults to every registered schema."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="The number of Books rendered at a time. Defaults to 1000.",
+        )
+
+    def handle(self, *args, **options):
+        schemas = registered_schemas()
+        if not schemas:
+            raise CommandError("No routes serve Book documents.")
+        if options["keys"]:
+            unknown = set(options["keys"]) - schemas.keys()
+            if unknown:
+                raise CommandError(
+                    f"No schema is registered as {', '.join(sorted(unknown))}."
+                )
+            schemas = {key: schemas[key] for key in options["keys"]}
+
+        if options["action"] == "backfill":
+            self.backfill(schemas, options["database"], options["chunk_size"])
+            self.report_staleness(schemas, options["database"])
+        else:
+            self.report_staleness(schemas, options["database"])
+            self.verify(schemas, options["database"], options["chunk_size"])
+
+    def chunks(self, database: str, chunk_size: int):
+        pks = list(
+            Book.objects.using(database).order_by("pk").values_list("pk", flat=True)
+        )
+        for start in range(0, len(pks), chunk_size):
+            yield pks[start : start + chunk_size]
+
+    def backfill(self, schemas: dict, database: str, chunk_size: int) -> None:
+        started = time.perf_counter()
+        written = sum(
+            build_documents(chunk, database, schemas.keys())
+            for chunk in self.chunks(database, chunk_size)
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Built {written} documents in {elapsed:.1f}s.")
+        )
+
+    def verify(self, schemas: dict, database: str, chunk_size: int) -> None:
+        failed = False
+        for key, schema in schemas.items():
+            mismatched = missing = 0
+            for chunk in self.chunks(database, chunk_size):
+                stored = dict(
+                    BookDocument.objects.using(database)
+                    .filter(schema=key, book_id__in=chunk)
+                    .values_list("book_id", "content")
+                )
+                books = with_related_lookups(
+                    Book.objects.using(database).filter(pk__in=chunk), schema
+                )
+                for book in books:
+                    if book.pk not in stored:
+                        missing += 1
+                    elif stored[book.pk] != render_document(book, schema):
+                        mismatched += 1
+
+            failed = failed or bool(mismatched or missing)
+            self.stdout.write(
+                f"{key}: {mismatched} mismatched, {missing} missing documents."
+            )
+
+        if failed:
+            raise CommandError(
+                "Stored documents differ from the live responses; run "
+                '"book_documents backfill" to rebuild them.'
+            )
+        self.stdout.write(self.style.SUCCESS("All documents match."))
+
+    def report_staleness(self, schemas: dict, database: str) -> None:
+        for key in schemas:
+            self.stdout.write(f"{key}: {json.dumps(staleness(key, database))}")
@@ -0,0 +1,72 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from books_api.imports import FeedFormat, import_books, parse_feed
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a feed of Books, as CSV or JSONL, creating Books whose ISBNs "
+        "are new and updating the others. Publishers and authors are given by "
+        "name, and must already exist."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='The feed to import, or "-" for stdin.')
+        parser.add_argument(
+            "--format",
+            choices=[feed_format.value for feed_format in FeedFormat],
+            help="The format of the feed. Defaults to that of its file extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of rows imported at a time. Defaults to 1000.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='The database to import into. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        feed_format = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if feed_format not in {feed_format.value for feed_format in FeedFormat}:
+            raise CommandError("Give the feed's format with --format csv or jsonl.")
+
+        started = time.perf_counter()
+        if path == "-":
+            result = self.import_stream(sys.stdin.buffer, feed_format, options)
+        else:
+            try:
+                with open(path, "rb") as stream:
+                    result = self.import_stream(stream, feed_format, options)
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {path}")
+        elapsed = time.perf_counter() - started
+
+        for line, error in result.errors:
+            self.stderr.write(f"Line {line}: {error}")
+        if result.rejected > len(result.errors):
+            self.stderr.write(
+                f"... and {result.rejected - len(result.errors)} more rejected rows."
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {result.inserted}, updated {result.updated} and "
+                f"rejected {result.rejected} books in {elapsed:.1f}s."
+            )
+        )
+
+    def import_stream(self, stream, feed_format: str, options: dict):
+        return import_books(
+            parse_feed(stream, FeedFormat(feed_format)),
+            batch_size=options["batch_size"],
+            using=options["database"],
+        )
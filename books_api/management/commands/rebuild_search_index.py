@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from books_api.search import rebuild_index, search_supported
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index of Books from scratch, for example "
+        "after rows were written without sending model signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='The database to rebuild the index of. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        if not search_supported(database):
+            raise CommandError(
+                "Full-text search indexes are only kept on SQLite databases."
+            )
+
+        started = time.perf_counter()
+        # Searches see either the old index or the new one, never a partial one
+        with transaction.atomic(using=database):
+            indexed = rebuild_index(database)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} books in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from books_api import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs, such as large imports and bulk deletes, "
+        "from a pool of worker threads. Any number of workers can run at "
+        "once, in this process or others."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="The number of jobs run at once. Defaults to 4.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between checks of an empty queue. Defaults to 1.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=jobs.STALE_AFTER.total_seconds(),
+            help=(
+                "Seconds a running job's heartbeat can go unstamped before it "
+                "is queued again. Defaults to 600."
+            ),
+        )
+        parser.add_argument(
+            "--heartbeat-interval",
+            type=float,
+            default=jobs.HEARTBEAT_INTERVAL.total_seconds(),
+            help=(
+                "Seconds between stamps of the heartbeat of each job running. "
+                "Defaults to 60."
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty, rather than waiting for more jobs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads must be at least 1.")
+        if options["heartbeat_interval"] >= options["stale_after"]:
+            raise CommandError("--heartbeat-interval must be less than --stale-after.")
+
+        stop = threading.Event()
+        ran = [0] * options["threads"]
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        def work(index: int) -> None:
+            worker = f"{prefix}:{index}"
+            try:
+                while not stop.is_set():
+                    job = jobs.claim(worker)
+                    if job is None:
+                        jobs.requeue_stale(timedelta(seconds=options["stale_after"]))
+                        if options["once"]:
+                            return
+                        stop.wait(options["poll_interval"])
+                        continue
+                    jobs.run(job, timedelta(seconds=options["heartbeat_interval"]))
+                    ran[index] += 1
+            finally:
+                # Each thread has connections of its own
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            futures = [pool.submit(work, index) for index in range(options["threads"])]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                # Jobs already running are finished first
+                stop.set()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {sum(ran)} jobs in {elapsed:.1f}s."))
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from books_api.models import Book
+from books_api.seeding import seed_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a synthetic catalogue of Books, Authors, "
+        "Publishers and Categories, for benchmarks and staging. The same seed "
+        "always generates the same catalogue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--publishers", type=int, default=1000)
+        parser.add_argument("--authors", type=int, default=20_000)
+        parser.add_argument("--categories", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--exponent",
+            type=float,
+            default=1.1,
+            help=(
+                "The exponent of the power law Books are spread over publishers, "
+                "authors and categories with. Defaults to 1.1."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="The number of rows inserted at a time. Defaults to 10000.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='The database to fill. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        if Book.objects.using(database).exists():
+            raise CommandError(
+                "The database already has Books, whose ISBNs could clash with "
+                "those generated."
+            )
+        if min(options["publishers"], options["authors"], options["categories"]) < 1:
+            raise CommandError("At least one publisher, author and category is needed.")
+
+        started = time.perf_counter()
+
+        def progress(model_name: str, rows: int) -> None:
+            if options["verbosity"] > 1:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{model_name}: {rows} rows, {elapsed:.1f}s")
+
+        result = seed_catalogue(
+            books=options["books"],
+            publishers=options["publishers"],
+            authors=options["authors"],
+            categories=options["categories"],
+            seed=options["seed"],
+            exponent=options["exponent"],
+            chunk_size=options["chunk_size"],
+            using=database,
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.books} books, {result.authors} authors, "
+                f"{result.publishers} publishers, {result.categories} categories "
+                f"and {result.links} links: {result.rows} rows in {elapsed:.1f}s "
+                f"({result.rows / elapsed:.0f} rows/s)."
+            )
+        )
@@ -0,0 +1,429 @@
+"""
+Per-operation request metrics, exported in the Prometheus text format.
+
+MetricsMiddleware records, for each request served by a Ninja operation
+(the Book list, a Book's detail, a patch, get_book_authors and so on):
+
+- its wall time, from the middleware to the response,
+- the time spent executing database queries,
+- the number of queries run,
+- the number of rows those queries returned, and
+- the size of the response body,
+
+each in a Histogram kept for the operation. metrics_view() serves them as
+Prometheus summaries, with the quantiles in QUANTILES:
+
+    path("metrics", metrics_view)
+
+Alongside them, while the response cache is enabled (see books_api.cache),
+the counts of its hits, misses and, for the "locmem" backend, evictions are
+exported as counters. While Book documents are enabled (see
+books_api.documents), how stale the documents of each schema are is
+exported as gauges, read from the database with staleness() on each scrape.
+
+Requests running more queries than BOOKS_API_QUERY_COUNT_WARNING are logged
+as a warning, so that N+1 query regressions stand out:
+
+    # Warn about requests running more than 20 queries; None to never warn
+    BOOKS_API_QUERY_COUNT_WARNING = 20
+
+Metrics are held in memory, per process. Each worker process of a
+deployment serves its own, to be scraped separately.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from ninja.operation import Operation, PathView
+
+from books_api.cache import LocMemResponseCache, get_response_cache
+from books_api.documents import documents_enabled, registered_schemas, staleness
+
+logger = logging.getLogger(__name__)
+
+# The quantiles of each histogram exported
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# (name, help, unit scale) of the histograms kept per operation. Times are
+# recorded in microseconds and exported in seconds.
+METRICS = (
+    ("request_duration_seconds", "Wall time of requests.", 1e-6),
+    ("db_duration_seconds", "Time requests spent executing queries.", 1e-6),
+    ("db_queries", "Database queries run per request.", 1),
+    ("db_rows", "Rows returned by the database per request.", 1),
+    ("response_bytes", "Size of response bodies.", 1),
+)
+
+_PREFIX = "books_api_"
+
+
+class Histogram:
+    """
+    A histogram of non-negative integers in the manner of an HDR histogram:
+    values below 2 ** significant_bits are counted exactly, and larger ones
+    in buckets whose width grows with their magnitude, keeping the relative
+    error of the quantiles read from it under 2 ** -significant_bits
+    whatever the range of values recorded, in memory logarithmic in it.
+    """
+
+    def __init__(self, significant_bits: int = 5):
+        self.significant_bits = significant_bits
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def bucket(self, value: int) -> int:
+        """The lowest value of the bucket value is counted in."""
+        shift = max(value.bit_length() - self.significant_bits, 0)
+        return value >> shift << shift
+
+    def bucket_top(self, bucket: int) -> int:
+        """The highest value counted in bucket."""
+        shift = max(bucket.bit_length() - self.significant_bits, 0)
+        return bucket + (1 << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        bucket = self.bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> int:
+        """
+        The value below which a fraction q of those recorded fall, to within
+        the precision of its bucket. 0 if none have been recorded.
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_top(bucket), self.max)
+        return self.max
+
+
+@dataclass
+class RequestStats:
+    """The database work done while serving a request."""
+
+    queries: int = 0
+    db_microseconds: int = 0
+    rows: int = 0
+
+
+@dataclass
+class OperationMetrics:
+    histograms: dict[str, Histogram] = field(
+        default_factory=lambda: {name: Histogram() for name, _, _ in METRICS}
+    )
+
+
+# Keyed by the (operation, method, route) labels of each operation
+_metrics: dict[tuple[str, str, str], OperationMetrics] = {}
+_lock = threading.Lock()
+
+# The statistics of the request being served, if any
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "books_api_request_stats", default=None
+)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    A database execute wrapper (see connection.execute_wrapper()) counting
+    queries, their time and the rows read from them into the RequestStats
+    of the current request.
+    """
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter_ns()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_microseconds += (time.perf_counter_ns() - started) // 1000
+        _count_rows(context["cursor"], stats)
+
+
+def _count_rows(cursor, stats: RequestStats) -> None:
+    # Rows are read from the cursor after the query has run, so its fetch
+    # methods are wrapped to count them as they are
+    if "fetchmany" in cursor.__dict__:
+        return
+
+    fetchone, fetchmany, fetchall = (
+        cursor.fetchone,
+        cursor.fetchmany,
+        cursor.fetchall,
+    )
+
+    def counting_fetchone():
+        row = fetchone()
+        if row is not None:
+            stats.rows += 1
+        return row
+
+    def counting_fetchmany(*args, **kwargs):
+        rows = fetchmany(*args, **kwargs)
+        stats.rows += len(rows)
+        return rows
+
+    def counting_fetchall():
+        rows = fetchall()
+        stats.rows += len(rows)
+        return rows
+
+    cursor.fetchone = counting_fetchone
+    cursor.fetchmany = counting_fetchmany
+    cursor.fetchall = counting_fetchall
+
+
+def install_query_recorder(connection) -> None:
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def on_connection_created(sender, connection, **kwargs) -> None:
+    install_query_recorder(connection)
+
+
+def operation_labels(request: HttpRequest) -> Optional[tuple[str, str, str]]:
+    """
+    The (operation, method, route) labels of the Ninja operation that served
+    a request, or None if it wasn't served by one.
+    """
+    match = request.resolver_match
+    if match is None:
+        return None
+    path_view = getattr(match.func, "__self__", None)
+    if not isinstance(path_view, PathView):
+        return None
+
+    operation: Optional[Operation] = next(
+        (op for op in path_view.operations if request.method in op.methods), None
+    )
+    if operation is None:
+        return None
+    name = getattr(operation, "url_name", None) or operation.view_func.__name__
+    return name, request.method, match.route
+
+
+def record_request(
+    labels: tuple[str, str, str],
+    duration_microseconds: int,
+    stats: RequestStats,
+    response_bytes: int,
+) -> None:
+    values = {
+        "request_duration_seconds": duration_microseconds,
+        "db_duration_seconds": stats.db_microseconds,
+        "db_queries": stats.queries,
+        "db_rows": stats.rows,
+        "response_bytes": response_bytes,
+    }
+    with _lock:
+        histograms = _metrics.setdefault(labels, OperationMetrics()).histograms
+        for name, value in values.items():
+            histograms[name].record(value)
+
+
+def reset() -> None:
+    """Forget every metric recorded so far."""
+    with _lock:
+        _metrics.clear()
+
+
+class MetricsMiddleware:
+    """
+    Record the metrics of each request served by a Ninja operation, and warn
+    about requests running more than BOOKS_API_QUERY_COUNT_WARNING queries.
+    Place first in MIDDLEWARE, so that the time taken by the rest is
+    included.
+
+    Serves both WSGI and ASGI requests, so that under ASGI async views
+    aren't run through a thread for this middleware's sake.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats, started = self._start()
+        token = _request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        stats, started = self._start()
+        # Copied into the context of any sync_to_async() the view runs in
+        token = _request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    @staticmethod
+    def _start() -> tuple[RequestStats, int]:
+        for connection in connections.all():
+            install_query_recorder(connection)
+        return RequestStats(), time.perf_counter_ns()
+
+    @staticmethod
+    def _finish(
+        request: HttpRequest, response: HttpResponse, stats: RequestStats, started: int
+    ) -> None:
+        duration = (time.perf_counter_ns() - started) // 1000
+
+        threshold = getattr(settings, "BOOKS_API_QUERY_COUNT_WARNING", None)
+        if threshold is not None and stats.queries > threshold:
+            logger.warning(
+                "%s %s ran %d database queries, more than the %d allowed by "
+                "BOOKS_API_QUERY_COUNT_WARNING",
+                request.method,
+                request.path,
+                stats.queries,
+                threshold,
+            )
+
+        labels = operation_labels(request)
+        if labels is not None:
+            # Streamed responses, such as exports, have no length up front
+            size = 0 if response.streaming else len(response.content)
+            record_request(labels, duration, stats, size)
+
+
+def render_metrics() -> str:
+    """
+    Every histogram recorded, as Prometheus summaries, followed by the
+    response cache's counters and the Book documents' staleness.
+    """
+    with _lock:
+        recorded = {
+            labels: {
+                name: (
+                    [(q, histogram.quantile(q)) for q in QUANTILES],
+                    histogram.total,
+                    histogram.count,
+                )
+                for name, histogram in metrics.histograms.items()
+            }
+            for labels, metrics in sorted(_metrics.items())
+        }
+    return "".join(
+        itertools.chain(
+            _summary_lines(recorded),
+            _response_cache_lines(),
+            _book_document_lines(),
+        )
+    )
+
+
+def _summary_lines(recorded: dict) -> Iterator[str]:
+    for name, help_text, scale in METRICS:
+        metric = f"{_PREFIX}{name}"
+        yield f"# HELP {metric} {help_text}\n"
+        yield f"# TYPE {metric} summary\n"
+        for (operation, method, route), histograms in recorded.items():
+            quantiles, total, count = histograms[name]
+            labels = (
+                f'operation="{_escape(operation)}",'
+                f'method="{_escape(method)}",'
+                f'route="{_escape(route)}"'
+            )
+            for q, value in quantiles:
+                yield f'{metric}{{{labels},quantile="{q}"}} {_number(value * scale)}\n'
+            yield f"{metric}_sum{{{labels}}} {_number(total * scale)}\n"
+            yield f"{metric}_count{{{labels}}} {count}\n"
+
+
+def _response_cache_lines() -> Iterator[str]:
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return
+
+    counters = [
+        (
+            "response_cache_hits_total",
+            "Responses served from the response cache.",
+            response_cache.hits,
+        ),
+        (
+            "response_cache_misses_total",
+            "Lookups in the response cache that found no response.",
+            response_cache.misses,
+        ),
+    ]
+    # The "django" backend's evictions are made by the cache backend, unseen
+    if isinstance(response_cache, LocMemResponseCache):
+        counters.append(
+            (
+                "response_cache_evictions_total",
+                "Responses evicted to keep the response cache within MAX_ENTRIES.",
+                response_cache.evictions,
+            )
+        )
+    for name, help_text, value in counters:
+        metric = f"{_PREFIX}{name}"
+        yield f"# HELP {metric} {help_text}\n"
+        yield f"# TYPE {metric} counter\n"
+        yield f"{metric} {value}\n"
+
+
+def _book_document_lines() -> Iterator[str]:
+    if not documents_enabled():
+        return
+
+    by_schema = {key: staleness(key) for key in registered_schemas()}
+    for name, help_text in (
+        ("missing", "Books without a document."),
+        ("stale", "Documents built before a row they render last changed."),
+        ("max_lag_seconds", "How far the stalest document is behind its rows."),
+    ):
+        metric = f"{_PREFIX}book_documents_{name}"
+        yield f"# HELP {metric} {help_text}\n"
+        yield f"# TYPE {metric} gauge\n"
+        for key, report in sorted(by_schema.items()):
+            yield f'{metric}{{schema="{_escape(key)}"}} {_number(report[name])}\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """The recorded metrics, in the Prometheus text exposition format."""
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
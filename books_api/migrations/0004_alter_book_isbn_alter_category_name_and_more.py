@@ -0,0 +1,79 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+def normalise_isbn(isbn):
+    # As books_api.models.normalise_isbn() was when this migration was written
+    return isbn.replace("-", "").replace(" ", "").upper()
+
+
+def normalise_isbns(apps, schema_editor):
+    # Existing ISBNs must be normalised in the same way as Book.save() does
+    # before the unique constraint can be added
+    Book = apps.get_model("books_api", "Book")
+    for book in Book.objects.only("isbn").iterator():
+        normalised_isbn = normalise_isbn(book.isbn)
+        if normalised_isbn != book.isbn:
+            Book.objects.filter(pk=book.pk).update(isbn=normalised_isbn)
+
+
+def check_duplicate_isbns(apps, schema_editor):
+    # Books sharing an ISBN would fail the unique constraint. Which of them to
+    # keep, and what to do with the others' titles, prices and links, is for
+    # an operator to decide, so the migration stops and lists them instead.
+    Book = apps.get_model("books_api", "Book")
+
+    duplicated = (
+        Book.objects.values("isbn")
+        .annotate(count=models.Count("pk"))
+        .filter(count__gt=1)
+        .values_list("isbn", flat=True)
+    )
+    clashes = [
+        f"ISBN {isbn!r} is shared by Books "
+        + ", ".join(
+            map(
+                str,
+                Book.objects.filter(isbn=isbn)
+                .order_by("pk")
+                .values_list("pk", flat=True),
+            )
+        )
+        for isbn in sorted(duplicated)
+    ]
+    if clashes:
+        raise RuntimeError(
+            "Books must have unique ISBNs before the unique constraint can be added. "
+            "Change or delete the clashing Books, then migrate again:\n  "
+            + "\n  ".join(clashes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books_api", "0003_alter_category_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_isbns, migrations.RunPython.noop),
+        migrations.RunPython(check_duplicate_isbns, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="book",
+            name="isbn",
+            field=models.CharField(max_length=13, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="category",
+            name="name",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                fields=["last_name", "first_name"],
+                name="books_api_a_last_na_f729d8_idx",
+            ),
+        ),
+    ]
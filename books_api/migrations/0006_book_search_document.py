@@ -0,0 +1,91 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import books_api.models
+
+# The FTS5 table behind BookSearchDocument, filled with the documents of the
+# existing Books. Only SQLite has FTS5; elsewhere books_api.search falls back
+# to substring search.
+CREATE_SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE books_api_book_search USING fts5(
+        title, authors, publisher, categories,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+FILL_SEARCH_TABLE = """
+    INSERT INTO books_api_book_search (rowid, title, authors, publisher, categories)
+    SELECT
+        book.id,
+        book.title,
+        COALESCE((
+            SELECT group_concat(author.first_name || ' ' || author.last_name, ' ')
+            FROM books_api_author_books AS link
+            JOIN books_api_author AS author ON author.id = link.author_id
+            WHERE link.book_id = book.id
+        ), ''),
+        publisher.name,
+        COALESCE((
+            SELECT group_concat(category.name, ' ')
+            FROM books_api_category_books AS link
+            JOIN books_api_category AS category ON category.id = link.category_id
+            WHERE link.book_id = book.id
+        ), '')
+    FROM books_api_book AS book
+    JOIN books_api_publisher AS publisher ON publisher.id = book.publisher_id
+"""
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(CREATE_SEARCH_TABLE)
+        schema_editor.execute(FILL_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE books_api_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books_api", "0005_author_updated_at_book_updated_at_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchDocument",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="books_api.book",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("authors", models.TextField()),
+                ("publisher", models.TextField()),
+                ("categories", models.TextField()),
+                (
+                    "index",
+                    books_api.models.FullTextIndexField(
+                        db_column="books_api_book_search"
+                    ),
+                ),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "books_api_book_search",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books_api", "0006_book_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("schema", models.CharField(max_length=255)),
+                ("content", models.TextField()),
+                ("built_at", models.DateTimeField()),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="documents",
+                        to="books_api.book",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="bookdocument",
+            constraint=models.UniqueConstraint(
+                fields=("book", "schema"), name="unique_book_document_per_schema"
+            ),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Lookup
 
 
 class BookFormatChoices(models.TextChoices):
@@ -7,12 +8,26 @@ class BookFormatChoices(models.TextChoices):
     EBOOK = "Ebook"
 
 
+def normalise_isbn(isbn: str) -> str:
+    """
+    ISBNs are stored without the hyphens or spaces they are often written
+    with, and with any "X" check digit in upper case, so that one book can't
+    be stored twice under differently formatted ISBNs.
+    """
+    return isbn.replace("-", "").replace(" ", "").upper()
+
+
 class Book(models.Model):
     title = models.CharField(max_length=255)
-    isbn = models.CharField(max_length=13)
+    isbn = models.CharField(max_length=13, unique=True)
     format = models.CharField(max_length=25, choices=BookFormatChoices.choices)
     rrp = models.DecimalField(max_digits=5, decimal_places=2)
     publisher = models.ForeignKey("Publisher", on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.isbn = normalise_isbn(self.isbn)
+        super().save(*args, **kwargs)
 
 
 class Author(models.Model):
@@ -21,15 +36,128 @@ class Author(models.Model):
     year_of_birth = models.PositiveSmallIntegerField()
     year_of_death = models.PositiveSmallIntegerField(null=True, blank=True)
     books = models.ManyToManyField("Book", related_name="authors")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["last_name", "first_name"])]
 
 
 class Publisher(models.Model):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class Category(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     books = models.ManyToManyField("Book", related_name="categories")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "categories"
+
+
+class BookDocument(models.Model):
+    """
+    A Book's response body, rendered ahead of time with one of the response
+    schemas of the Book routes (see books_api.documents).
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="documents")
+    # The registered schema the document was rendered with
+    schema = models.CharField(max_length=255)
+    content = models.TextField()
+    built_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "schema"], name="unique_book_document_per_schema"
+            )
+        ]
+
+
+class JobStatusChoices(models.TextChoices):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(models.Model):
+    """
+    A heavy write operation, such as a large import or bulk delete, queued
+    to run outside the request that submitted it (see books_api.jobs).
+    """
+
+    # The registered handler that runs the job
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=JobStatusChoices, default=JobStatusChoices.QUEUED
+    )
+    # The worker thread that claimed the job, and how many times it has been
+    # claimed, including by workers that stopped before finishing it
+    worker = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    # None where the number of rows isn't known up front
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Updated as a running job makes progress, so that jobs whose worker
+    # stopped can be told apart from those that are merely slow
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"], name="job_status_idx")]
+
+
+class Match(Lookup):
+    """An SQLite full-text "MATCH" condition."""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class FullTextIndexField(models.TextField):
+    """
+    The hidden column of an FTS5 table that is named after the table itself,
+    which a MATCH condition is applied to in order to search every column.
+    """
+
+
+FullTextIndexField.register_lookup(Match)
+
+
+class BookSearchDocument(models.Model):
+    """
+    A Book's row in the full-text search index, an FTS5 table on SQLite,
+    which is created by migration and kept in sync by books_api.search
+    rather than written through the ORM.
+    """
+
+    book = models.OneToOneField(
+        Book,
+        primary_key=True,
+        db_column="rowid",
+        on_delete=models.DO_NOTHING,
+        related_name="search_document",
+    )
+    title = models.TextField()
+    authors = models.TextField()
+    publisher = models.TextField()
+    categories = models.TextField()
+    index = FullTextIndexField(db_column="books_api_book_search")
+    # BM25 relevance of the row to the MATCH condition; lower is more relevant
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "books_api_book_search"
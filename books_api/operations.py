@@ -0,0 +1,834 @@
+"""
+Adjustments applied to the operations of already built Ninja routers,
+such as those generated by AutoDojo.
+
+AutoDojo generates plain CRUD view functions for a model. Rather than
+hand-writing replacements for them, the functions here wrap the view
+functions of the generated operations, so that behaviour derived from the
+operation's own response schema can be layered on top.
+"""
+
+import json
+from contextvars import ContextVar
+from functools import partial, wraps
+from typing import Any, Iterable, Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from ninja import FilterSchema, Query, Router
+from ninja.constants import NOT_SET
+from ninja.errors import HttpError
+from ninja.operation import Operation
+from ninja.pagination import PaginationBase, make_response_paginated, paginate
+from ninja.signature import ViewSignature
+from ninja.signature.details import is_collection_type
+from ninja.utils import contribute_operation_args, is_async_callable
+from pydantic import BaseModel
+
+from books_api import documents
+from books_api.cache import (
+    CachedResponse,
+    collection_tag,
+    get_response_cache,
+    object_tag,
+    reverse_tag,
+)
+from books_api.fieldsets import Selection, parse_fields, trim
+from books_api.helpers import adelete_object, apatch_object, aupdate_object
+from books_api.models import BookDocument
+from books_api.querysets import load_related_for_schema, nested_schema, schema_fields
+from books_api.renderers import ITEM_SEPARATOR, KEY_SEPARATOR, render_json
+from books_api.schemas import ErrorSchema
+from books_api.serialisation import compile_extractor
+from books_api.versions import collection_version, object_version, version_tag
+
+# Set while serve_book_documents() runs a list view, whose Books only need
+# their ids loaded
+_ids_only: ContextVar[bool] = ContextVar("books_api_ids_only", default=False)
+
+# The query parameter select_response_fields() adds
+SELECTION_PARAM = "fields"
+
+# The fields selected by a request's "fields" parameter, while
+# select_response_fields() runs its view
+_selection: ContextVar[Optional[Selection]] = ContextVar(
+    "books_api_selection", default=None
+)
+
+
+def router_operations(router: Router, method: str) -> Iterator[Operation]:
+    for path_view in router.path_operations.values():
+        for operation in path_view.operations:
+            if method in operation.methods:
+                yield operation
+
+
+def response_schema(
+    operation: Operation, status: int = 200
+) -> Optional[type[BaseModel]]:
+    """
+    The schema used for an operation's response body, with any list[]
+    wrapping removed. None if the operation doesn't declare one.
+    """
+    response_model = operation.response_models.get(status)
+    if response_model in (None, NOT_SET):
+        return None
+    return nested_schema(response_model.model_fields["response"].annotation)
+
+
+def returns_collection(operation: Operation, status: int = 200) -> bool:
+    response_model = operation.response_models.get(status)
+    if response_model in (None, NOT_SET):
+        return False
+    return is_collection_type(response_model.model_fields["response"].annotation)
+
+
+def replace_view_func(operation: Operation, view_func) -> None:
+    """
+    Swap an operation's view function for one that takes different
+    parameters, re-reading its signature and running any callbacks it
+    contributes, as Ninja does when an operation is first created.
+    """
+    operation.view_func = view_func
+    operation.signature = ViewSignature(operation.path, view_func)
+    operation.models = operation.signature.models
+
+    # functools.wraps() copies the callbacks of the wrapped view function onto
+    # its wrapper, so callbacks that have already been run (such as the one
+    # that changes the response schema of a paginated view) are skipped.
+    applied_callbacks = operation.__dict__.setdefault("applied_callbacks", [])
+    for callback in getattr(view_func, "_ninja_contribute_to_operation", []):
+        if callback not in applied_callbacks:
+            callback(operation)
+            applied_callbacks.append(callback)
+
+
+def report_conflicts(router: Router) -> None:
+    """
+    Declare a 409 Conflict response, with an error body, for the PATCH and PUT
+    operations of a router, which books_api.helpers responds with when a
+    unique field would take a value that is already taken. Ninja refuses to
+    send a status the operation doesn't declare.
+    """
+    for method in ("PATCH", "PUT"):
+        for operation in router_operations(router, method):
+            if {409, Ellipsis} & operation.response_models.keys():
+                continue
+            operation.response_models[409] = operation._create_response_model(
+                ErrorSchema
+            )
+
+
+def filter_list_responses(router: Router, filter_schema: type[FilterSchema]) -> None:
+    """
+    Add the fields of filter_schema as query parameters to every GET
+    operation of a router that responds with a list, filtering the returned
+    queryset with them.
+    """
+    for operation in list(router_operations(router, "GET")):
+        if not returns_collection(operation):
+            continue
+
+        replace_view_func(operation, _with_filters(operation.view_func, filter_schema))
+
+
+def _with_filters(view_func, filter_schema):
+    @wraps(view_func)
+    def view_with_filters(request: HttpRequest, *args: Any, **kwargs: Any):
+        filters = kwargs.pop("filters")
+        return filters.filter(view_func(request, *args, **kwargs))
+
+    contribute_operation_args(view_with_filters, "filters", filter_schema, Query(...))
+    return view_with_filters
+
+
+def paginate_list_responses(
+    router: Router, pagination_class: type[PaginationBase], **paginator_params: Any
+) -> None:
+    """
+    Paginate every GET operation of a router that responds with a list.
+    The response schema becomes the paginator's Output schema, with the
+    original list under "items".
+    """
+    for operation in list(router_operations(router, "GET")):
+        if not returns_collection(operation):
+            continue
+
+        replace_view_func(
+            operation,
+            paginate(pagination_class, **paginator_params)(operation.view_func),
+        )
+
+
+def load_related_for_responses(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Wrap the GET operations of a router so that the querysets and objects
+    they return have the related rows needed by their response schema loaded
+    up front, rather than lazily, once per object, during serialisation.
+    """
+    model_class = apps.get_model(app_label, model_name)
+
+    for operation in router_operations(router, "GET"):
+        schema = response_schema(operation)
+        if schema is None:
+            continue
+
+        operation.view_func = _with_related_loaded(
+            operation.view_func, schema, model_class
+        )
+
+
+def _with_related_loaded(view_func, schema, model_class):
+    @wraps(view_func)
+    def view_with_related_loaded(request: HttpRequest, *args: Any, **kwargs: Any):
+        result = view_func(request, *args, **kwargs)
+        if _ids_only.get() and isinstance(result, QuerySet):
+            # Only the ids are needed, to look up the stored documents by (see
+            # serve_book_documents())
+            return result.only(model_class._meta.pk.name)
+        return load_related_for_schema(result, schema, model_class, _selection.get())
+
+    return view_with_related_loaded
+
+
+def cache_get_responses(
+    router: Router,
+    app_label: str,
+    model_name: str,
+    path_param_models: Optional[dict[str, str]] = None,
+    exclude: Iterable[str] = (),
+) -> None:
+    """
+    Serve the GET operations of a router from the response cache, when
+    BOOKS_API_RESPONSE_CACHE enables it (see books_api.cache). Operations
+    whose view functions are named in exclude are left uncached.
+
+    Responses are tagged with the objects of model_name, and of the related
+    models, found in the body. Responses that are lists are also tagged with
+    model_name as a whole, and responses to paths with an "id" parameter with
+    that object of model_name. path_param_models maps other path parameters,
+    or "id" for responses about another model, to the model names their
+    values are primary keys of, e.g. {"id": "Book"} for a Book's list of
+    author ids.
+
+    Requests selecting fields (see select_response_fields()) aren't cached,
+    as their bodies can leave out the primary keys the tags are read from.
+
+    As whether an operation returns a list is read from its response schema,
+    this must be called before paginate_list_responses().
+    """
+    model_class = apps.get_model(app_label, model_name)
+    path_models = {
+        "id": model_class,
+        **{
+            param: apps.get_model(app_label, name)
+            for param, name in (path_param_models or {}).items()
+        },
+    }
+
+    for operation in router_operations(router, "GET"):
+        if operation.view_func.__name__ in exclude:
+            continue
+        is_list = response_schema(operation) is not None and returns_collection(
+            operation
+        )
+        operation.run = _with_cached_response(
+            operation, operation.run, model_class, path_models, is_list
+        )
+
+
+def _with_cached_response(operation, run, model_class, path_models, is_list):
+    def cache_key(request: HttpRequest) -> str:
+        return f"{request.path}?{request.GET.urlencode()}"
+
+    def cached_response(request: HttpRequest) -> Optional[HttpResponse]:
+        cached = get_response_cache().get(cache_key(request))
+        if cached is None:
+            return None
+        return HttpResponse(
+            cached.content, status=cached.status, content_type=cached.content_type
+        )
+
+    def store_response(request: HttpRequest, kwargs: dict, response) -> None:
+        # Only complete, successful responses are kept; not errors, and not
+        # streamed responses such as exports.
+        if response.status_code != 200 or response.streaming:
+            return
+
+        tags = {
+            object_tag(path_model, kwargs[param])
+            for param, path_model in path_models.items()
+            if param in kwargs
+        }
+        if is_list:
+            tags.add(collection_tag(model_class))
+        schema = response_schema(operation)
+        if schema is not None:
+            _collect_tags(json.loads(response.content), schema, model_class, tags)
+
+        get_response_cache().set(
+            cache_key(request),
+            CachedResponse(
+                status=response.status_code,
+                content_type=response["Content-Type"],
+                content=response.content,
+                tags=frozenset(tags),
+            ),
+        )
+
+    if is_async_callable(run):
+
+        @wraps(run)
+        async def arun_with_cached_response(request: HttpRequest, **kwargs: Any):
+            if get_response_cache() is None or SELECTION_PARAM in request.GET:
+                return await run(request, **kwargs)
+
+            # The cache backend may itself be a database
+            response = await sync_to_async(cached_response)(request)
+            if response is None:
+                response = await run(request, **kwargs)
+                await sync_to_async(store_response)(request, kwargs, response)
+            return response
+
+        return arun_with_cached_response
+
+    @wraps(run)
+    def run_with_cached_response(request: HttpRequest, **kwargs: Any):
+        if get_response_cache() is None or SELECTION_PARAM in request.GET:
+            return run(request, **kwargs)
+
+        response = cached_response(request)
+        if response is None:
+            response = run(request, **kwargs)
+            store_response(request, kwargs, response)
+        return response
+
+    return run_with_cached_response
+
+
+def _collect_tags(data: Any, schema, model_class: type[Model], tags: set) -> None:
+    """
+    Add a tag for each object of model_class, or of a model related to it,
+    rendered in a response body serialised with schema.
+    """
+    if isinstance(data, list):
+        for item in data:
+            _collect_tags(item, schema, model_class, tags)
+        return
+
+    if not isinstance(data, dict):
+        return
+
+    pk_name = model_class._meta.pk.name
+    if pk_name in data:
+        tags.add(object_tag(model_class, data[pk_name]))
+
+    for name, field_info in schema_fields(schema).items():
+        if data.get(name) is None:
+            continue
+        related_schema = nested_schema(field_info.annotation)
+
+        try:
+            model_field = model_class._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Not a relation, but a wrapper around one, such as the "items"
+            # of a paginated response.
+            if related_schema is not None:
+                _collect_tags(data[name], related_schema, model_class, tags)
+            continue
+
+        if not model_field.is_relation:
+            continue
+
+        if model_field.one_to_many and pk_name in data:
+            # Objects added to a reverse foreign key relation are only seen
+            # through their own foreign key, see instance_tags().
+            tags.add(reverse_tag(model_class, data[pk_name]))
+
+        if related_schema is not None:
+            _collect_tags(data[name], related_schema, model_field.related_model, tags)
+
+
+def conditional_get_responses(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Give the GET operations of a router ETag (and, for single objects,
+    Last-Modified) headers read from the version stamps of the rows they
+    render (see books_api.versions), and answer If-None-Match and
+    If-Modified-Since with 304 Not Modified, without running the view.
+
+    Operations returning a single object are expected to take its primary
+    key as their only path parameter. List operations get a version covering
+    the whole of each table they render, combined with the query string.
+
+    As with cache_get_responses(), this must be called before
+    paginate_list_responses(). Calling it after cache_get_responses() lets
+    cached responses be revalidated too.
+    """
+    model_class = apps.get_model(app_label, model_name)
+
+    for operation in router_operations(router, "GET"):
+        schema = response_schema(operation)
+        if schema is None:
+            continue
+
+        operation.run = _with_conditional_response(
+            operation.run, model_class, schema, returns_collection(operation)
+        )
+
+
+def _with_conditional_response(run, model_class, schema, is_list):
+    def current_version(request: HttpRequest, kwargs: dict):
+        """
+        The (ETag, Last-Modified timestamp) of the response, or None if it
+        can't be worked out without running the view.
+        """
+        if is_list:
+            etag = version_tag(
+                {
+                    "query": f"{request.path}?{request.GET.urlencode()}",
+                    "version": collection_version(model_class, schema),
+                }
+            )
+            return quote_etag(etag), None
+
+        if len(kwargs) != 1:
+            return None
+        version = object_version(model_class, *kwargs.values(), schema)
+        if version is None:
+            return None
+        etag, last_modified = version
+        if request.GET:
+            # Such as a selection of fields, which changes the body
+            etag = version_tag({"version": etag, "query": request.GET.urlencode()})
+        return quote_etag(etag), int(last_modified.timestamp())
+
+    def add_version_headers(response, etag: str, timestamp: Optional[int]):
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    if is_async_callable(run):
+
+        @wraps(run)
+        async def arun_with_conditional_response(request: HttpRequest, **kwargs: Any):
+            version = await sync_to_async(current_version)(request, kwargs)
+            if version is None:
+                return await run(request, **kwargs)
+
+            etag, timestamp = version
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = await run(request, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return add_version_headers(response, etag, timestamp)
+
+        return arun_with_conditional_response
+
+    @wraps(run)
+    def run_with_conditional_response(request: HttpRequest, **kwargs: Any):
+        version = current_version(request, kwargs)
+        if version is None:
+            return run(request, **kwargs)
+
+        etag, timestamp = version
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = run(request, **kwargs)
+            if response.status_code != 200:
+                return response
+        return add_version_headers(response, etag, timestamp)
+
+    return run_with_conditional_response
+
+
+def serve_book_documents(router: Router) -> None:
+    """
+    Serve the Book GET operations of a router from the documents stored for
+    their response schema, when BOOKS_API_BOOK_DOCUMENTS enables them (see
+    books_api.documents), rather than serialising each Book per request.
+    Response bodies are byte for byte those the operations render
+    themselves.
+
+    Operations returning a single Book are expected to take its primary key
+    as their only path parameter; those returning lists must have their
+    related rows loaded by load_related_for_responses(), which leaves them
+    to load only ids instead. Documents missing for a requested Book are
+    built on the way.
+
+    The response schema of list operations is read from their pagination,
+    so this must be called after paginate_list_responses().
+    """
+    for operation in router_operations(router, "GET"):
+        schema, paginator = _item_schema(operation)
+        if schema is None:
+            continue
+
+        operation.view_func = _with_book_documents(
+            operation,
+            documents.register_schema(schema),
+            paginator,
+            paginator is not None or returns_collection(operation),
+        )
+
+
+def _paginator(view_func) -> Optional[PaginationBase]:
+    """The paginator applied to a view function by Ninja's paginate(), if any."""
+    for callback in getattr(view_func, "_ninja_contribute_to_operation", []):
+        if isinstance(callback, partial) and callback.func is make_response_paginated:
+            return callback.args[0]
+    return None
+
+
+def _item_schema(
+    operation: Operation,
+) -> tuple[Optional[type[BaseModel]], Optional[PaginationBase]]:
+    """
+    The schema of the objects an operation responds with, looking inside
+    the page of a paginated operation, along with its paginator, if any.
+    """
+    paginator = _paginator(operation.view_func)
+    schema = response_schema(operation)
+    if paginator is not None and schema is not None:
+        schema = nested_schema(
+            schema_fields(schema)[paginator.items_attribute].annotation
+        )
+    return schema, paginator
+
+
+def _serialise_result(
+    operation: Operation,
+    result: Any,
+    extract,
+    model_class: type[Model],
+    paginator: Optional[PaginationBase],
+) -> Any:
+    """
+    The response data for what a view returned, with its objects of
+    model_class serialised by extract, or None to leave it to Ninja.
+    """
+    if isinstance(result, model_class):
+        return extract(result)
+    if isinstance(result, (QuerySet, list)):
+        if not all(isinstance(item, model_class) for item in result):
+            return None
+        return [extract(item) for item in result]
+    if paginator is not None and isinstance(result, dict):
+        items = _serialise_result(
+            operation, result.get(paginator.items_attribute), extract, model_class, None
+        )
+        if items is None:
+            return None
+        page = {
+            name: result.get(name) for name in schema_fields(response_schema(operation))
+        }
+        page[paginator.items_attribute] = items
+        return page
+    return None
+
+
+def _with_book_documents(operation, key, paginator, is_list):
+    view_func = operation.view_func
+
+    def document_response(request: HttpRequest, body: str) -> HttpResponse:
+        renderer = operation.api.renderer
+        return HttpResponse(
+            body, content_type=f"{renderer.media_type}; charset={renderer.charset}"
+        )
+
+    def stored_documents(pks: list) -> list[str]:
+        contents = dict(
+            BookDocument.objects.filter(book_id__in=pks, schema=key).values_list(
+                "book_id", "content"
+            )
+        )
+        missing = [pk for pk in pks if pk not in contents]
+        if missing:
+            documents.build_documents(missing, keys=[key])
+            contents.update(
+                BookDocument.objects.filter(
+                    book_id__in=missing, schema=key
+                ).values_list("book_id", "content")
+            )
+        return [contents[pk] for pk in pks if pk in contents]
+
+    def encode(value: Any) -> str:
+        return render_json(value).decode()
+
+    @wraps(view_func)
+    def view_with_book_documents(request: HttpRequest, *args: Any, **kwargs: Any):
+        if not documents.documents_enabled() or _selection.get() is not None:
+            # Documents hold every field, not a selection of them
+            return view_func(request, *args, **kwargs)
+
+        if not is_list:
+            if args or len(kwargs) != 1:
+                return view_func(request, *args, **kwargs)
+            (pk,) = kwargs.values()
+            found = stored_documents([pk])
+            if not found:
+                # The Book doesn't exist, for the view to respond to as usual
+                return view_func(request, *args, **kwargs)
+            return document_response(request, found[0])
+
+        token = _ids_only.set(True)
+        try:
+            result = view_func(request, *args, **kwargs)
+        finally:
+            _ids_only.reset(token)
+        if isinstance(result, HttpResponse):
+            return result
+
+        if paginator is None:
+            items = stored_documents([book.pk for book in result])
+            return document_response(request, f"[{ITEM_SEPARATOR.join(items)}]")
+
+        # The paginated response, its members in the order of its schema,
+        # with the documents spliced in as its items
+        items_attribute = paginator.items_attribute
+        output_schema = response_schema(operation)
+        members = []
+        for name in schema_fields(output_schema):
+            if name == items_attribute:
+                items = stored_documents([book.pk for book in result[name]])
+                value = f"[{ITEM_SEPARATOR.join(items)}]"
+            else:
+                value = encode(result.get(name))
+            members.append(f"{encode(name)}{KEY_SEPARATOR}{value}")
+        return document_response(request, f"{{{ITEM_SEPARATOR.join(members)}}}")
+
+    return view_with_book_documents
+
+
+def serialise_get_responses(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Serialise the responses of a router's GET operations with extractors
+    compiled from their response schemas (see books_api.serialisation),
+    rather than validating every object with pydantic, while
+    BOOKS_API_FAST_SERIALISATION is enabled. The rendered bodies are the
+    same either way.
+
+    Only objects of model_name returned by the views, alone, in a list or
+    queryset, or in a page of one, are serialised this way. Anything else,
+    such as (status, body) tuples for errors, and responses whose schema
+    can't be compiled, are left to Ninja.
+
+    The response schema of list operations is read from their pagination,
+    so this must be called after paginate_list_responses(), and after
+    serve_book_documents(), whose responses it passes on as they are.
+    """
+    model_class = apps.get_model(app_label, model_name)
+
+    for operation in router_operations(router, "GET"):
+        schema, paginator = _item_schema(operation)
+        if schema is None:
+            continue
+
+        extract = compile_extractor(schema, model_class)
+        if extract is None:
+            continue
+
+        operation.view_func = _with_fast_serialisation(
+            operation, extract, model_class, paginator
+        )
+
+
+def _with_fast_serialisation(operation, extract, model_class, paginator):
+    view_func = operation.view_func
+
+    @wraps(view_func)
+    def view_with_fast_serialisation(request: HttpRequest, *args: Any, **kwargs: Any):
+        result = view_func(request, *args, **kwargs)
+        if not getattr(settings, "BOOKS_API_FAST_SERIALISATION", True):
+            return result
+        if _selection.get() is not None:
+            # Serialised by select_response_fields() instead
+            return result
+
+        data = _serialise_result(operation, result, extract, model_class, paginator)
+        if data is None:
+            return result
+        return operation.api.create_response(request, data, status=200)
+
+    return view_with_fast_serialisation
+
+
+def select_response_fields(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Add a "fields" query parameter to the GET operations of a router,
+    selecting the fields of their response schema to respond with (see
+    books_api.fieldsets), e.g. ?fields=id,title,publisher.name. Fields
+    the schema doesn't have are answered with 400 Bad Request.
+
+    Only the selected columns of the querysets that views return are loaded,
+    and only the selected relations, through load_related_for_responses().
+    Objects views have loaded themselves, such as that of a detail view, only
+    have the selected relations loaded. The selected fields of objects of
+    model_name, alone, in a list or queryset, or in a page of one, are then
+    serialised with extractors compiled for the selection, falling back to
+    pydantic for schemas that can't be. Other responses are left as they are.
+
+    Call this after serialise_get_responses(), the last of the other
+    wrappers, which, like serve_book_documents(), leave requests with a
+    selection to it.
+    """
+    model_class = apps.get_model(app_label, model_name)
+
+    for operation in list(router_operations(router, "GET")):
+        schema, paginator = _item_schema(operation)
+        if schema is None:
+            continue
+
+        replace_view_func(
+            operation,
+            _with_selected_fields(operation, schema, model_class, paginator),
+        )
+
+
+def _with_selected_fields(operation, schema, model_class, paginator):
+    view_func = operation.view_func
+
+    def extractor(selection: Selection):
+        extract = compile_extractor(schema, model_class, selection)
+        if extract is not None:
+            return extract
+        return lambda instance: trim(schema.from_orm(instance).model_dump(), selection)
+
+    @wraps(view_func)
+    def view_with_selected_fields(request: HttpRequest, *args: Any, **kwargs: Any):
+        fields = kwargs.pop(SELECTION_PARAM)
+        if fields is None:
+            return view_func(request, *args, **kwargs)
+
+        try:
+            selection = parse_fields(fields, schema)
+        except ValueError as error:
+            raise HttpError(400, str(error)) from error
+
+        token = _selection.set(selection)
+        try:
+            result = view_func(request, *args, **kwargs)
+        finally:
+            _selection.reset(token)
+
+        data = _serialise_result(
+            operation, result, extractor(selection), model_class, paginator
+        )
+        if data is None:
+            return result
+        return operation.api.create_response(request, data, status=200)
+
+    contribute_operation_args(
+        view_with_selected_fields,
+        SELECTION_PARAM,
+        Optional[str],
+        Query(
+            None,
+            description="Comma-separated fields to respond with, e.g. id,title,publisher.name",
+        ),
+    )
+    return view_with_selected_fields
+
+
+def serve_async(router: Router) -> None:
+    """
+    Make every operation of a router an async one, so that under ASGI its
+    requests are served by the event loop rather than by a worker thread
+    taken for the request's whole lifetime.
+
+    Operations that are already async are left alone. The others, such as
+    those generated by AutoDojo, keep their synchronous view functions and
+    wrappers, and are run with sync_to_async(), as Django's async ORM
+    methods (aget(), asave() and so on) are themselves. That includes
+    serialising the response, as query sets can't be evaluated from the
+    event loop.
+
+    Call this after all other changes to the router's operations, and before
+    the router's URLs are built.
+    """
+    for path_view in router.path_operations.values():
+        for operation in path_view.operations:
+            if operation.is_async:
+                continue
+
+            operation.run = _run_async(operation.run)
+            operation.is_async = True
+            path_view.is_async = True
+
+
+def serve_writes_async(router: Router, app_label: str, model_name: str) -> None:
+    """
+    Serve the PATCH, PUT and DELETE operations of a router generated for
+    model_name with the async helpers of books_api.helpers (apatch_object(),
+    aupdate_object() and adelete_object()), rather than running their
+    synchronous view functions with sync_to_async() as serve_async() does.
+
+    Only the view function is replaced: authentication and rendering the
+    response, which may query, still run in a thread. The operations' paths
+    are expected to have one parameter, the primary key.
+
+    Call this before serve_async(), which leaves the operations alone once
+    they are async.
+    """
+    helpers_by_method = {
+        "PATCH": apatch_object,
+        "PUT": aupdate_object,
+        "DELETE": adelete_object,
+    }
+    for path_view in router.path_operations.values():
+        for operation in path_view.operations:
+            helper = next(
+                (
+                    helper
+                    for method, helper in helpers_by_method.items()
+                    if method in operation.methods
+                ),
+                None,
+            )
+            if helper is None or operation.is_async:
+                continue
+
+            operation.run = _run_write_async(operation, helper, app_label, model_name)
+            operation.is_async = True
+            path_view.is_async = True
+
+
+def _run_write_async(operation, helper, app_label, model_name):
+    # As Operation.run(), with the view function replaced by helper
+    @wraps(operation.run)
+    async def arun(request: HttpRequest, **kwargs: Any):
+        error = await sync_to_async(operation._run_checks)(request)
+        if error:
+            return error
+        try:
+            temporal_response = operation.api.create_temporal_response(request)
+            values = operation._get_values(request, kwargs, temporal_response)
+            (pk,) = kwargs.values()
+            payloads = [
+                value for value in values.values() if isinstance(value, BaseModel)
+            ]
+            result = await helper(app_label, model_name, pk, *payloads)
+            return await sync_to_async(operation._result_to_response)(
+                request, result, temporal_response
+            )
+        except Exception as exc:
+            return operation.api.on_exception(request, exc)
+
+    return arun
+
+
+def _run_async(run):
+    @wraps(run)
+    async def arun(request: HttpRequest, **kwargs: Any):
+        return await sync_to_async(run)(request, **kwargs)
+
+    return arun
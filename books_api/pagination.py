@@ -0,0 +1,142 @@
+"""
+Keyset ("cursor") pagination for list endpoints.
+
+Offset pagination makes the database walk past every skipped row, so later
+pages get progressively slower. Keyset pagination instead remembers the
+ordering value of the last row returned and asks for rows after it, e.g.
+"WHERE id > ?", which an index answers just as quickly for the last page as
+for the first.
+
+Cursors are opaque to clients: the last row's ordering value and primary
+key, JSON encoded and then base64 encoded. Cursors whose values aren't valid
+for the ordering field and primary key are rejected with a 400, rather than
+reaching the database.
+"""
+
+import base64
+import json
+from typing import Any, Optional
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Field as ModelField
+from django.db.models import Model, Q, QuerySet
+from ninja import Field, Schema
+from ninja.conf import settings
+from ninja.errors import HttpError
+from ninja.pagination import PaginationBase
+
+
+def encode_cursor(*values: Any) -> str:
+    data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, fields: list[ModelField]) -> list:
+    """
+    The values of a cursor, converted to the Python types of the fields
+    they are for.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HttpError(400, "Invalid pagination cursor")
+
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise HttpError(400, "Invalid pagination cursor")
+
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, TypeError, ValueError):
+        raise HttpError(400, "Invalid pagination cursor")
+
+
+class CursorPagination(PaginationBase):
+    """
+    Paginates on an indexed column ("id" by default), using the primary key
+    to break ties between rows sharing an ordering value. Prefix the ordering
+    with "-" for descending order.
+
+    The page size is set with the "limit" parameter and capped by the
+    NINJA_PAGINATION_MAX_LIMIT setting.
+    """
+
+    class Input(Schema):
+        limit: int = Field(settings.PAGINATION_PER_PAGE, ge=1)
+        cursor: Optional[str] = None
+
+    class Output(Schema):
+        items: list[Any]
+        next: Optional[str] = None
+
+    def __init__(
+        self,
+        ordering: str = "id",
+        max_limit: int = settings.PAGINATION_MAX_LIMIT,
+        **kwargs: Any,
+    ) -> None:
+        self.descending = ordering.startswith("-")
+        self.ordering_field = ordering.lstrip("-")
+        self.max_limit = max_limit
+        super().__init__(**kwargs)
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        pagination: Input,
+        **params: Any,
+    ) -> Any:
+        limit = min(pagination.limit, self.max_limit)
+        on_pk = self.ordering_field in ("id", "pk")
+
+        direction = "-" if self.descending else ""
+        queryset = queryset.order_by(
+            *(
+                [f"{direction}pk"]
+                if on_pk
+                else [f"{direction}{self.ordering_field}", f"{direction}pk"]
+            )
+        )
+
+        if pagination.cursor:
+            queryset = queryset.filter(
+                self.after_cursor(queryset, pagination.cursor, on_pk)
+            )
+
+        # One row more than requested is fetched, to find out whether there
+        # is a next page without a separate COUNT(*) query.
+        page = list(queryset[: limit + 1])
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = self.cursor_for(page[-1], on_pk)
+
+        return {"items": page, "next": next_cursor}
+
+    def after_cursor(self, queryset: QuerySet, cursor: str, on_pk: bool) -> Q:
+        after = "lt" if self.descending else "gt"
+        pk_field = queryset.model._meta.pk
+
+        if on_pk:
+            (last_pk,) = decode_cursor(cursor, [pk_field])
+            return Q(**{f"pk__{after}": last_pk})
+
+        last_value, last_pk = decode_cursor(
+            cursor, [self.ordering_model_field(queryset), pk_field]
+        )
+        return Q(**{f"{self.ordering_field}__{after}": last_value}) | Q(
+            **{self.ordering_field: last_value, f"pk__{after}": last_pk}
+        )
+
+    def ordering_model_field(self, queryset: QuerySet) -> ModelField:
+        # The ordering can be on an annotation, such as a search's "rank"
+        annotation = queryset.query.annotations.get(self.ordering_field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(self.ordering_field)
+
+    def cursor_for(self, obj: Model, on_pk: bool) -> str:
+        if on_pk:
+            return encode_cursor(obj.pk)
+        return encode_cursor(obj.serializable_value(self.ordering_field), obj.pk)
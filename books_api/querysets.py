@@ -0,0 +1,222 @@
+"""
+Helpers for shaping querysets to suit the response schemas they will be
+serialised with.
+
+A response schema that nests related objects (for example BookOutSchema's
+"publisher" and "authors") causes one extra query per object in a list,
+unless the related rows were loaded up front. The functions here derive the
+select_related()/prefetch_related() lookups from the schema itself, so that
+responses cost a constant number of queries however many objects they hold.
+"""
+
+from typing import Any, Optional, Union, get_args, get_origin
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet, prefetch_related_objects
+from pydantic import BaseModel
+
+
+def nested_schema(annotation: Any) -> Optional[type[BaseModel]]:
+    """
+    Return the schema nested within a field annotation, if there is one.
+    Collections and Optional[] are unwrapped, so both PublisherOutSchema and
+    list[AuthorOutSubSchema] yield the schema class.
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+
+    if get_origin(annotation) in (list, tuple, set, Union):
+        for arg in get_args(annotation):
+            schema = nested_schema(arg)
+            if schema is not None:
+                return schema
+
+    return None
+
+
+def schema_fields(schema: type[BaseModel]) -> dict:
+    # Schemas declared with forward references (such as BookOutSchema) are
+    # only completed once something forces them to be rebuilt.
+    if not schema.__pydantic_complete__:
+        schema.model_rebuild()
+    return schema.model_fields
+
+
+def related_lookups(
+    schema: type[BaseModel], model_class: type[Model], prefix: str = ""
+) -> tuple[list[str], list[str]]:
+    """
+    Work out the related lookups needed to serialise model_class instances
+    with schema, without any further queries.
+
+    Returns a (select_related, prefetch_related) pair of lookup lists:
+    - Nested single-valued relations (foreign keys) are joined in with
+      select_related().
+    - Multi-valued relations (many-to-many and reverse foreign keys) are
+      prefetched, whether they are rendered as nested objects or as a list
+      of ids.
+    Relations below a prefetched relation are themselves prefetched.
+    """
+    select: list[str] = []
+    prefetch: list[str] = []
+
+    for name, field_info in schema_fields(schema).items():
+        try:
+            model_field = model_class._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if not model_field.is_relation:
+            continue
+
+        lookup = f"{prefix}{name}"
+        related_schema = nested_schema(field_info.annotation)
+
+        if model_field.many_to_one or model_field.one_to_one:
+            # Foreign keys rendered as an id are read from the "_id" attribute
+            if related_schema is None:
+                continue
+            select.append(lookup)
+            nested_select, nested_prefetch = related_lookups(
+                related_schema, model_field.related_model, f"{lookup}__"
+            )
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+        else:
+            prefetch.append(lookup)
+            if related_schema is None:
+                continue
+            nested_select, nested_prefetch = related_lookups(
+                related_schema, model_field.related_model, f"{lookup}__"
+            )
+            prefetch.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+
+    return select, prefetch
+
+
+def with_related_lookups(queryset: QuerySet, schema: type[BaseModel]) -> QuerySet:
+    select, prefetch = related_lookups(schema, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def selected_lookups(
+    schema: type[BaseModel],
+    model_class: type[Model],
+    selection: Optional[tuple],
+    prefix: str = "",
+) -> tuple[list[str], list[str], list[Prefetch]]:
+    """
+    As related_lookups(), for only the fields of schema in selection (see
+    books_api.fieldsets), or all of them if selection is None. Also works out
+    the columns to load with only().
+
+    Returns (only, select_related, prefetch_related) lookup lists. The
+    querysets of prefetched relations are themselves narrowed to the
+    selected fields of the related objects, so are Prefetch objects.
+    """
+    only = [f"{prefix}{model_class._meta.pk.name}"]
+    select: list[str] = []
+    prefetch: list[Prefetch] = []
+    selected = None if selection is None else dict(selection)
+
+    for name, field_info in schema_fields(schema).items():
+        if selected is not None and name not in selected:
+            continue
+        try:
+            model_field = model_class._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        lookup = f"{prefix}{name}"
+        related_schema = nested_schema(field_info.annotation)
+        subselection = None if selected is None else selected[name]
+
+        if not model_field.is_relation:
+            only.append(lookup)
+        elif model_field.many_to_one or model_field.one_to_one:
+            if model_field.concrete:
+                only.append(lookup)
+            if related_schema is None:
+                continue
+            select.append(lookup)
+            nested_only, nested_select, nested_prefetch = selected_lookups(
+                related_schema, model_field.related_model, subselection, f"{lookup}__"
+            )
+            only.extend(nested_only)
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+        else:
+            related_model = model_field.related_model
+            related_only, related_select, related_prefetch = (
+                selected_lookups(related_schema, related_model, subselection)
+                if related_schema is not None
+                else ([related_model._meta.pk.name], [], [])
+            )
+            if model_field.one_to_many:
+                # Prefetched objects are matched to this one by their foreign key
+                related_only.append(model_field.field.name)
+            prefetch.append(
+                Prefetch(
+                    lookup,
+                    queryset=related_model._default_manager.only(*related_only)
+                    .select_related(*related_select)
+                    .prefetch_related(*related_prefetch),
+                )
+            )
+
+    return only, select, prefetch
+
+
+def with_selected_lookups(
+    queryset: QuerySet, schema: type[BaseModel], selection: Optional[tuple]
+) -> QuerySet:
+    only, select, prefetch = selected_lookups(schema, queryset.model, selection)
+    queryset = queryset.only(*only)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def load_related_for_schema(
+    result: Any,
+    schema: type[BaseModel],
+    model_class: type[Model],
+    selection: Optional[tuple] = None,
+) -> Any:
+    """
+    Apply the schema's related lookups to whatever a view returned:
+    a queryset, a model instance, a list of instances or a
+    (status, body) tuple wrapping any of those. Anything else is
+    returned untouched.
+
+    Given a selection of the schema's fields, only those are loaded.
+    Instances the view has already loaded have the selected relations
+    loaded, but their own columns can no longer be narrowed.
+    """
+    if isinstance(result, tuple) and len(result) == 2:
+        status, body = result
+        return status, load_related_for_schema(body, schema, model_class, selection)
+
+    if isinstance(result, QuerySet):
+        if result.model is not model_class:
+            return result
+        if selection is not None:
+            return with_selected_lookups(result, schema, selection)
+        return with_related_lookups(result, schema)
+
+    instances = result if isinstance(result, list) else [result]
+    if instances and all(isinstance(obj, model_class) for obj in instances):
+        if selection is not None:
+            _, select, prefetch = selected_lookups(schema, model_class, selection)
+        else:
+            select, prefetch = related_lookups(schema, model_class)
+        prefetch_related_objects(instances, *select, *prefetch)
+
+    return result
@@ -0,0 +1,56 @@
+"""
+The ids of the objects related to many others at once, read with a single
+query against the table holding the relation: the through table of a
+many-to-many relation, or the table with the foreign key. The objects the
+relations start from aren't loaded, or even checked for.
+
+Each function maps every id asked for to the ids related to it, in
+ascending order, with ids that have none, including those of objects that
+don't exist, mapped to an empty list. The ids asked for are the keys of a
+JSON object when returned from a view, so are given as strings.
+"""
+
+from typing import Iterable
+
+from django.db.models import Model
+
+from books_api.models import Author, Book, Category
+
+# The most ids that can be asked for at once, keeping each query's IN (...)
+# list well within SQLite's limit on query parameters
+MAX_IDS = 1000
+
+
+def related_ids(
+    model_class: type[Model], from_field: str, to_field: str, ids: Iterable[int]
+) -> dict[str, list[int]]:
+    """
+    The to_field values of model_class rows for each of ids, matched against
+    their from_field.
+    """
+    ids = list(dict.fromkeys(ids))
+    related: dict[str, list[int]] = {str(pk): [] for pk in ids}
+    rows = (
+        model_class._default_manager.filter(**{f"{from_field}__in": ids})
+        .order_by(from_field, to_field)
+        .values_list(from_field, to_field)
+    )
+    for from_id, to_id in rows:
+        related[str(from_id)].append(to_id)
+    return related
+
+
+def book_author_ids(book_ids: Iterable[int]) -> dict[str, list[int]]:
+    return related_ids(Author.books.through, "book_id", "author_id", book_ids)
+
+
+def book_category_ids(book_ids: Iterable[int]) -> dict[str, list[int]]:
+    return related_ids(Category.books.through, "book_id", "category_id", book_ids)
+
+
+def author_book_ids(author_ids: Iterable[int]) -> dict[str, list[int]]:
+    return related_ids(Author.books.through, "author_id", "book_id", author_ids)
+
+
+def publisher_book_ids(publisher_ids: Iterable[int]) -> dict[str, list[int]]:
+    return related_ids(Book, "publisher_id", "id", publisher_ids)
@@ -0,0 +1,57 @@
+"""
+JSON rendering of API responses with orjson, which encodes several times
+faster than the standard library's json module.
+
+Values orjson doesn't encode the way Ninja's own JSONRenderer does, such as
+Decimals (for "rrp") and datetimes, are handed to NinjaJSONEncoder, so they
+come out exactly as before: Decimals as strings of every stored digit, and
+datetimes to the millisecond. Only the whitespace between items differs,
+orjson having none. orjson is also told to accept the non-string keys the
+standard library's encoder does (ints, floats, booleans and None), turning
+them into strings the same way.
+
+orjson is optional. Without it, the standard library's encoder is used with
+the same compact separators, so responses are the same either way.
+"""
+
+import json
+from typing import Any
+
+from django.http import HttpRequest
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# The separators between the items of arrays, and between the keys and values
+# of objects, in rendered JSON
+ITEM_SEPARATOR = ","
+KEY_SEPARATOR = ":"
+
+_encoder = NinjaJSONEncoder()
+
+
+def render_json(data: Any) -> bytes:
+    """data encoded as UTF-8 JSON."""
+    if orjson is None:
+        return json.dumps(
+            data,
+            cls=NinjaJSONEncoder,
+            ensure_ascii=False,
+            separators=(ITEM_SEPARATOR, KEY_SEPARATOR),
+        ).encode()
+    return orjson.dumps(
+        data,
+        default=_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        return render_json(data)
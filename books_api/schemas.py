@@ -1,8 +1,19 @@
-from typing import Literal
+from datetime import datetime
+from decimal import Decimal
+from typing import Literal, Optional
 
-from ninja import Schema, ModelSchema
+from ninja import Field, FilterSchema, Schema, ModelSchema
+from pydantic import field_validator
 
-from books_api.models import Book, Publisher, Author, Category
+from books_api.models import (
+    Book,
+    BookFormatChoices,
+    Publisher,
+    Author,
+    Category,
+    normalise_isbn,
+)
+from books_api.relations import MAX_IDS
 
 
 class ErrorSchema(Schema):
@@ -21,16 +32,27 @@ class BookOutSchema(ModelSchema):
 class BookInSchema(ModelSchema):
     class Config:
         model = Book
-        model_exclude = ["id"]  # ID provided in URL
+        model_exclude = ["id", "updated_at"]  # ID provided in URL, stamp set on save
+
+    # Normalised before the max_length check, so hyphenated ISBNs are accepted
+    @field_validator("isbn", mode="before", check_fields=False)
+    @classmethod
+    def clean_isbn(cls, value):
+        return normalise_isbn(value) if isinstance(value, str) else value
 
 
 class BookInPatchSchema(ModelSchema):
     class Meta:
         model = Book
         fields = "__all__"
-        exclude = ("id",)
+        exclude = ("id", "updated_at")
         fields_optional = "__all__"
 
+    @field_validator("isbn", mode="before", check_fields=False)
+    @classmethod
+    def clean_isbn(cls, value):
+        return normalise_isbn(value) if isinstance(value, str) else value
+
 
 class BookOutSubSchema(ModelSchema):
     class Config:
@@ -38,6 +60,48 @@ class BookOutSubSchema(ModelSchema):
         model_fields = "__all__"
 
 
+class BookBulkInSchema(BookInSchema):
+    """
+    A single item of a bulk create request: a book, along with the ids of
+    its authors and categories.
+    """
+
+    authors: list[int] = []
+    categories: list[int] = []
+
+
+class BookBulkCreateResultSchema(Schema):
+    """
+    Per-item result of a bulk create request, identified by the item's index
+    in the request. "status" mirrors the HTTP status the equivalent single
+    object create would have responded with.
+    """
+
+    index: int
+    status: int
+    response: BookOutSubSchema | ErrorSchema
+
+
+class BookBulkPatchSchema(Schema):
+    """
+    A single item of a bulk PATCH request: the primary key of the
+    Book to modify and the fields to change on it.
+    """
+
+    id: int
+    patch: BookInPatchSchema
+
+
+class BookBulkPatchResultSchema(Schema):
+    """
+    Per-item result of a bulk PATCH request. "status" mirrors the HTTP
+    status the equivalent single-object PATCH would have responded with.
+    """
+
+    status: int
+    response: BookOutSubSchema | ErrorSchema
+
+
 class PublisherOutSchema(ModelSchema):
     class Config:
         model = Publisher
@@ -50,10 +114,22 @@ class CategoryOutSchema(ModelSchema):
         model_fields = "__all__"
 
 
+class CategoryOutSubSchema(ModelSchema):
+    """
+    As with AuthorOutSubSchema, used when categories are listed as part
+    of a book, so the category's "books" aren't listed again.
+    """
+
+    class Config:
+        model = Category
+        model_fields = "__all__"
+        model_exclude = ["books"]
+
+
 class AuthorInSchema(ModelSchema):
     class Config:
         model = Author
-        model_exclude = ["id", "books"]  # ID provided in URL
+        model_exclude = ["id", "books", "updated_at"]  # As for BookInSchema
 
 
 class AuthorInPatchSchema(ModelSchema):
@@ -63,6 +139,7 @@ class AuthorInPatchSchema(ModelSchema):
         exclude = (
             "id",
             "books",
+            "updated_at",
         )
         fields_optional = "__all__"
 
@@ -101,5 +178,120 @@ class AuthorOutSubSchema(ModelSchema):
         model_exclude = ["books"]
 
 
+class BookExportSchema(BookOutSchema):
+    """
+    A book as it appears in the full catalogue export, which includes
+    the book's categories as well as its publisher and authors.
+    """
+
+    categories: list[CategoryOutSubSchema]
+
+
+class BookFilterSchema(FilterSchema):
+    isbn: Optional[str] = None
+
+    @field_validator("isbn", mode="before", check_fields=False)
+    @classmethod
+    def clean_isbn(cls, value):
+        return normalise_isbn(value) if isinstance(value, str) else value
+
+
+class AuthorFilterSchema(FilterSchema):
+    last_name: Optional[str] = None
+    first_name: Optional[str] = None
+
+
+class CategoryFilterSchema(FilterSchema):
+    name: Optional[str] = None
+
+
 class PrimaryKeyListSchema(Schema):
     ids: list[int]
+
+
+class RelatedIdsQuerySchema(Schema):
+    """The ids of the objects to list the related ids of, as ?ids=1&ids=2"""
+
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_IDS)
+
+
+class BulkDeleteResultSchema(Schema):
+    deleted: list[int]
+    missing: list[int]
+
+
+class ImportErrorSchema(Schema):
+    line: int
+    error: str
+
+
+class ImportResultSchema(Schema):
+    """
+    The outcome of importing a Book feed: how many Books were inserted and
+    updated, and how many rows were rejected, with the first of the
+    rejected rows' errors.
+    """
+
+    inserted: int
+    updated: int
+    rejected: int
+    errors: list[ImportErrorSchema]
+
+
+class JobSchema(Schema):
+    """
+    A queued job's status and progress (see books_api.jobs). "result" is set
+    once the job has succeeded, and "error" once it has failed.
+    """
+
+    id: int
+    kind: str
+    status: str
+    rows_processed: int
+    rows_total: Optional[int]
+    result: Optional[dict]
+    error: str
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+
+class StatsFilterSchema(Schema):
+    """
+    Restricts the Books statistics are computed over. Prices are inclusive
+    bounds on "rrp"; birth years select Books with at least one author born
+    within them.
+    """
+
+    format: Optional[BookFormatChoices] = None
+    min_rrp: Optional[Decimal] = Field(None, ge=0)
+    max_rrp: Optional[Decimal] = Field(None, ge=0)
+    min_author_year_of_birth: Optional[int] = None
+    max_author_year_of_birth: Optional[int] = None
+
+
+class BookStatsSchema(Schema):
+    count: int
+    average_rrp: Optional[Decimal]
+    min_rrp: Optional[Decimal]
+    max_rrp: Optional[Decimal]
+
+
+class FormatStatsSchema(BookStatsSchema):
+    format: str
+
+
+class PublisherStatsSchema(BookStatsSchema):
+    id: int
+    name: str
+
+
+class CategoryStatsSchema(BookStatsSchema):
+    id: int
+    name: str
+
+
+class AuthorStatsSchema(BookStatsSchema):
+    id: int
+    first_name: str
+    last_name: str
@@ -0,0 +1,254 @@
+"""
+Full-text search of Books by title, author names, publisher name and
+category names.
+
+On SQLite, the index is an FTS5 table (created by migration 0006, and read
+through the BookSearchDocument model) holding one row per Book, keyed by
+the Book's id. Search results are ranked by BM25, best first.
+
+Model signals keep the index in step with the rows a Book's document is
+built from: the Book itself, its Publisher, and the Authors and Categories
+linked to it. Writes that bypass signals, such as QuerySet.bulk_create()
+and bulk_update(), must call index_changed() themselves; the bulk helpers in
+books_api.helpers do. Deletes are followed once per delete, from the
+rows_deleted signal of books_api.deletion, rather than per deleted row, so
+only deletes made with delete_queryset() (as the delete helpers make them)
+update the index. The index can be rebuilt from scratch with the
+rebuild_search_index management command.
+
+Other databases have no FTS5, so fall back to a case-insensitive substring
+search, unranked and in id order.
+"""
+
+import re
+from typing import Iterable, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, FloatField, Model, Q, QuerySet, Value
+
+from books_api.deletion import Deletion
+from books_api.models import Author, Book, Category, Publisher
+
+SEARCH_TABLE = "books_api_book_search"
+
+# The fields, by model, that Books' documents are built from. Saving only
+# other fields leaves the index as it is.
+DOCUMENT_FIELDS = {
+    Book: {"title", "publisher", "publisher_id"},
+    Author: {"first_name", "last_name"},
+    Category: {"name"},
+    Publisher: {"name"},
+}
+
+# Each Book's document, from its own row, its publisher's and those of its
+# authors and categories. Restricted to particular Books by the WHERE clause
+# added to it.
+_DOCUMENT_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, authors, publisher, categories)
+    SELECT
+        book.id,
+        book.title,
+        COALESCE((
+            SELECT group_concat(author.first_name || ' ' || author.last_name, ' ')
+            FROM books_api_author_books AS link
+            JOIN books_api_author AS author ON author.id = link.author_id
+            WHERE link.book_id = book.id
+        ), ''),
+        publisher.name,
+        COALESCE((
+            SELECT group_concat(category.name, ' ')
+            FROM books_api_category_books AS link
+            JOIN books_api_category AS category ON category.id = link.category_id
+            WHERE link.book_id = book.id
+        ), '')
+    FROM books_api_book AS book
+    JOIN books_api_publisher AS publisher ON publisher.id = book.publisher_id
+"""
+
+
+def search_supported(using: str = DEFAULT_DB_ALIAS) -> bool:
+    return connections[using].vendor == "sqlite"
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    An FTS5 query matching Books containing every word of query, with the
+    last word also matching as a prefix, so that results follow a search as
+    it is typed. Words are quoted, so that FTS5's query syntax ("AND", "*",
+    column filters and so on) is taken literally. None if query has no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def search_books(query: str) -> QuerySet:
+    """
+    Books matching query, annotated with a "rank" to order them by, lower
+    being more relevant.
+    """
+    if not search_supported():
+        return substring_search_books(query)
+
+    expression = match_expression(query)
+    if expression is None:
+        return Book.objects.none()
+    return Book.objects.filter(search_document__index__match=expression).annotate(
+        rank=F("search_document__rank")
+    )
+
+
+def substring_search_books(query: str) -> QuerySet:
+    """
+    Books whose title, author names, publisher name or category names
+    contain every word of query, ignoring case, with a constant "rank".
+    This is search without an index, scanning every Book.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return Book.objects.none()
+
+    condition = Q()
+    for word in words:
+        condition &= (
+            Q(title__icontains=word)
+            | Q(authors__first_name__icontains=word)
+            | Q(authors__last_name__icontains=word)
+            | Q(publisher__name__icontains=word)
+            | Q(categories__name__icontains=word)
+        )
+    # Filtered by subquery, as the joins to authors and categories would
+    # otherwise repeat Books
+    return Book.objects.filter(
+        pk__in=Book.objects.filter(condition).values("pk")
+    ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def index_books(pks: Iterable, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    (Re)build the documents of the Books with the given primary keys,
+    removing those of Books that no longer exist.
+    """
+    if not search_supported(using):
+        return
+
+    pks = list(set(pks))
+    connection = connections[using]
+    chunk_size = connection.features.max_query_params or len(pks) or 1
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), chunk_size):
+            chunk = pks[start : start + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", chunk
+            )
+            cursor.execute(f"{_DOCUMENT_SQL} WHERE book.id IN ({placeholders})", chunk)
+
+
+def rebuild_index(using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Rebuild every document from scratch, returning the number of Books
+    indexed.
+    """
+    if not search_supported(using):
+        return 0
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(_DOCUMENT_SQL)
+        # Merge the index's segments, for the fastest queries afterwards
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def linked_book_pks(model_class: type[Model], pks: list, using: str) -> list:
+    """The ids of the Books whose documents include the given objects."""
+    if model_class is Book:
+        return list(pks)
+    if model_class is Publisher:
+        books = Book.objects.using(using).filter(publisher_id__in=pks)
+        return list(books.values_list("pk", flat=True))
+    if model_class in (Author, Category):
+        links = model_class.books.through.objects.using(using).filter(
+            **{f"{model_class._meta.model_name}_id__in": pks}
+        )
+        return list(links.values_list("book_id", flat=True))
+    return []
+
+
+def index_changed(
+    model_class: type[Model],
+    pks: Iterable,
+    using: str = DEFAULT_DB_ALIAS,
+    fields: Optional[Iterable[str]] = None,
+) -> None:
+    """
+    Rebuild the documents including the objects of model_class with the
+    given primary keys, after they were written without sending signals.
+    If the names of the fields that were written are given, documents are
+    only rebuilt if any of those fields are part of them.
+    """
+    if not search_supported(using):
+        return
+    if fields is not None and not DOCUMENT_FIELDS.get(model_class, set()) & set(fields):
+        return
+
+    pks = list(pks)
+    chunk_size = connections[using].features.max_query_params or len(pks) or 1
+    for start in range(0, len(pks), chunk_size):
+        index_books(
+            linked_book_pks(model_class, pks[start : start + chunk_size], using),
+            using,
+        )
+
+
+def on_post_save(
+    sender: type[Model],
+    instance: Model,
+    created: bool,
+    using: str,
+    update_fields: Optional[frozenset],
+    **kwargs,
+) -> None:
+    # A new Author, Category or Publisher isn't linked to any Books yet
+    if isinstance(instance, Book) or not created:
+        index_changed(type(instance), [instance.pk], using, update_fields)
+
+
+def on_rows_deleted(sender: type[Model], deletion: Deletion, **kwargs) -> None:
+    # Removes the documents of the Books deleted, cascades included, and
+    # rebuilds those of the Books that lost links to deleted Authors or
+    # Categories, whose deletes don't send m2m_changed.
+    index_books(deletion.pks(Book) | deletion.unlinked.get(Book, set()), deletion.using)
+
+
+def on_m2m_changed(
+    sender: type[Model],
+    instance: Model,
+    action: str,
+    pk_set: Optional[set],
+    using: str,
+    **kwargs,
+) -> None:
+    if not search_supported(using) or sender not in (
+        Author.books.through,
+        Category.books.through,
+    ):
+        return
+
+    if isinstance(instance, Book):
+        if action in ("post_add", "post_remove", "post_clear"):
+            index_books([instance.pk], using)
+    elif action == "pre_clear":
+        instance._search_linked_book_pks = linked_book_pks(
+            type(instance), [instance.pk], using
+        )
+    elif action in ("post_add", "post_remove"):
+        index_books(pk_set, using)
+    elif action == "post_clear":
+        index_books(getattr(instance, "_search_linked_book_pks", []), using)
@@ -0,0 +1,281 @@
+"""
+Generation of large synthetic catalogues, for benchmarks and staging,
+written with bulk_create() rather than one object (or one request) at a
+time.
+
+The distributions are meant to look like a real catalogue's:
+
+- Books per publisher follow a power law, a few publishers having most of
+  the Books and most having a handful.
+- Each Book has one to five authors, most one, drawn with the same power
+  law, so that some authors are prolific.
+- Each Book is in one to three categories, popular ones more often.
+- RRPs are log-normal around 15.00, and authors' years of birth normal
+  around 1960, the earliest born having since died.
+
+Generation is deterministic for a given seed. Through table rows are
+inserted directly, and everything is written in chunks, each in a
+transaction of its own, so memory use doesn't grow with the catalogue.
+
+On SQLite, durability is traded for speed while loading: PRAGMAs in
+LOAD_PRAGMAS are set on the connection for the duration of the load, then
+restored to what they were. A crash part-way through a load can corrupt the
+database, which is meant to be a new one.
+
+As bulk_create() sends no model signals, the search index is rebuilt,
+and cached statistics and list responses dropped, once loading is done.
+Stored Book documents (see books_api.documents) aren't built; backfill them
+with the book_documents management command if they are enabled.
+"""
+
+import bisect
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Model
+
+from books_api import search
+from books_api.cache import collection_tag, invalidate_tags
+from books_api.database import apply_pragmas
+from books_api.models import Author, Book, BookFormatChoices, Category, Publisher
+from books_api.stats import invalidate as invalidate_stats
+
+# SQLite settings for the duration of a load: no waiting for writes to reach
+# the disk, and the rollback journal kept in memory
+LOAD_PRAGMAS = {"synchronous": "OFF", "journal_mode": "MEMORY"}
+
+# How many Books have each number of authors and categories, relatively
+AUTHORS_PER_BOOK_WEIGHTS = {1: 60, 2: 25, 3: 10, 4: 4, 5: 1}
+CATEGORIES_PER_BOOK_WEIGHTS = {1: 55, 2: 35, 3: 10}
+
+FORMAT_WEIGHTS = {
+    BookFormatChoices.PAPERBACK: 55,
+    BookFormatChoices.HARDBACK: 20,
+    BookFormatChoices.EBOOK: 25,
+}
+
+_TITLE_ADJECTIVES = (
+    "Silent Hidden Broken Golden Distant Last Lost Bitter Crimson Quiet Wild "
+    "Iron Glass Hollow Secret Burning Frozen Northern Forgotten Endless"
+).split()
+_TITLE_NOUNS = (
+    "River Garden Empire Harbour Winter Mirror Lantern Orchard Tower Island "
+    "Forest Crown Storm Shadow Letter Bridge Kingdom Voyage Daughter Machine"
+).split()
+_FIRST_NAMES = (
+    "Ada Alan Ann Ben Clara Daniel Eva Frank Grace Hana Ivan James Kate Leo "
+    "Maria Nina Omar Paul Rosa Sam Tara Umar Vera Will Yuki Zoe"
+).split()
+_LAST_NAMES = (
+    "Adams Baker Chen Diaz Evans Fischer Garcia Hughes Ito Jones Khan Lopez "
+    "Murphy Novak Okafor Patel Quinn Rossi Silva Tanaka Usman Varga Walker "
+    "Young Zhang"
+).split()
+
+# The words of generated titles, and the last names of generated authors, for
+# searches of a seeded catalogue
+TITLE_WORDS = tuple(word.lower() for word in _TITLE_ADJECTIVES + _TITLE_NOUNS)
+AUTHOR_LAST_NAMES = tuple(_LAST_NAMES)
+
+
+@dataclass
+class SeedResult:
+    publishers: int = 0
+    authors: int = 0
+    categories: int = 0
+    books: int = 0
+    links: int = 0
+
+    @property
+    def rows(self) -> int:
+        return (
+            self.publishers + self.authors + self.categories + self.books + self.links
+        )
+
+
+def power_law_sampler(
+    ids: list, exponent: float, rng: random.Random
+) -> Callable[[], object]:
+    """
+    A function drawing one of ids at random, the one at rank r (from 1)
+    with probability proportional to r ** -exponent.
+    """
+    cumulative = list(
+        itertools.accumulate(rank**-exponent for rank in range(1, len(ids) + 1))
+    )
+    total = cumulative[-1]
+
+    def sample():
+        return ids[bisect.bisect(cumulative, rng.random() * total)]
+
+    return sample
+
+
+def distinct_samples(sample: Callable[[], object], count: int) -> list:
+    """count different values drawn with sample()."""
+    drawn: dict = {}
+    while len(drawn) < count:
+        drawn[sample()] = None
+    return list(drawn)
+
+
+@contextmanager
+def load_pragmas(using: str = DEFAULT_DB_ALIAS) -> Iterator[None]:
+    """
+    Apply LOAD_PRAGMAS to a SQLite database's connection within the block,
+    restoring their previous values after it. Other databases are left
+    alone.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        yield
+        return
+
+    connection.ensure_connection()
+    previous = {
+        name: connection.connection.execute(f"PRAGMA {name}").fetchone()[0]
+        for name in LOAD_PRAGMAS
+    }
+    apply_pragmas(connection, LOAD_PRAGMAS)
+    try:
+        yield
+    finally:
+        apply_pragmas(connection, previous)
+
+
+def seed_catalogue(
+    books: int,
+    publishers: int,
+    authors: int,
+    categories: int,
+    seed: int = 0,
+    exponent: float = 1.1,
+    chunk_size: int = 10_000,
+    using: str = DEFAULT_DB_ALIAS,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> SeedResult:
+    """
+    Add a synthetic catalogue to a database, calling progress(model name,
+    rows written so far) after each chunk. The database is expected to
+    have no Books yet, whose ISBNs could clash with those generated.
+    """
+    rng = random.Random(seed)
+    result = SeedResult()
+    progress = progress or (lambda name, rows: None)
+
+    def insert(model_class: type[Model], objects: Iterator[Model]) -> list:
+        pks = []
+        while chunk := list(itertools.islice(objects, chunk_size)):
+            with transaction.atomic(using=using):
+                created = model_class.objects.using(using).bulk_create(chunk)
+            pks.extend(obj.pk for obj in created)
+            progress(model_class._meta.object_name, len(pks))
+        return pks
+
+    with load_pragmas(using):
+        publisher_ids = insert(
+            Publisher,
+            (
+                Publisher(name=f"{rng.choice(_LAST_NAMES)} Press {i}")
+                for i in range(publishers)
+            ),
+        )
+        author_ids = insert(Author, (_author(rng) for _ in range(authors)))
+        category_ids = insert(
+            Category, (Category(name=f"Category {i}") for i in range(categories))
+        )
+        result.publishers = len(publisher_ids)
+        result.authors = len(author_ids)
+        result.categories = len(category_ids)
+
+        # Ranked in a random order, so that the most prolific aren't simply
+        # the first created
+        for ids in (publisher_ids, author_ids, category_ids):
+            rng.shuffle(ids)
+        sample_publisher = power_law_sampler(publisher_ids, exponent, rng)
+        sample_author = power_law_sampler(author_ids, exponent, rng)
+        sample_category = power_law_sampler(category_ids, exponent, rng)
+
+        formats, format_weights = zip(*FORMAT_WEIGHTS.items())
+        for start in range(0, books, chunk_size):
+            count = min(chunk_size, books - start)
+            with transaction.atomic(using=using):
+                created = Book.objects.using(using).bulk_create(
+                    Book(
+                        title=_title(rng),
+                        isbn=f"979{start + i:010d}",
+                        format=rng.choices(formats, format_weights)[0],
+                        rrp=_rrp(rng),
+                        publisher_id=sample_publisher(),
+                    )
+                    for i in range(count)
+                )
+                author_links = [
+                    Author.books.through(author_id=author_id, book_id=book.pk)
+                    for book in created
+                    for author_id in distinct_samples(
+                        sample_author,
+                        min(_weighted(rng, AUTHORS_PER_BOOK_WEIGHTS), len(author_ids)),
+                    )
+                ]
+                category_links = [
+                    Category.books.through(category_id=category_id, book_id=book.pk)
+                    for book in created
+                    for category_id in distinct_samples(
+                        sample_category,
+                        min(
+                            _weighted(rng, CATEGORIES_PER_BOOK_WEIGHTS),
+                            len(category_ids),
+                        ),
+                    )
+                ]
+                Author.books.through.objects.using(using).bulk_create(
+                    author_links, batch_size=chunk_size
+                )
+                Category.books.through.objects.using(using).bulk_create(
+                    category_links, batch_size=chunk_size
+                )
+            result.books += len(created)
+            result.links += len(author_links) + len(category_links)
+            progress("Book", result.books)
+
+    search.rebuild_index(using)
+    invalidate_stats()
+    invalidate_tags(
+        collection_tag(model_class)
+        for model_class in (Book, Author, Category, Publisher)
+    )
+    return result
+
+
+def _weighted(rng: random.Random, weights: dict) -> int:
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _title(rng: random.Random) -> str:
+    return f"The {rng.choice(_TITLE_ADJECTIVES)} {rng.choice(_TITLE_NOUNS)}"
+
+
+def _rrp(rng: random.Random) -> Decimal:
+    # The largest price the field's five digits hold
+    rrp = min(max(math.exp(rng.gauss(math.log(15), 0.5)), 1), 999.99)
+    return Decimal(f"{rrp:.2f}")
+
+
+def _author(rng: random.Random) -> Author:
+    year_of_birth = min(max(round(rng.gauss(1960, 20)), 1900), 2005)
+    year_of_death = None
+    if year_of_birth < 1950 and rng.random() < (1950 - year_of_birth) / 50:
+        year_of_death = min(year_of_birth + rng.randint(40, 95), 2025)
+    return Author(
+        first_name=rng.choice(_FIRST_NAMES),
+        last_name=rng.choice(_LAST_NAMES),
+        year_of_birth=year_of_birth,
+        year_of_death=year_of_death,
+    )
@@ -0,0 +1,153 @@
+"""
+Serialisation of model instances straight to the dicts their response
+schemas would produce, without validating each of them with pydantic.
+
+Ninja validates every object of a response against its schema before
+rendering it, which, once a list endpoint's queries are down to a constant
+few, is most of the time it takes. Rows read from our own database are
+already of the types the schema declares, so for them validation is only
+attribute access.
+
+compile_extractor() derives that attribute access from a schema once, as a
+function of an instance returning exactly what
+schema.from_orm(instance).model_dump() does: the schema's fields, in its
+order, with foreign keys rendered as ids read from their "_id" attribute,
+many-to-many relations as lists of ids or of nested objects, and values such
+as Decimals and datetimes left as they are for the renderer to encode.
+Related rows are expected to have been loaded up front (see
+books_api.querysets).
+
+Schemas doing anything an extractor can't reproduce, such as resolver
+methods, validators, or fields that aren't model fields, aren't compiled,
+and are left to pydantic.
+"""
+
+import datetime
+import functools
+from decimal import Decimal
+from operator import attrgetter
+from types import NoneType
+from typing import Any, Callable, Optional, Union, get_args, get_origin
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, Model
+from ninja import Schema
+from pydantic import BaseModel
+
+from books_api.fieldsets import Selection
+from books_api.querysets import nested_schema, schema_fields
+
+Extractor = Callable[[Model], dict]
+
+# Field types whose values are rendered as read from the model instance
+_PLAIN_TYPES = (
+    bool,
+    int,
+    float,
+    str,
+    Decimal,
+    datetime.date,
+    datetime.datetime,
+    datetime.time,
+)
+
+# Extractors are compiled per selection of fields, which clients choose, so
+# only the most recently used are kept
+MAX_EXTRACTORS = 256
+
+
+@functools.lru_cache(maxsize=MAX_EXTRACTORS)
+def compile_extractor(
+    schema: type[BaseModel],
+    model_class: type[Model],
+    selection: Optional[Selection] = None,
+) -> Optional[Extractor]:
+    """
+    A function serialising model_class instances as schema does, or None if
+    the schema needs pydantic to serialise it. Given a selection of the
+    schema's fields (see books_api.fieldsets), only those are serialised.
+    """
+    decorators = schema.__pydantic_decorators__
+    # Other than the one Ninja's Schema validates every object with, to read
+    # its attributes
+    model_validators = set(decorators.model_validators) - set(
+        Schema.__pydantic_decorators__.model_validators
+    )
+    if (
+        getattr(schema, "_ninja_resolvers", None)
+        or model_validators
+        or decorators.validators
+        or decorators.field_validators
+        or decorators.root_validators
+        or decorators.field_serializers
+        or decorators.model_serializers
+        or decorators.computed_fields
+    ):
+        return None
+
+    selected = None if selection is None else dict(selection)
+    getters: list[tuple[str, Callable[[Model], Any]]] = []
+    for name, field_info in schema_fields(schema).items():
+        if selected is not None and name not in selected:
+            continue
+        try:
+            model_field = model_class._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        related_schema = nested_schema(field_info.annotation)
+        many = model_field.is_relation and (
+            model_field.many_to_many or model_field.one_to_many
+        )
+
+        if related_schema is not None:
+            extract_related = compile_extractor(
+                related_schema,
+                model_field.related_model,
+                None if selected is None else selected[name],
+            )
+            if extract_related is None:
+                return None
+            getter = (
+                _related_list_getter(name, extract_related)
+                if many
+                else _related_object_getter(name, extract_related)
+            )
+        elif many:
+            getter = _related_list_getter(name, attrgetter("pk"))
+        elif model_field.is_relation or _is_plain(field_info.annotation):
+            # Foreign keys rendered as an id are read from the "_id" attribute
+            getter = attrgetter(model_field.attname)
+        else:
+            return None
+
+        getters.append((name, getter))
+
+    def extract(instance: Model) -> dict:
+        return {name: getter(instance) for name, getter in getters}
+
+    return extract
+
+
+def _is_plain(annotation: Any) -> bool:
+    if get_origin(annotation) is Union:
+        return all(arg is NoneType or _is_plain(arg) for arg in get_args(annotation))
+    return annotation in _PLAIN_TYPES
+
+
+def _related_object_getter(name: str, extract: Callable) -> Callable[[Model], Any]:
+    def get_related_object(instance: Model) -> Any:
+        related = getattr(instance, name)
+        return None if related is None else extract(related)
+
+    return get_related_object
+
+
+def _related_list_getter(name: str, extract: Callable) -> Callable[[Model], list]:
+    def get_related_list(instance: Model) -> list:
+        related = getattr(instance, name)
+        if isinstance(related, Manager):
+            related = related.all()
+        return [extract(item) for item in related]
+
+    return get_related_list
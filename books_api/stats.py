@@ -0,0 +1,216 @@
+"""
+Statistics over the Book catalogue, computed in the database with
+aggregate() and GROUP BY queries rather than by reading every Book.
+
+Each statistic covers the Books selected by a StatsFilterSchema, overall or
+grouped by format, publisher, category or author.
+
+Results are cached in one of the CACHES for a while, as configured by the
+BOOKS_API_STATS_CACHE setting:
+
+    BOOKS_API_STATS_CACHE = {
+        "CACHE_ALIAS": "default",
+        # Seconds results are kept for
+        "TIMEOUT": 60,
+    }
+
+Cache keys include a generation number, which any write to a Book, Author,
+Category or Publisher moves on, so results computed before a write aren't
+served after it. Writes that bypass model signals must call invalidate()
+themselves; the bulk helpers in books_api.helpers do. Deletes are followed
+once per books_api.deletion.delete_queryset(), as the delete helpers make
+them, rather than per deleted row. The generation is kept
+in the same cache as the results, so is shared between processes when the
+cache is; with a per-process cache, such as the default local memory one,
+other processes see a write once their results expire.
+"""
+
+import hashlib
+import time
+from decimal import Decimal
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Model, QuerySet
+
+from books_api.deletion import Deletion
+from books_api.models import Author, Book, Category, Publisher
+from books_api.schemas import StatsFilterSchema
+
+_GENERATION_KEY = "books_api:stats:generation"
+
+# Prices are given to the precision they are stored with, which for averages
+# means rounding, and on SQLite, which stores them as numbers, also restoring
+# trailing zeros
+_RRP_PLACES = Decimal(10) ** -Book._meta.get_field("rrp").decimal_places
+
+
+def filter_books(filters: StatsFilterSchema) -> QuerySet:
+    books = Book.objects.all()
+    if filters.format is not None:
+        books = books.filter(format=filters.format)
+    if filters.min_rrp is not None:
+        books = books.filter(rrp__gte=filters.min_rrp)
+    if filters.max_rrp is not None:
+        books = books.filter(rrp__lte=filters.max_rrp)
+
+    authors = author_filter(filters)
+    if authors:
+        # By subquery, as joining to the authors would count Books with more
+        # than one matching author more than once
+        books = books.filter(
+            pk__in=Author.books.through.objects.filter(
+                **{f"author__{lookup}": value for lookup, value in authors.items()}
+            ).values("book_id")
+        )
+    return books
+
+
+def author_filter(filters: StatsFilterSchema) -> dict:
+    lookups = {}
+    if filters.min_author_year_of_birth is not None:
+        lookups["year_of_birth__gte"] = filters.min_author_year_of_birth
+    if filters.max_author_year_of_birth is not None:
+        lookups["year_of_birth__lte"] = filters.max_author_year_of_birth
+    return lookups
+
+
+def _price_aggregates(rrp: str = "rrp") -> dict:
+    return {
+        "average_rrp": Avg(rrp),
+        "min_rrp": Min(rrp),
+        "max_rrp": Max(rrp),
+    }
+
+
+def _rounded(row: dict) -> dict:
+    for name in ("average_rrp", "min_rrp", "max_rrp"):
+        if row[name] is not None:
+            row[name] = Decimal(row[name]).quantize(_RRP_PLACES)
+    return row
+
+
+def book_stats(filters: StatsFilterSchema) -> dict:
+    return _rounded(
+        filter_books(filters).aggregate(count=Count("pk"), **_price_aggregates())
+    )
+
+
+def format_stats(filters: StatsFilterSchema) -> list[dict]:
+    rows = (
+        filter_books(filters)
+        .values("format")
+        .annotate(count=Count("pk"), **_price_aggregates())
+        .order_by("format")
+    )
+    return [_rounded(row) for row in rows]
+
+
+def _related_stats(
+    related_model: type[Model],
+    books: str,
+    filters: StatsFilterSchema,
+    fields: list[str],
+    related_filter: Optional[dict] = None,
+) -> list[dict]:
+    """
+    Statistics of the Books of each related_model object, reached through
+    its relation named books. Objects without any of the Books are left out.
+    """
+    rows = (
+        related_model.objects.filter(
+            **{f"{books}__in": filter_books(filters)}, **(related_filter or {})
+        )
+        # The aggregates are over the joined Books the filter selected
+        .values("id", *fields)
+        .annotate(count=Count(books), **_price_aggregates(f"{books}__rrp"))
+        .order_by("-count", "id")
+    )
+    return [_rounded(row) for row in rows]
+
+
+def publisher_stats(filters: StatsFilterSchema) -> list[dict]:
+    return _related_stats(Publisher, "book", filters, ["name"])
+
+
+def category_stats(filters: StatsFilterSchema) -> list[dict]:
+    return _related_stats(Category, "books", filters, ["name"])
+
+
+def author_stats(filters: StatsFilterSchema) -> list[dict]:
+    # Only the authors born within the requested years are listed, not every
+    # author of the Books that have one
+    return _related_stats(
+        Author, "books", filters, ["first_name", "last_name"], author_filter(filters)
+    )
+
+
+def _cache_config() -> dict:
+    return getattr(settings, "BOOKS_API_STATS_CACHE", {})
+
+
+def _cache():
+    return caches[_cache_config().get("CACHE_ALIAS", "default")]
+
+
+def _generation() -> int:
+    cache = _cache()
+    generation = cache.get(_GENERATION_KEY)
+    if generation is None:
+        # Restarted from the current time, rather than from a number that
+        # results cached before the generation was evicted may hold
+        generation = time.time_ns()
+        cache.add(_GENERATION_KEY, generation, None)
+        generation = cache.get(_GENERATION_KEY, generation)
+    return generation
+
+
+def cached_stats(name: str, filters: StatsFilterSchema, compute: Callable) -> object:
+    """The result of compute(filters), from the cache if it is there."""
+    filters_hash = hashlib.sha256(filters.model_dump_json().encode()).hexdigest()
+    key = f"books_api:stats:{_generation()}:{name}:{filters_hash}"
+
+    cache = _cache()
+    result = cache.get(key)
+    if result is None:
+        result = compute(filters)
+        cache.set(key, result, _cache_config().get("TIMEOUT", 60))
+    return result
+
+
+def invalidate() -> None:
+    """
+    Stop serving cached results, both now and once the current transaction
+    commits, so that results computed from another connection's view of the
+    rows before the commit are not kept either.
+    """
+    _bump_generation()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_bump_generation)
+
+
+def _bump_generation() -> None:
+    try:
+        _cache().incr(_GENERATION_KEY)
+    except ValueError:
+        # No results have been cached yet
+        pass
+
+
+def on_change(sender: type[Model], **kwargs) -> None:
+    invalidate()
+
+
+def on_rows_deleted(sender: type[Model], deletion: Deletion, **kwargs) -> None:
+    invalidate()
+
+
+def on_m2m_changed(sender: type[Model], action: str, **kwargs) -> None:
+    if sender in (Author.books.through, Category.books.through) and action in (
+        "post_add",
+        "post_remove",
+        "post_clear",
+    ):
+        invalidate()
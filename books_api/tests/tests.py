@@ -1,16 +1,115 @@
+import functools
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-from django.test import TransactionTestCase, Client
+from asgiref.sync import iscoroutinefunction, sync_to_async
 
-from books_api.helpers import patch_object
-from books_api.models import Publisher, Author, Book
-from books_api.schemas import BookInPatchSchema
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, pre_delete, pre_save
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+)
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from ninja import NinjaAPI, Router
+from ninja.testing import TestAsyncClient, TestClient
+
+from books_api import imports, jobs, metrics
+from books_api.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from books_api.cache import get_response_cache
+from books_api.database import pin_to_primary
+from books_api.documents import build_documents, register_schema, staleness
+from books_api.helpers import (
+    adelete_object,
+    apatch_object,
+    aupdate_object,
+    bulk_create_objects,
+    bulk_delete_objects,
+    bulk_patch_objects,
+    delete_object,
+    patch_object,
+    update_object,
+)
+from books_api.operations import (
+    cache_get_responses,
+    conditional_get_responses,
+    filter_list_responses,
+    load_related_for_responses,
+    paginate_list_responses,
+    report_conflicts,
+    select_response_fields,
+    serialise_get_responses,
+    serve_async,
+    serve_book_documents,
+    serve_writes_async,
+)
+from books_api.pagination import CursorPagination, encode_cursor
+from books_api.renderers import ORJSONRenderer, render_json
+from books_api.querysets import related_lookups, with_related_lookups
+from books_api.models import (
+    Publisher,
+    Author,
+    Book,
+    BookDocument,
+    BookSearchDocument,
+    Category,
+    Job,
+    JobStatusChoices,
+)
+from books_api.schemas import (
+    AuthorOutSchema,
+    BookBulkInSchema,
+    BookFilterSchema,
+    BookInPatchSchema,
+    BookOutSchema,
+    ErrorSchema,
+)
+from books_api.search import search_books, search_supported
+from books_api.serialisation import compile_extractor
+from books_api.write_plans import get_write_plan
+from django_books_api.db_routers import (
+    READ_YOUR_WRITES_COOKIE,
+    PrimaryReplicaRouter,
+    ReadYourWritesMiddleware,
+)
 
 BOOK_INITIAL_ISBN = "1231234567890"
 BOOK_INITIAL_RRP = Decimal("1.23")
 BOOK_INITIAL_TITLE = "Test Book's Original Title"
 BOOK_INITIAL_FORMAT = "Paperback"
 
+_api_ids = itertools.count()
+
+
+def api_client(router):
+    """
+    A test client for router, rendering responses as api_v2 does, rather than
+    with Ninja's default renderer. Each NinjaAPI needs a namespace of its own.
+    """
+    api = NinjaAPI(renderer=ORJSONRenderer(), urls_namespace=f"test-{next(_api_ids)}")
+    api.add_router("/", router)
+    return TestClient(api)
+
 
 class ORMHelpersTestCase(TransactionTestCase):
     def setUp(self):
@@ -112,51 +211,2568 @@ class ORMHelpersTestCase(TransactionTestCase):
             data["api_error"], "Publisher referenced by 'publisher_id' does not exist"
         )
 
+    def test_patch_writes_only_changed_columns(self):
+        payload = BookInPatchSchema(title="New Title")
 
-class APIClientTests(TransactionTestCase):
+        # One query to fetch the book and one to update it, with no re-read,
+        # then two replacing its search document, as the title is part of it
+        with self.assertNumQueries(4), CaptureQueriesContext(connection) as queries:
+            status, patched_object = patch_object(
+                "books_api", "Book", self.book.id, payload
+            )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(patched_object.title, "New Title")
+        update_sql = queries.captured_queries[1]["sql"]
+        self.assertTrue(update_sql.startswith("UPDATE"))
+        self.assertIn('"title"', update_sql)
+        self.assertNotIn('"isbn"', update_sql)
+
+        # Fields the search document isn't built from don't touch it
+        payload = BookInPatchSchema(rrp=Decimal("4.56"))
+        with self.assertNumQueries(2):
+            status, patched_object = patch_object(
+                "books_api", "Book", self.book.id, payload
+            )
+
+        self.assertEqual(status, 200)
+
+        # Foreign keys cost one additional query to confirm the referenced row
+        payload = BookInPatchSchema(publisher_id=self.publisher_2.id)
+        with self.assertNumQueries(5):
+            status, patched_object = patch_object(
+                "books_api", "Book", self.book.id, payload
+            )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(patched_object.publisher, self.publisher_2)
+
+    def test_bulk_patch_objects(self):
+        second_book = Book.objects.create(
+            title="Second Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
+        )
+        patches = [
+            (self.book.id, BookInPatchSchema(title="Bulk Title")),
+            (second_book.id, BookInPatchSchema(publisher_id=self.publisher_2.id)),
+            (10000, BookInPatchSchema(title="Missing Book")),
+            (second_book.id, BookInPatchSchema(publisher_id=10000)),
+        ]
+
+        # One query each for the books, the publishers and the bulk update,
+        # two replacing the patched books' search documents, plus the BEGIN and
+        # COMMIT of the wrapping transaction
+        with self.assertNumQueries(7):
+            results = bulk_patch_objects("books_api", "Book", patches)
+
+        self.assertEqual([status for status, _ in results], [200, 200, 404, 404])
+        self.assertEqual(
+            results[2][1]["api_error"], "Requested Book object does not exist"
+        )
+        self.assertEqual(
+            results[3][1]["api_error"],
+            "Publisher referenced by 'publisher_id' does not exist",
+        )
+
+        self.book.refresh_from_db()
+        second_book.refresh_from_db()
+        self.assertEqual(self.book.title, "Bulk Title")
+        self.assertEqual(self.book.publisher, self.publisher_1)
+        self.assertEqual(second_book.title, "Second Book")
+        self.assertEqual(second_book.publisher, self.publisher_2)
+
+    def test_patches_report_taken_unique_values(self):
+        second_book = Book.objects.create(
+            title="Second Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
+        )
+        conflict = {"api_error": "Book with this isbn already exists"}
+
+        # Compared as save() writes it, normalised
+        for helper in (patch_object, update_object):
+            with transaction.atomic():
+                status, data = helper(
+                    "books_api",
+                    "Book",
+                    second_book.id,
+                    BookInPatchSchema(
+                        title="Clash",
+                        isbn=f"{BOOK_INITIAL_ISBN[:3]}-{BOOK_INITIAL_ISBN[3:]}",
+                    ),
+                )
+                # The surrounding transaction is still usable
+                self.assertEqual(Book.objects.count(), 2)
+            self.assertEqual((status, data), (409, conflict))
+
+        # Keeping its own value isn't a clash
+        status, _ = patch_object(
+            "books_api", "Book", self.book.id, BookInPatchSchema(isbn=BOOK_INITIAL_ISBN)
+        )
+        self.assertEqual(status, 200)
+
+        results = bulk_patch_objects(
+            "books_api",
+            "Book",
+            [
+                (second_book.id, BookInPatchSchema(isbn=BOOK_INITIAL_ISBN)),
+                (second_book.id, BookInPatchSchema(isbn="1111111111111")),
+                (self.book.id, BookInPatchSchema(isbn="1111111111111")),
+                (self.book.id, BookInPatchSchema(title="Bulk Title")),
+            ],
+        )
+        self.assertEqual(
+            results[:3], [(409, conflict), (200, second_book), (409, conflict)]
+        )
+        self.assertEqual(results[3][0], 200)
+
+        second_book.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(second_book.title, "Second Book")
+        self.assertEqual(second_book.isbn, "1111111111111")
+        self.assertEqual(self.book.isbn, BOOK_INITIAL_ISBN)
+        self.assertEqual(self.book.title, "Bulk Title")
+
+    def test_bulk_create_objects(self):
+        category = Category.objects.create(name="Test Category")
+
+        def new_book(number, **overrides):
+            fields = {
+                "title": f"Bulk Book {number}",
+                "isbn": f"{number:013d}",
+                "rrp": BOOK_INITIAL_RRP,
+                "format": BOOK_INITIAL_FORMAT,
+                "publisher_id": self.publisher_1.id,
+                "authors": [self.author_1.id, self.author_2.id],
+                "categories": [category.id],
+            }
+            fields.update(overrides)
+            return BookBulkInSchema(**fields)
+
+        payloads = [new_book(number) for number in range(100)] + [
+            new_book(100, publisher_id=10000),
+            new_book(101, authors=[self.author_1.id, 10000]),
+            new_book(102, isbn=BOOK_INITIAL_ISBN),
+            new_book(0),
+        ]
+
+        # Publishers, authors, categories and ISBNs are each checked with one
+        # query, then one insert each for the books and both through tables,
+        # one update each stamping the linked authors and categories, two
+        # adding the books' search documents, plus the BEGIN and COMMIT of the
+        # wrapping transaction.
+        with self.assertNumQueries(13):
+            results = bulk_create_objects("books_api", "Book", payloads)
+
+        self.assertEqual([status for status, _ in results[:100]], [201] * 100)
+        self.assertEqual(
+            results[100:],
+            [
+                (
+                    404,
+                    {
+                        "api_error": "Publisher referenced by 'publisher_id' does not exist"
+                    },
+                ),
+                (404, {"api_error": "Author referenced by 'authors' does not exist"}),
+                (409, {"api_error": "Book with this isbn already exists"}),
+                (409, {"api_error": "Book with this isbn already exists"}),
+            ],
+        )
+
+        self.assertEqual(Book.objects.count(), 101)
+        created_book = results[0][1]
+        self.assertEqual(
+            set(created_book.authors.values_list("id", flat=True)),
+            {self.author_1.id, self.author_2.id},
+        )
+        self.assertEqual(list(created_book.categories.all()), [category])
+        self.assertEqual(self.author_1.books.count(), 100)
+
+    def test_bulk_delete_objects(self):
+        status, data = bulk_delete_objects(
+            "books_api",
+            "Publisher",
+            [self.publisher_1.id, 10000, self.publisher_1.id],
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {"deleted": [self.publisher_1.id], "missing": [10000]})
+        self.assertFalse(Publisher.objects.filter(pk=self.publisher_1.id).exists())
+        # Deleting the publisher cascades to its books
+        self.assertFalse(Book.objects.exists())
+
+    def test_bulk_delete_objects_in_chunks(self):
+        ids = [self.author_1.id, self.author_2.id, 10000]
+
+        with CaptureQueriesContext(connection) as queries:
+            status, data = bulk_delete_objects("books_api", "Author", ids, chunk_size=1)
+
+        self.assertEqual(data, {"deleted": ids[:2], "missing": [10000]})
+        deletes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('DELETE FROM "books_api_author"')
+        ]
+        self.assertEqual(len(deletes), 2)
+        self.assertFalse(Author.objects.exists())
+
+    def test_delete_queries_dont_grow_with_cascade(self):
+        def queries_to_delete_publisher(book_count):
+            publisher = Publisher.objects.create(name=f"Publisher of {book_count}")
+            books = Book.objects.bulk_create(
+                Book(
+                    title=f"Book {i}",
+                    isbn=f"979{book_count:04}{i:06}",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher=publisher,
+                )
+                for i in range(book_count)
+            )
+            self.author_1.books.add(*books)
+
+            with CaptureQueriesContext(connection) as queries:
+                delete_object("books_api", "Publisher", publisher.pk)
+            self.assertFalse(Book.objects.filter(publisher_id=publisher.pk).exists())
+            return len(queries)
+
+        # With the response cache and Book documents disabled, nothing receives
+        # Books' delete signals, so cascaded Books are deleted without being
+        # loaded or signalled one by one
+        self.assertFalse(pre_delete.has_listeners(Book))
+        self.assertFalse(post_delete.has_listeners(Book))
+        self.assertEqual(
+            queries_to_delete_publisher(3), queries_to_delete_publisher(30)
+        )
+
+
+class AsyncHelpersTestCase(TransactionTestCase):
     def setUp(self):
-        # Books need publishers
         Publisher.objects.all().delete()
         self.publisher_1 = Publisher.objects.create(name="Test Publisher Number 1")
         self.publisher_2 = Publisher.objects.create(name="Test Publisher Number 2")
-        self.author_1 = Author.objects.create(
-            first_name="Testy", last_name="Authorson", year_of_birth=1929
+        self.book = Book.objects.create(
+            title=BOOK_INITIAL_TITLE,
+            isbn=BOOK_INITIAL_ISBN,
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
         )
-        self.author_2 = Author.objects.create(
-            first_name="Another", last_name="McAuthor", year_of_birth=1980
+
+    async def test_apatch_object(self):
+        status, book = await apatch_object(
+            "books_api",
+            "Book",
+            self.book.id,
+            BookInPatchSchema(title="Patched", publisher_id=self.publisher_2.id),
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(book.publisher, self.publisher_2)
+        stored = await Book.objects.aget(pk=self.book.id)
+        self.assertEqual(stored.title, "Patched")
+        self.assertGreater(stored.updated_at, self.book.updated_at)
+
+        status, error = await apatch_object(
+            "books_api", "Book", self.book.id, BookInPatchSchema(publisher_id=10000)
+        )
+        self.assertEqual(status, 404)
+        self.assertIn("Publisher", error["api_error"])
+
+    async def test_aupdate_object(self):
+        status, book = await aupdate_object(
+            "books_api", "Book", self.book.id, BookInPatchSchema(rrp=Decimal("9.99"))
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual((await Book.objects.aget(pk=book.pk)).rrp, Decimal("9.99"))
+
+        status, _ = await aupdate_object(
+            "books_api", "Book", 10000, BookInPatchSchema(rrp=Decimal("9.99"))
+        )
+        self.assertEqual(status, 404)
+
+        other_book = await Book.objects.acreate(
+            title="Other Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
+        )
+        self.assertEqual(
+            await aupdate_object(
+                "books_api",
+                "Book",
+                other_book.pk,
+                BookInPatchSchema(isbn=BOOK_INITIAL_ISBN),
+            ),
+            (409, {"api_error": "Book with this isbn already exists"}),
+        )
+
+    async def test_adelete_object(self):
+        self.assertEqual(
+            await adelete_object("books_api", "Book", self.book.id), (200, None)
+        )
+        self.assertFalse(await Book.objects.filter(pk=self.book.id).aexists())
+        status, _ = await adelete_object("books_api", "Book", self.book.id)
+        self.assertEqual(status, 404)
+
+
+class WritePlanTestCase(SimpleTestCase):
+    def test_plan_is_cached_per_model(self):
+        self.assertIs(
+            get_write_plan("books_api", "Book"), get_write_plan("books_api", "book")
+        )
+
+    def test_foreign_key_aliases_share_a_handler(self):
+        plan = get_write_plan("books_api", "Book")
+
+        self.assertIs(plan.handler("publisher"), plan.handler("publisher_id"))
+        self.assertIs(plan.handler("publisher").related_model, Publisher)
+        self.assertEqual(
+            plan.handler("publisher").related_error,
+            "Publisher referenced by 'publisher_id' does not exist",
+        )
+        self.assertFalse(plan.handler("title").is_foreign_key)
+        self.assertNotIn("id", plan.handlers)
+
+    def test_plans_rebuilt_when_app_registry_changes(self):
+        plan = get_write_plan("books_api", "Book")
+
+        setting_changed.send(
+            sender=self.__class__, setting="INSTALLED_APPS", value=None, enter=True
+        )
+
+        rebuilt_plan = get_write_plan("books_api", "Book")
+        self.assertIsNot(plan, rebuilt_plan)
+        self.assertEqual(plan.handlers.keys(), rebuilt_plan.handlers.keys())
+
+
+class RelatedLookupsTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        Author.objects.all().delete()
+        self.publishers = Publisher.objects.bulk_create(
+            [Publisher(name=f"Publisher {i}") for i in range(5)]
+        )
+        self.authors = Author.objects.bulk_create(
+            [
+                Author(first_name="Author", last_name=f"{i}", year_of_birth=1950)
+                for i in range(5)
+            ]
+        )
+
+    def create_books(self, count):
+        existing = Book.objects.count()
+        books = Book.objects.bulk_create(
+            [
+                Book(
+                    title=f"Book {i}",
+                    isbn=f"{existing + i:013d}",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher=self.publishers[i % len(self.publishers)],
+                )
+                for i in range(count)
+            ]
+        )
+        Author.books.through.objects.bulk_create(
+            [
+                Author.books.through(
+                    author_id=self.authors[(i + offset) % len(self.authors)].id,
+                    book_id=book.id,
+                )
+                for i, book in enumerate(books)
+                for offset in range(2)
+            ]
+        )
+
+    def test_lookups_derived_from_schema(self):
+        self.assertEqual(
+            related_lookups(BookOutSchema, Book), (["publisher"], ["authors"])
+        )
+        # Many-to-many ids still need prefetching to avoid a query per author
+        self.assertEqual(related_lookups(AuthorOutSchema, Author), ([], ["books"]))
+
+    def test_book_list_query_count_is_constant(self):
+        created = 0
+        for count in (1, 10, 500):
+            self.create_books(count - created)
+            created = count
+
+            # One query for the books joined to their publishers, one for authors
+            with self.assertNumQueries(2):
+                books = [
+                    BookOutSchema.from_orm(book).dict()
+                    for book in with_related_lookups(Book.objects.all(), BookOutSchema)
+                ]
+
+            self.assertEqual(len(books), count)
+            self.assertEqual(len(books[-1]["authors"]), 2)
+
+    def test_author_list_query_count_is_constant(self):
+        self.create_books(500)
+
+        with self.assertNumQueries(2):
+            authors = [
+                AuthorOutSchema.from_orm(author).dict()
+                for author in with_related_lookups(
+                    Author.objects.all(), AuthorOutSchema
+                )
+            ]
+
+        self.assertEqual(sum(len(author["books"]) for author in authors), 1000)
+
+    def test_router_get_operations_load_related(self):
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        @router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return Book.objects.get(pk=id)
+
+        load_related_for_responses(router, "books_api", "Book")
+        client = TestClient(router)
+        self.create_books(10)
+
+        with self.assertNumQueries(2):
+            response = client.get("/")
+        self.assertEqual(len(response.json()), 10)
+
+        # The detail fetch, then one query each for the publisher and authors
+        book_id = Book.objects.first().id
+        with self.assertNumQueries(3):
+            response = client.get(f"/{book_id}")
+        self.assertEqual(len(response.json()["authors"]), 2)
+
+
+class CursorPaginationTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Test Publisher Number 1")
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title=f"Book {i % 3}",
+                    isbn=f"{i:013d}",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher=self.publisher,
+                )
+                for i in range(25)
+            ]
+        )
+
+    def paginated_client(self, **paginator_params):
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        load_related_for_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination, **paginator_params)
+        return TestClient(router)
+
+    def walk_pages(self, client, limit):
+        titles_and_ids, cursor, pages = [], None, 0
+        while True:
+            params = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+            response = client.get(f"/{params}").json()
+            titles_and_ids.extend(
+                (book["title"], book["id"]) for book in response["items"]
+            )
+            pages += 1
+            cursor = response["next"]
+            if cursor is None:
+                return titles_and_ids, pages
+
+    def test_pages_follow_primary_key_order(self):
+        client = self.paginated_client()
+
+        books, pages = self.walk_pages(client, limit=10)
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            [book_id for _, book_id in books],
+            list(Book.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_pages_use_keyset_filter_not_offset(self):
+        client = self.paginated_client()
+        first_page = client.get("/?limit=10").json()
+
+        # The page of books and their authors; the publisher is joined in
+        with self.assertNumQueries(2), CaptureQueriesContext(connection) as queries:
+            second_page = client.get(f"/?limit=10&cursor={first_page['next']}").json()
+
+        books_sql = queries.captured_queries[0]["sql"]
+        self.assertIn('"books_api_book"."id" >', books_sql)
+        self.assertNotIn("OFFSET", books_sql)
+        self.assertEqual(len(second_page["items"]), 10)
+        self.assertEqual(
+            second_page["items"][0]["publisher"]["name"], self.publisher.name
+        )
+
+    def test_ordering_on_non_unique_column(self):
+        client = self.paginated_client(ordering="title")
+
+        books, _ = self.walk_pages(client, limit=4)
+
+        self.assertEqual(books, sorted(books))
+        self.assertEqual(len(books), 25)
+
+    def test_limit_is_capped(self):
+        client = self.paginated_client(max_limit=5)
+
+        response = client.get("/?limit=1000").json()
+
+        self.assertEqual(len(response["items"]), 5)
+        self.assertIsNotNone(response["next"])
+
+    def test_filters_applied_before_pagination(self):
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        filter_list_responses(router, BookFilterSchema)
+        paginate_list_responses(router, CursorPagination)
+        client = TestClient(router)
+
+        response = client.get("/?isbn=000-000-000-0012&limit=5").json()
+
+        self.assertEqual(
+            [book["isbn"] for book in response["items"]], ["0000000000012"]
+        )
+        self.assertIsNone(response["next"])
+
+    def test_invalid_cursor(self):
+        client = self.paginated_client()
+
+        response = client.get("/?cursor=not-a-cursor")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        client = self.paginated_client()
+        response = client.get(f"/?cursor={encode_cursor({'id': 1})}")
+        self.assertEqual(response.status_code, 400)
+
+        client = self.paginated_client(ordering="updated_at")
+        response = client.get(f"/?cursor={encode_cursor('yesterday', 1)}")
+        self.assertEqual(response.status_code, 400)
+        response = client.get(f"/?cursor={encode_cursor(['x'], 1)}")
+        self.assertEqual(response.status_code, 400)
+
+
+class LookupIndexTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Test Publisher Number 1")
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " ".join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset):
+        plan = self.query_plan(queryset)
+        self.assertRegex(plan, r"USING (COVERING )?INDEX")
+        self.assertNotRegex(plan, r"SCAN books_api_\w+($| )")
+
+    def test_isbn_is_normalised_and_unique(self):
+        book = Book.objects.create(
+            title=BOOK_INITIAL_TITLE,
+            isbn="978-0-306-40615-x",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+        self.assertEqual(book.isbn, "978030640615X")
+
+        with self.assertRaises(IntegrityError):
+            Book.objects.create(
+                title="Duplicate",
+                isbn="978 0306 40615 X",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publisher,
+            )
+
+    def test_lookups_use_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN output is SQLite specific")
+
+        self.assertUsesIndex(Book.objects.filter(isbn="9780306406157"))
+        self.assertUsesIndex(Author.objects.filter(last_name="Authorson"))
+        self.assertUsesIndex(
+            Author.objects.filter(last_name="Authorson", first_name="Testy")
         )
+        self.assertUsesIndex(Category.objects.filter(name="Fiction"))
+
+
+class DatabaseProfileTestCase(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("The database profiles are SQLite specific")
+
+    def new_connection(self, **options):
+        settings_dict = dict(connection.settings_dict, OPTIONS=options)
+        new_connection = SQLiteDatabaseWrapper(settings_dict, alias=DEFAULT_DB_ALIAS)
+        self.addCleanup(new_connection.close)
+        return new_connection
+
+    @override_settings(BOOKS_API_SQLITE_PRAGMAS={"cache_size": -1234})
+    def test_pragmas_applied_to_new_connections(self):
+        new_connection = self.new_connection()
+        with new_connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+    def begin_statement(self, new_connection):
+        # What atomic() does to start a transaction on SQLite
+        with CaptureQueriesContext(new_connection) as queries:
+            new_connection.set_autocommit(
+                False, force_begin_transaction_with_broken_autocommit=True
+            )
+            new_connection.rollback()
+            new_connection.set_autocommit(True)
+        return queries[0]["sql"]
 
+    def test_transaction_mode(self):
+        new_connection = self.new_connection(transaction_mode="IMMEDIATE")
+        self.assertEqual(self.begin_statement(new_connection), "BEGIN IMMEDIATE")
+
+    def test_default_transaction_mode(self):
+        new_connection = self.new_connection()
+        self.assertEqual(self.begin_statement(new_connection), "BEGIN")
+
+
+@override_settings(
+    BOOKS_API_DATABASE_REPLICAS=["replica_1"], BOOKS_API_READ_YOUR_WRITES_SECONDS=5
+)
+class ReadReplicaRoutingTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.router = PrimaryReplicaRouter()
+        self.publisher = Publisher.objects.create(name="Test Publisher Number 1")
         self.book = Book.objects.create(
             title=BOOK_INITIAL_TITLE,
             isbn=BOOK_INITIAL_ISBN,
             rrp=BOOK_INITIAL_RRP,
             format=BOOK_INITIAL_FORMAT,
-            publisher=self.publisher_1,
+            publisher=self.publisher,
         )
 
-    def test_update_book_via_http(self):
-        """
-        This test method is essentially superfluous, but present to demonstrate the use
-        of Django's Test HTTP client in a fairly simple case.
-        """
-        client = Client()
+    def record_read_database(self, reads, **kwargs):
+        reads.append(self.router.db_for_read(Book))
 
-        # For PUT-based updates, we need to provide all required fields
-        book_update_payload = self.book.__dict__
-        # Pop the '_state' key, because it will upset the JSON serialisation
-        _ = book_update_payload.pop("_state", None)
+    def test_reads_routed_to_replicas(self):
+        self.assertEqual(self.router.db_for_read(Book), "replica_1")
+        self.assertEqual(self.router.db_for_write(Book), DEFAULT_DB_ALIAS)
 
-        # Change the Title
-        book_update_payload["title"] = "PUT-updated title"
+        with pin_to_primary():
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+        with override_settings(BOOKS_API_DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+    def test_helpers_read_from_primary(self):
+        reads = []
+        receiver = functools.partial(self.record_read_database, reads)
+        pre_save.connect(receiver, sender=Book)
+        self.addCleanup(pre_save.disconnect, receiver, sender=Book)
+
+        patch_object("books_api", "Book", self.book.id, BookInPatchSchema(title="A"))
+        update_object("books_api", "Book", self.book.id, BookInPatchSchema(title="B"))
+
+        self.assertEqual(reads, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+
+    def test_read_your_writes_window(self):
+        reads = []
+
+        def view(request):
+            self.record_read_database(reads)
+            return HttpResponse(status=400 if request.GET.get("fail") else 200)
+
+        middleware = ReadYourWritesMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post("/api/v2/book/?fail=1"))
+        response = middleware(factory.get("/api/v2/book/"))
+        self.assertNotIn(READ_YOUR_WRITES_COOKIE, response.cookies)
+
+        response = middleware(factory.patch("/api/v2/book/1"))
+        cookie = response.cookies[READ_YOUR_WRITES_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+
+        request = factory.get("/api/v2/book/1")
+        request.COOKIES[READ_YOUR_WRITES_COOKIE] = cookie.value
+        middleware(request)
+
+        request = factory.get("/api/v2/book/1")
+        request.COOKIES[READ_YOUR_WRITES_COOKIE] = str(time.time() - 1)
+        middleware(request)
 
-        response = client.put(
-            f"/api/books/{self.book.id}",
-            book_update_payload,
-            content_type="application/json",
-        )
-        self.assertEqual(response.status_code, 200)
-        response_json = response.json()
         self.assertEqual(
-            response_json["title"],
-            "PUT-updated title",
+            reads,
+            [
+                DEFAULT_DB_ALIAS,
+                "replica_1",
+                DEFAULT_DB_ALIAS,
+                DEFAULT_DB_ALIAS,
+                "replica_1",
+            ],
+        )
+
+    async def test_read_your_writes_window_under_asgi(self):
+        reads = []
+
+        async def view(request):
+            self.record_read_database(reads)
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = RequestFactory()
+
+        response = await middleware(factory.patch("/api/v2/book/1"))
+        request = factory.get("/api/v2/book/1")
+        request.COOKIES[READ_YOUR_WRITES_COOKIE] = response.cookies[
+            READ_YOUR_WRITES_COOKIE
+        ].value
+        await middleware(request)
+        await middleware(factory.get("/api/v2/book/1"))
+
+        self.assertEqual(reads, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS, "replica_1"])
+
+
+class SearchTestCase(TransactionTestCase):
+    def setUp(self):
+        if not search_supported():
+            self.skipTest("The full-text index is SQLite specific")
+
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Parnassus Press")
+        self.author_1 = Author.objects.create(
+            first_name="Ursula", last_name="Le Guin", year_of_birth=1929
+        )
+        self.author_2 = Author.objects.create(
+            first_name="Terry", last_name="Pratchett", year_of_birth=1948
+        )
+        self.category = Category.objects.create(name="Fantasy")
+        self.book_1 = Book.objects.create(
+            title="A Wizard of Earthsea",
+            isbn="9780000000001",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+        self.book_2 = Book.objects.create(
+            title="Small Gods",
+            isbn="9780000000002",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
         )
+        self.author_1.books.add(self.book_1)
+        self.book_2.authors.add(self.author_2)
+        self.category.books.add(self.book_1, self.book_2)
+
+    def search(self, query):
+        return set(search_books(query).values_list("pk", flat=True))
+
+    def test_search_every_field(self):
+        both = {self.book_1.pk, self.book_2.pk}
+        self.assertEqual(self.search("earthsea"), {self.book_1.pk})
+        self.assertEqual(self.search("guin URSULA"), {self.book_1.pk})
+        self.assertEqual(self.search("parnassus"), both)
+        self.assertEqual(self.search("fantasy"), both)
+        # The last word is a prefix
+        self.assertEqual(self.search("pratch"), {self.book_2.pk})
+        self.assertEqual(self.search("pratchett earthsea"), set())
+        # Query syntax is taken literally
+        self.assertEqual(self.search('gods OR "earthsea" *'), set())
+        self.assertEqual(self.search("?!"), set())
+
+    def test_index_follows_changes(self):
+        self.book_1.title = "Tehanu"
+        self.book_1.save()
+        self.assertEqual(self.search("tehanu"), {self.book_1.pk})
+        self.assertEqual(self.search("earthsea"), set())
+
+        self.author_2.last_name = "Gaiman"
+        self.author_2.save()
+        self.assertEqual(self.search("gaiman"), {self.book_2.pk})
+
+        self.author_2.books.add(self.book_1)
+        self.assertEqual(self.search("gaiman"), {self.book_1.pk, self.book_2.pk})
+        self.book_1.authors.clear()
+        self.assertEqual(self.search("gaiman"), {self.book_2.pk})
+
+        delete_object("books_api", "Category", self.category.pk)
+        self.assertEqual(self.search("fantasy"), set())
+
+        self.publisher.name = "Orbit"
+        self.publisher.save()
+        self.assertEqual(self.search("orbit"), {self.book_1.pk, self.book_2.pk})
+
+        delete_object("books_api", "Book", self.book_2.pk)
+        self.assertFalse(
+            BookSearchDocument.objects.filter(book_id=self.book_2.pk).exists()
+        )
+
+    def test_bulk_helpers_update_index(self):
+        [(status, book)] = bulk_create_objects(
+            "books_api",
+            "Book",
+            [
+                BookBulkInSchema(
+                    title="Mort",
+                    isbn="9780000000003",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher_id=self.publisher.pk,
+                    authors=[self.author_2.pk],
+                )
+            ],
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(self.search("mort pratchett"), {book.pk})
+
+        bulk_patch_objects(
+            "books_api", "Book", [(book.pk, BookInPatchSchema(title="Reaper Man"))]
+        )
+        self.assertEqual(self.search("reaper"), {book.pk})
+        self.assertEqual(self.search("mort"), set())
+
+        # The Publisher's Books are deleted by its cascade
+        bulk_delete_objects("books_api", "Publisher", [self.publisher.pk])
+        self.assertFalse(
+            BookSearchDocument.objects.filter(
+                book_id__in=[book.pk, self.book_1.pk, self.book_2.pk]
+            ).exists()
+        )
+
+    def test_results_ranked(self):
+        self.book_1.title = "Gods, Gods and More Gods"
+        self.book_1.save()
+        ranked = search_books("gods").order_by("rank")
+        self.assertEqual(
+            list(ranked.values_list("pk", flat=True)), [self.book_1.pk, self.book_2.pk]
+        )
+
+    def test_rebuild_search_index(self):
+        # Written without sending post_save, so not yet indexed
+        Book.objects.filter(pk=self.book_1.pk).update(title="Tehanu")
+        self.assertEqual(self.search("tehanu"), set())
+
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+
+        self.assertIn("Indexed 2 books", out.getvalue())
+        self.assertEqual(self.search("tehanu"), {self.book_1.pk})
+
+
+class FastSerialisationTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        Author.objects.all().delete()
+        publisher = Publisher.objects.create(name="Éditions Gallimard")
+        author = Author.objects.create(
+            first_name="Albert",
+            last_name="Camus",
+            year_of_birth=1913,
+            year_of_death=1960,
+        )
+        Author.objects.create(
+            first_name="Annie", last_name="Ernaux", year_of_birth=1940
+        )
+        # Prices with trailing zeros, which must be kept
+        for i, rrp in enumerate(["10.10", "0.05", "999.00"]):
+            book = Book.objects.create(
+                title=f"L'Étranger {i}",
+                isbn=f"978000000000{i}",
+                rrp=Decimal(rrp),
+                format=BOOK_INITIAL_FORMAT,
+                publisher=publisher,
+            )
+            book.authors.add(author)
+
+        self.book_router = Router()
+
+        @self.book_router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        @self.book_router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return get_object_or_404(Book, pk=id)
+
+        self.author_router = Router()
+
+        @self.author_router.get("/", response=list[AuthorOutSchema])
+        def list_authors(request):
+            return Author.objects.all()
+
+        for router, model_name in (
+            (self.book_router, "Book"),
+            (self.author_router, "Author"),
+        ):
+            load_related_for_responses(router, "books_api", model_name)
+            paginate_list_responses(router, CursorPagination)
+            serialise_get_responses(router, "books_api", model_name)
+
+    def test_fast_path_renders_identical_json(self):
+        book_client = api_client(self.book_router)
+        author_client = api_client(self.author_router)
+        requests = [
+            (book_client, "/"),
+            (book_client, "/?limit=2"),
+            (book_client, f"/{Book.objects.first().pk}"),
+            (author_client, "/"),
+        ]
+
+        with override_settings(BOOKS_API_FAST_SERIALISATION=False):
+            validated = [client.get(path).content for client, path in requests]
+        # Ninja wraps each result it validates in a ResponseObject
+        with mock.patch(
+            "ninja.operation.ResponseObject", side_effect=AssertionError("validated")
+        ):
+            fast = [client.get(path).content for client, path in requests]
+
+        self.assertEqual(fast, validated)
+        self.assertIn(b'"rrp":"999.00"', fast[0])
+        self.assertEqual(book_client.get("/0").status_code, 404)
+
+    def test_extractors_match_model_dump(self):
+        extract = compile_extractor(BookOutSchema, Book)
+        for book in with_related_lookups(Book.objects.all(), BookOutSchema):
+            self.assertEqual(extract(book), BookOutSchema.from_orm(book).model_dump())
+
+        # Schemas with validators of their own are left to pydantic
+        self.assertIsNone(compile_extractor(BookInPatchSchema, Book))
+
+    def test_renderer_fallback_renders_identical_json(self):
+        data = [
+            BookOutSchema.from_orm(book).model_dump()
+            for book in with_related_lookups(Book.objects.all(), BookOutSchema)
+        ]
+        with mock.patch("books_api.renderers.orjson", None):
+            fallback = render_json(data)
+        self.assertEqual(render_json(data), fallback)
+
+    def test_renderers_accept_the_same_keys(self):
+        data = {1: [2, 3], 4.5: Decimal("6.70"), False: None, None: "null"}
+        with mock.patch("books_api.renderers.orjson", None):
+            fallback = render_json(data)
+        self.assertEqual(render_json(data), fallback)
+        self.assertEqual(
+            json.loads(fallback),
+            {"1": [2, 3], "4.5": "6.70", "false": None, "null": "null"},
+        )
+
+
+class SelectedFieldsTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Virago")
+        self.author = Author.objects.create(
+            first_name="Angela", last_name="Carter", year_of_birth=1940
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"The Bloody Chamber {i}",
+                isbn=f"978000000000{i}",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publisher,
+            )
+            for i in range(3)
+        ]
+        self.author.books.add(*self.books)
+
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.order_by("pk")
+
+        @router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return get_object_or_404(Book, pk=id)
+
+        load_related_for_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination)
+        serve_book_documents(router)
+        serialise_get_responses(router, "books_api", "Book")
+        select_response_fields(router, "books_api", "Book")
+        self.client = api_client(router)
+
+    def test_selected_fields_only(self):
+        page = self.client.get("/?fields=id,title,publisher.name").json()
+        self.assertEqual(
+            page["items"],
+            [
+                {"id": book.pk, "title": book.title, "publisher": {"name": "Virago"}}
+                for book in self.books
+            ],
+        )
+        self.assertIn("next", page)
+
+        book = self.client.get(f"/{self.books[0].pk}?fields=isbn,authors").json()
+        self.assertEqual(
+            book,
+            {
+                "isbn": self.books[0].isbn,
+                "authors": [
+                    self.client.get("/").json()["items"][0]["authors"][0],
+                ],
+            },
+        )
+
+        # The same from stored documents, which hold every field, and without
+        # the compiled extractors
+        with override_settings(
+            BOOKS_API_BOOK_DOCUMENTS=True, BOOKS_API_FAST_SERIALISATION=False
+        ):
+            self.assertEqual(
+                self.client.get(f"/{self.books[0].pk}?fields=isbn,authors").json(),
+                book,
+            )
+            with mock.patch(
+                "books_api.operations.compile_extractor", return_value=None
+            ):
+                self.assertEqual(
+                    self.client.get("/?fields=id,title,publisher.name").json(), page
+                )
+
+    def test_queries_narrowed_to_selected_fields(self):
+        # The page of books, joined to their publishers, without the authors
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/?fields=title,publisher.name")
+        (query,) = queries.captured_queries
+        self.assertIn('"books_api_publisher"."name"', query["sql"])
+        self.assertNotIn('"books_api_book"."isbn"', query["sql"])
+        self.assertNotIn('"books_api_publisher"."updated_at"', query["sql"])
+
+        # Without any joins
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/?fields=id,title")
+        (query,) = queries.captured_queries
+        self.assertNotIn("JOIN", query["sql"])
+
+        # The book, and its authors
+        with self.assertNumQueries(2):
+            self.client.get(f"/{self.books[0].pk}?fields=authors.last_name")
+
+    def test_unknown_fields_rejected(self):
+        for fields in ("id,blurb", "publisher.founded", "title.length", ","):
+            with self.subTest(fields=fields):
+                response = self.client.get(f"/?fields={fields}")
+                self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            "publisher.founded",
+            self.client.get("/?fields=publisher.founded").json()["detail"],
+        )
+
+
+class BookDocumentTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Parnassus Press")
+        self.author = Author.objects.create(
+            first_name="Ursula", last_name="Le Guin", year_of_birth=1929
+        )
+        self.category = Category.objects.create(name="Fantasy")
+        self.books = [
+            Book.objects.create(
+                title=f"Earthsea {i}",
+                isbn=f"978000000000{i}",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publisher,
+            )
+            for i in range(5)
+        ]
+        self.author.books.add(*self.books)
+        self.category.books.add(self.books[0])
+
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        @router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return get_object_or_404(Book, pk=id)
+
+        load_related_for_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination)
+        serve_book_documents(router)
+        self.client = api_client(router)
+        self.key = register_schema(BookOutSchema)
+
+    def document(self, book):
+        return json.loads(BookDocument.objects.get(book=book, schema=self.key).content)
+
+    def test_documents_match_rendered_responses(self):
+        cursor = self.client.get("/?limit=2").json()["next"]
+        paths = ["/", "/?limit=2", f"/?limit=2&cursor={cursor}", f"/{self.books[0].pk}"]
+        rendered = [self.client.get(path).content for path in paths]
+
+        with override_settings(BOOKS_API_BOOK_DOCUMENTS=True):
+            # Missing documents are built on the way
+            served = [self.client.get(path).content for path in paths]
+            self.assertEqual(BookDocument.objects.count(), 5)
+            self.assertEqual(served, rendered)
+
+            # Then the page of ids, and the documents for them
+            with self.assertNumQueries(2):
+                self.assertEqual(self.client.get("/").content, rendered[0])
+
+            self.assertEqual(self.client.get("/0").status_code, 404)
+
+    @override_settings(BOOKS_API_BOOK_DOCUMENTS=True)
+    def test_documents_follow_changes(self):
+        build_documents([book.pk for book in self.books], keys=[self.key])
+        book = self.books[0]
+
+        book.title = "Tehanu"
+        book.save()
+        self.assertEqual(self.document(book)["title"], "Tehanu")
+
+        self.author.last_name = "K. Le Guin"
+        self.author.save()
+        self.assertEqual(
+            {self.document(book)["authors"][0]["last_name"] for book in self.books},
+            {"K. Le Guin"},
+        )
+
+        self.publisher.name = "Orbit"
+        self.publisher.save()
+        self.assertEqual(self.document(book)["publisher"]["name"], "Orbit")
+
+        book.authors.clear()
+        self.assertEqual(self.document(book)["authors"], [])
+
+        bulk_patch_objects(
+            "books_api",
+            "Book",
+            [(book.pk, BookInPatchSchema(title="The Farthest Shore"))],
+        )
+        self.assertEqual(self.document(book)["title"], "The Farthest Shore")
+
+        self.author.delete()
+        self.assertEqual(self.document(self.books[1])["authors"], [])
+
+        author = Author.objects.create(
+            first_name="Terry", last_name="Pratchett", year_of_birth=1948
+        )
+        author.books.add(self.books[1])
+        delete_object("books_api", "Author", author.pk)
+        self.assertEqual(self.document(self.books[1])["authors"], [])
+
+        self.assertEqual(
+            staleness(self.key), {"missing": 0, "stale": 0, "max_lag_seconds": 0.0}
+        )
+
+    def test_staleness_exported_as_metrics(self):
+        def gauges():
+            response = metrics.metrics_view(RequestFactory().get("/metrics"))
+            return [
+                line
+                for line in response.content.decode().splitlines()
+                if line.startswith("books_api_book_documents_")
+                and f'schema="{self.key}"' in line
+            ]
+
+        self.assertEqual(gauges(), [])
+
+        with override_settings(BOOKS_API_BOOK_DOCUMENTS=True):
+            build_documents([book.pk for book in self.books[1:]], keys=[self.key])
+            # Written without sending post_save, so the document is out of date
+            Book.objects.filter(pk=self.books[1].pk).update(
+                updated_at=timezone.now() + timedelta(seconds=5)
+            )
+
+            missing, stale, max_lag = gauges()
+        self.assertEqual(
+            missing, f'books_api_book_documents_missing{{schema="{self.key}"}} 1'
+        )
+        self.assertEqual(
+            stale, f'books_api_book_documents_stale{{schema="{self.key}"}} 1'
+        )
+        self.assertGreaterEqual(float(max_lag.split()[-1]), 5)
+
+    def test_book_documents_command(self):
+        out = StringIO()
+        call_command("book_documents", "backfill", "--schema", self.key, stdout=out)
+        self.assertIn("Built 5 documents", out.getvalue())
+        self.assertIn(
+            f'{self.key}: {{"missing": 0, "stale": 0', out.getvalue().splitlines()[1]
+        )
+
+        call_command(
+            "book_documents", "verify", "--schema", self.key, stdout=StringIO()
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("book_documents", "backfill", "--schema", "Unknown:0")
+
+        # Written without sending post_save, so the document is out of date
+        Book.objects.filter(pk=self.books[0].pk).update(
+            title="Tehanu", updated_at=timezone.now()
+        )
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("book_documents", "verify", "--schema", self.key, stdout=out)
+        self.assertIn('"stale": 1', out.getvalue())
+        self.assertIn("1 mismatched, 0 missing", out.getvalue())
+
+
+class StatsTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        Author.objects.all().delete()
+        Category.objects.all().delete()
+        caches["default"].clear()
+        self.publisher_1 = Publisher.objects.create(name="Publisher 1")
+        self.publisher_2 = Publisher.objects.create(name="Publisher 2")
+        self.author_1 = Author.objects.create(
+            first_name="Old", last_name="Author", year_of_birth=1900
+        )
+        self.author_2 = Author.objects.create(
+            first_name="Young", last_name="Author", year_of_birth=1990
+        )
+        self.category = Category.objects.create(name="Fiction")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                isbn=f"978000000000{i}",
+                rrp=Decimal(rrp),
+                format=book_format,
+                publisher=publisher,
+            )
+            for i, (rrp, book_format, publisher) in enumerate(
+                [
+                    ("10.00", "Paperback", self.publisher_1),
+                    ("20.00", "Paperback", self.publisher_1),
+                    ("25.00", "Hard Cover", self.publisher_1),
+                    ("5.00", "Ebook", self.publisher_2),
+                ]
+            )
+        ]
+        # Book 0 has both authors, so must still only be counted once
+        self.author_1.books.add(*self.books[:3])
+        self.author_2.books.add(self.books[0], self.books[3])
+        self.category.books.add(*self.books[:2])
+        self.client = Client()
+
+    def stats(self, path):
+        response = self.client.get(f"/api/v2/stats/{path}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_book_stats(self):
+        self.assertEqual(
+            self.stats("books"),
+            {"count": 4, "average_rrp": "15.00", "min_rrp": "5.00", "max_rrp": "25.00"},
+        )
+        self.assertEqual(
+            self.stats("books?format=Paperback&min_rrp=15"),
+            {
+                "count": 1,
+                "average_rrp": "20.00",
+                "min_rrp": "20.00",
+                "max_rrp": "20.00",
+            },
+        )
+        self.assertEqual(self.stats("books?min_author_year_of_birth=1950")["count"], 2)
+        self.assertEqual(
+            self.stats("books?max_rrp=1"),
+            {"count": 0, "average_rrp": None, "min_rrp": None, "max_rrp": None},
+        )
+        response = self.client.get("/api/v2/stats/books?format=Scroll")
+        self.assertEqual(response.status_code, 422)
+
+    def test_grouped_stats(self):
+        self.assertEqual(
+            [(row["format"], row["count"]) for row in self.stats("formats")],
+            [("Ebook", 1), ("Hard Cover", 1), ("Paperback", 2)],
+        )
+        self.assertEqual(
+            [
+                (row["id"], row["count"], row["average_rrp"])
+                for row in self.stats("publishers")
+            ],
+            [(self.publisher_1.pk, 3, "18.33"), (self.publisher_2.pk, 1, "5.00")],
+        )
+        self.assertEqual(
+            [(row["name"], row["count"]) for row in self.stats("categories")],
+            [("Fiction", 2)],
+        )
+        self.assertEqual(
+            [(row["first_name"], row["count"]) for row in self.stats("authors")],
+            [("Old", 3), ("Young", 2)],
+        )
+        self.assertEqual(
+            [
+                (row["first_name"], row["count"])
+                for row in self.stats("authors?min_author_year_of_birth=1950")
+            ],
+            [("Young", 2)],
+        )
+
+    def test_results_cached_until_a_write(self):
+        self.stats("publishers")
+        with self.assertNumQueries(0):
+            self.stats("publishers")
+        # Filters are part of the key
+        with self.assertNumQueries(1):
+            self.stats("publishers?format=Ebook")
+
+        self.publisher_2.name = "Renamed"
+        self.publisher_2.save()
+        self.assertEqual(self.stats("publishers")[1]["name"], "Renamed")
+
+        bulk_patch_objects(
+            "books_api", "Book", [(self.books[3].pk, BookInPatchSchema(rrp="7.00"))]
+        )
+        self.assertEqual(self.stats("books")["min_rrp"], "7.00")
+
+        self.category.books.clear()
+        self.assertEqual(self.stats("categories"), [])
+
+        self.assertEqual(len(self.stats("publishers")), 2)
+        delete_object("books_api", "Publisher", self.publisher_2.pk)
+        self.assertEqual(len(self.stats("publishers")), 1)
+
+    @override_settings(BOOKS_API_STATS_CACHE={"CACHE_ALIAS": "default", "TIMEOUT": 1})
+    def test_results_expire(self):
+        self.stats("books")
+        # Written without sending signals, so seen only once the result expires
+        Book.objects.filter(pk=self.books[3].pk).update(rrp=Decimal("1.00"))
+        self.assertEqual(self.stats("books")["min_rrp"], "5.00")
+        time.sleep(1.1)
+        self.assertEqual(self.stats("books")["min_rrp"], "1.00")
+
+
+class MetricsTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        publisher = Publisher.objects.create(name="Picador")
+        self.book = Book.objects.create(
+            title="Blood Meridian",
+            isbn="9780000000001",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=publisher,
+        )
+        for name in ("Cormac", "Charles"):
+            Author.objects.create(
+                first_name=name, last_name="McCarthy", year_of_birth=1933
+            ).books.add(self.book)
+        metrics.reset()
+
+    def test_histogram_quantiles(self):
+        histogram = metrics.Histogram(significant_bits=5)
+        for value in range(1, 100_001):
+            histogram.record(value)
+
+        self.assertEqual(histogram.count, 100_000)
+        self.assertEqual(histogram.quantile(1), 100_000)
+        for q in (0.5, 0.9, 0.99):
+            self.assertAlmostEqual(
+                histogram.quantile(q) / (q * 100_000), 1, delta=2**-5
+            )
+        # Small values are counted exactly, large ones in a few buckets
+        self.assertEqual(histogram.quantile(0.0001), 10)
+        self.assertLess(len(histogram.counts), 400)
+
+    def test_requests_recorded_per_operation(self):
+        client = Client()
+        sizes = [
+            len(client.get(f"/api/v2/book/{self.book.id}/authors").content)
+            for _ in range(3)
+        ]
+
+        response = metrics.metrics_view(RequestFactory().get("/metrics"))
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        lines = response.content.decode().splitlines()
+        labels = (
+            'operation="get_book_authors",method="GET",'
+            'route="api/v2/book/<int:id>/authors"'
+        )
+        self.assertIn("# TYPE books_api_db_queries summary", lines)
+        self.assertIn(f"books_api_request_duration_seconds_count{{{labels}}} 3", lines)
+        # The two authors' ids, read by one query
+        self.assertIn(f'books_api_db_queries{{{labels},quantile="0.999"}} 1', lines)
+        self.assertIn(f"books_api_db_rows_sum{{{labels}}} 6", lines)
+        self.assertIn(f"books_api_response_bytes_sum{{{labels}}} {sum(sizes)}", lines)
+
+    def test_response_cache_counters(self):
+        def counters():
+            response = metrics.metrics_view(RequestFactory().get("/metrics"))
+            return [
+                line
+                for line in response.content.decode().splitlines()
+                if line.startswith("books_api_response_cache_")
+            ]
+
+        self.assertEqual(counters(), [])
+
+        client = Client()
+        with override_settings(BOOKS_API_RESPONSE_CACHE={"MAX_ENTRIES": 1}):
+            for path in (f"/api/v2/book/{self.book.id}", "/api/v2/book/"):
+                client.get(path)
+                client.get(path)
+
+            self.assertEqual(
+                counters(),
+                [
+                    "books_api_response_cache_hits_total 2",
+                    "books_api_response_cache_misses_total 2",
+                    "books_api_response_cache_evictions_total 1",
+                ],
+            )
+
+    def test_query_count_warning(self):
+        client = Client()
+        with override_settings(BOOKS_API_QUERY_COUNT_WARNING=0):
+            with self.assertLogs("books_api.metrics", "WARNING") as logs:
+                client.get(f"/api/v2/book/{self.book.id}/authors")
+        self.assertIn("ran 1 database queries", logs.output[0])
+
+        with override_settings(BOOKS_API_QUERY_COUNT_WARNING=1):
+            with self.assertNoLogs("books_api.metrics", "WARNING"):
+                client.get(f"/api/v2/book/{self.book.id}/authors")
+
+    async def test_requests_recorded_under_asgi(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        # Served without a thread of its own
+        self.assertTrue(iscoroutinefunction(metrics.MetricsMiddleware(get_response)))
+
+        await AsyncClient().get(f"/api/v2/book/{self.book.id}/authors")
+
+        response = await sync_to_async(metrics.metrics_view)(
+            RequestFactory().get("/metrics")
+        )
+        lines = response.content.decode().splitlines()
+        labels = (
+            'operation="get_book_authors",method="GET",'
+            'route="api/v2/book/<int:id>/authors"'
+        )
+        self.assertIn(f"books_api_request_duration_seconds_count{{{labels}}} 1", lines)
+        # Queries run through sync_to_async() are counted too
+        self.assertIn(f"books_api_db_queries_sum{{{labels}}} 1", lines)
+
+
+class RelatedIdsTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        Author.objects.all().delete()
+        Category.objects.all().delete()
+        self.publishers = [
+            Publisher.objects.create(name=name) for name in ("Faber", "Vintage")
+        ]
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                isbn=f"978000000000{i}",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publishers[0],
+            )
+            for i in range(3)
+        ]
+        self.authors = [
+            Author.objects.create(
+                first_name=name, last_name="Author", year_of_birth=1950
+            )
+            for name in ("First", "Second")
+        ]
+        self.authors[0].books.add(*self.books[:2])
+        self.authors[1].books.add(self.books[0])
+        self.category = Category.objects.create(name="Poetry")
+        self.category.books.add(self.books[1])
+        self.client = Client()
+
+    def get(self, path, ids):
+        query = "&".join(f"ids={pk}" for pk in ids)
+        response = self.client.get(f"/api/v2/{path}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_related_ids_of_many_objects(self):
+        book_ids = [book.pk for book in self.books] + [0]
+        author_ids = [author.pk for author in self.authors]
+
+        with self.assertNumQueries(1):
+            authors = self.get("book/authors", book_ids)
+        self.assertEqual(
+            authors,
+            {
+                str(self.books[0].pk): sorted(author_ids),
+                str(self.books[1].pk): [self.authors[0].pk],
+                str(self.books[2].pk): [],
+                "0": [],
+            },
+        )
+        self.assertEqual(
+            self.get("book/categories", book_ids[:2]),
+            {str(self.books[0].pk): [], str(self.books[1].pk): [self.category.pk]},
+        )
+        self.assertEqual(
+            self.get("author/books", author_ids),
+            {
+                str(self.authors[0].pk): [book.pk for book in self.books[:2]],
+                str(self.authors[1].pk): [self.books[0].pk],
+            },
+        )
+        self.assertEqual(
+            self.get(
+                "publisher/books", [publisher.pk for publisher in self.publishers]
+            ),
+            {
+                str(self.publishers[0].pk): [book.pk for book in self.books],
+                str(self.publishers[1].pk): [],
+            },
+        )
+
+        self.assertEqual(self.client.get("/api/v2/book/authors").status_code, 422)
+
+    def test_book_authors_of_missing_book(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/v2/book/{self.books[0].pk}/authors")
+        self.assertEqual(response.json(), sorted(a.pk for a in self.authors))
+
+        self.assertEqual(
+            self.client.get(f"/api/v2/book/{self.books[2].pk}/authors").json(), []
+        )
+        response = self.client.get("/api/v2/book/0/authors")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(), {"api_error": "Requested Book object does not exist"}
+        )
+
+
+class SeedCatalogueTestCase(TransactionTestCase):
+    def seed(self, **options):
+        out = StringIO()
+        call_command(
+            "seed_catalogue",
+            books=300,
+            publishers=20,
+            authors=50,
+            categories=5,
+            chunk_size=100,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def catalogue(self):
+        return list(
+            Book.objects.order_by("isbn").values_list(
+                "isbn", "title", "rrp", "format", "publisher__name"
+            )
+        ), sorted(
+            Author.books.through.objects.values_list(
+                "book__isbn", "author__first_name", "author__last_name"
+            )
+        )
+
+    def test_seeded_catalogue(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+
+        output = self.seed(seed=7)
+        self.assertIn("Created 300 books, 50 authors, 20 publishers", output)
+        self.assertIn("rows/s", output)
+        self.assertEqual(Book.objects.count(), 300)
+        self.assertEqual(Publisher.objects.count(), 20)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], synchronous)
+
+        # Several authors for some Books, and a few publishers with most Books
+        authors_per_book = Counter(
+            Author.books.through.objects.values_list("book_id", flat=True)
+        )
+        self.assertEqual(len(authors_per_book), 300)
+        self.assertGreater(max(authors_per_book.values()), 1)
+        books_per_publisher = sorted(
+            Counter(Book.objects.values_list("publisher_id", flat=True)).values(),
+            reverse=True,
+        )
+        self.assertGreater(sum(books_per_publisher[:4]), 150)
+        self.assertTrue(Category.books.through.objects.exists())
+        self.assertEqual(search_books("the").count(), 300)
+
+        # The same seed generates the same catalogue
+        catalogue = self.catalogue()
+        for model_class in (Book, Author, Publisher, Category):
+            model_class.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(self.catalogue(), catalogue)
+
+        with self.assertRaisesMessage(CommandError, "already has Books"):
+            self.seed()
+
+
+class ImportBooksTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        Author.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Granta")
+        self.other_publisher = Publisher.objects.create(name="Bloomsbury")
+        self.authors = [
+            Author.objects.create(
+                first_name=first_name, last_name=last_name, year_of_birth=1950
+            )
+            for first_name, last_name in (("Kazuo", "Ishiguro"), ("Ali", "Smith"))
+        ]
+        self.book = Book.objects.create(
+            title="Old title",
+            isbn="9780000000001",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+        self.book.authors.add(self.authors[1])
+
+    def test_import_command(self):
+        feed = (
+            "isbn,title,format,rrp,publisher,authors\n"
+            "978-0-00-000000-1,New title,Ebook,9.99,Bloomsbury,Kazuo Ishiguro\n"
+            "9780000000002,Autumn,Paperback,8.99,Granta,Ali Smith; Kazuo Ishiguro\n"
+            "9780000000003,Unknown,Paperback,8.99,Nobody,\n"
+            "9780000000004,Too dear,Paperback,100000,Granta,Ali Smith\n"
+            "9780000000005,Winter,Paperback,8.99,Granta,Nobody Atall\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(feed)
+            file.flush()
+            out, err = StringIO(), StringIO()
+            # Small batches, so that rows are imported across several
+            call_command(
+                "import_books", file.name, batch_size=2, stdout=out, stderr=err
+            )
+
+        self.assertIn("Inserted 1, updated 1 and rejected 3 books", out.getvalue())
+        self.assertIn("Line 4: Unknown publisher: Nobody", err.getvalue())
+        self.assertIn("Line 5: rrp:", err.getvalue())
+        self.assertIn("Line 6: Unknown authors: Nobody Atall", err.getvalue())
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "New title")
+        self.assertEqual(self.book.publisher, self.other_publisher)
+        self.assertEqual(list(self.book.authors.all()), [self.authors[0]])
+        autumn = Book.objects.get(isbn="9780000000002")
+        self.assertEqual(set(autumn.authors.all()), set(self.authors))
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(search_books("autumn").get(), autumn)
+
+    def test_blank_csv_authors_keep_links(self):
+        feed = (
+            "isbn,title,format,rrp,publisher,authors\n"
+            "9780000000001,New title,Ebook,9.99,Granta,\n"
+            "9780000000002,Autumn,Paperback,8.99,Granta, ; \n"
+        )
+        result = imports.import_books(
+            imports.parse_feed(BytesIO(feed.encode()), imports.FeedFormat.CSV)
+        )
+
+        self.assertEqual((result.inserted, result.updated), (1, 1))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "New title")
+        self.assertEqual(list(self.book.authors.all()), [self.authors[1]])
+        self.assertFalse(Book.objects.get(isbn="9780000000002").authors.exists())
+
+    def test_import_upload(self):
+        rows = [
+            {
+                "isbn": "9780000000001",
+                "title": "Kept authors",
+                "format": "Paperback",
+                "rrp": "7.50",
+                "publisher": "Granta",
+            },
+            {
+                "isbn": "9780000000101",
+                "title": "Hotel World",
+                "format": "Hard Cover",
+                "rrp": "20.00",
+                "publisher": "Granta",
+                "authors": ["Ali Smith"],
+            },
+        ]
+        feed = "\n".join(json.dumps(row) for row in rows).encode() + b"\n{oops\n"
+        response = Client().post(
+            "/api/v2/book/import",
+            {"file": SimpleUploadedFile("feed.jsonl", feed)},
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(
+            (result["inserted"], result["updated"], result["rejected"]), (1, 1, 1)
+        )
+        self.assertEqual(result["errors"][0]["line"], 3)
+        # Rows without authors leave the links alone
+        self.assertEqual(list(self.book.authors.all()), [self.authors[1]])
+
+        response = Client().post(
+            "/api/v2/book/import", {"file": SimpleUploadedFile("feed.txt", feed)}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class JobsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.publisher = Publisher.objects.create(name="Granta")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {n}",
+                isbn=f"978000000010{n}",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publisher,
+            )
+            for n in range(3)
+        ]
+        self.files_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.files_dir.cleanup)
+        settings_override = override_settings(
+            BOOKS_API_JOB_FILES_DIR=self.files_dir.name
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def run_jobs(self, threads=1):
+        call_command("run_jobs", once=True, threads=threads, stdout=StringIO())
+
+    def test_background_bulk_delete(self):
+        client = Client()
+        response = client.delete(
+            "/api/v2/publisher/bulk?background=true",
+            {"ids": [self.publisher.id, 10000]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual((job["kind"], job["status"]), ("bulk_delete", "queued"))
+        self.assertTrue(Publisher.objects.filter(pk=self.publisher.pk).exists())
+
+        self.run_jobs()
+
+        job = client.get(f"/api/v2/jobs/{job['id']}").json()
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual((job["rows_processed"], job["rows_total"]), (2, 2))
+        self.assertEqual(
+            job["result"], {"deleted": [self.publisher.id], "missing": [10000]}
+        )
+        # The publisher's Books went with it
+        self.assertFalse(Book.objects.exists())
+
+        response = client.get("/api/v2/jobs/10000")
+        self.assertEqual(response.status_code, 404)
+
+    def test_background_import(self):
+        feed = (
+            "isbn,title,format,rrp,publisher\n"
+            "9780000000100,Renamed,Ebook,9.99,Granta\n"
+            "9780000000200,New,Paperback,8.99,Granta\n"
+            "9780000000300,Unknown,Paperback,8.99,Nobody\n"
+        ).encode()
+        response = Client().post(
+            "/api/v2/book/import?background=true",
+            {"file": SimpleUploadedFile("feed.csv", feed)},
+        )
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()["id"])
+        with open(job.payload["file"], "rb") as stored:
+            self.assertEqual(stored.read(), feed)
+
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatusChoices.SUCCEEDED)
+        self.assertEqual(job.rows_processed, 3)
+        self.assertIsNone(job.rows_total)
+        self.assertEqual(
+            (job.result["inserted"], job.result["updated"], job.result["rejected"]),
+            (1, 1, 1),
+        )
+        self.assertEqual(Book.objects.get(isbn="9780000000100").title, "Renamed")
+        # The stored feed is removed once imported
+        self.assertFalse(os.listdir(self.files_dir.name))
+
+    def test_run_jobs_runs_each_job_once(self):
+        ran = Counter()
+
+        def record(job, progress):
+            ran[job.pk] += 1
+            progress.update(1, 1)
+            return {"worker": job.worker}
+
+        with mock.patch.dict(jobs._handlers, {"record": record}):
+            submitted = [jobs.submit("record", {}) for _ in range(20)]
+            self.run_jobs()
+
+        self.assertEqual(ran, Counter({job.pk: 1 for job in submitted}))
+        self.assertEqual(
+            set(Job.objects.values_list("status", flat=True)),
+            {JobStatusChoices.SUCCEEDED},
+        )
+
+    def test_claims(self):
+        first = jobs.submit("bulk_delete", {"model_name": "Book", "ids": []})
+        second = jobs.submit("bulk_delete", {"model_name": "Book", "ids": []})
+
+        self.assertEqual(jobs.claim("a"), first)
+        # A job already claimed isn't claimed again
+        self.assertEqual(jobs.claim("b"), second)
+        self.assertIsNone(jobs.claim("c"))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker), (JobStatusChoices.RUNNING, "a"))
+
+        with self.assertRaises(ValueError):
+            jobs.submit("unknown", {})
+
+    def test_claim_lost_to_another_worker(self):
+        first = jobs.submit("bulk_delete", {"model_name": "Book", "ids": []})
+        second = jobs.submit("bulk_delete", {"model_name": "Book", "ids": []})
+        update = QuerySet.update
+
+        def claimed_elsewhere(queryset, **kwargs):
+            # Another worker claims the job picked before it is marked
+            # running, and only the first time
+            if queryset.model is Job and first.worker == "":
+                first.worker = "b"
+                update(Job.objects.filter(pk=first.pk), status="running", worker="b")
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", claimed_elsewhere):
+            self.assertEqual(jobs.claim("a"), second)
+
+        first.refresh_from_db()
+        self.assertEqual(first.worker, "b")
+
+    def test_failed_job(self):
+        job = jobs.submit("bulk_delete", {"ids": [1]})
+        with self.assertLogs("books_api.jobs", "ERROR"):
+            jobs.run(jobs.claim("a"))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatusChoices.FAILED)
+        self.assertIn("KeyError: 'model_name'", job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs_are_queued_again(self):
+        abandoned = jobs.submit("bulk_delete", {"model_name": "Book", "ids": []})
+        jobs.claim("a")
+        self.assertEqual(jobs.requeue_stale(), 0)
+
+        Job.objects.update(heartbeat_at=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, JobStatusChoices.QUEUED)
+
+        # Until they have been claimed MAX_ATTEMPTS times
+        Job.objects.update(
+            status=JobStatusChoices.RUNNING,
+            attempts=jobs.MAX_ATTEMPTS,
+            heartbeat_at=timezone.now() - jobs.STALE_AFTER * 2,
+        )
+        self.assertEqual(jobs.requeue_stale(), 0)
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, JobStatusChoices.FAILED)
+
+    def test_heartbeat_stamped_while_job_runs(self):
+        def slow(job, progress):
+            time.sleep(0.3)
+            return {}
+
+        with mock.patch.dict(jobs._handlers, {"slow": slow}):
+            job = jobs.submit("slow", {})
+            jobs.run(jobs.claim("a"), heartbeat_interval=timedelta(seconds=0.05))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatusChoices.SUCCEEDED)
+        # Stamped with no progress reported
+        self.assertGreater(job.heartbeat_at - job.started_at, timedelta(seconds=0.1))
+
+    def test_worker_stops_once_claim_lost(self):
+        steps = []
+
+        def requeued(job, progress):
+            progress.update(1, 3)
+            steps.append(1)
+            # Taken to be stale, and queued again, while still running
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatusChoices.QUEUED, worker=""
+            )
+            progress.update(2)
+            steps.append(2)
+            return {}
+
+        with mock.patch.dict(jobs._handlers, {"requeued": requeued}):
+            job = jobs.submit("requeued", {})
+            with self.assertLogs("books_api.jobs", "WARNING"):
+                jobs.run(jobs.claim("a"))
+
+        self.assertEqual(steps, [1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed), (JobStatusChoices.QUEUED, 1))
+
+
+class ResponseCacheTestCase(TransactionTestCase):
+    def setUp(self):
+        # Enabled per test, rather than per class, so each test starts with an
+        # empty cache
+        cache_settings = override_settings(BOOKS_API_RESPONSE_CACHE={"MAX_ENTRIES": 10})
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Test Publisher Number 1")
+        self.author = Author.objects.create(
+            first_name="Testy", last_name="Authorson", year_of_birth=1929
+        )
+        self.book = Book.objects.create(
+            title=BOOK_INITIAL_TITLE,
+            isbn=BOOK_INITIAL_ISBN,
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        @router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return Book.objects.get(pk=id)
+
+        load_related_for_responses(router, "books_api", "Book")
+        cache_get_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination)
+        self.client = TestClient(router)
+
+    def assertCached(self, path):
+        with self.assertNumQueries(0):
+            return self.client.get(path)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        first = self.client.get(f"/{self.book.id}")
+        second = self.assertCached(f"/{self.book.id}")
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+        cache = get_response_cache()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_query_string_is_part_of_key(self):
+        self.client.get("/?limit=1")
+
+        with self.assertNumQueries(2):
+            self.client.get("/?limit=2")
+        self.assertCached("/?limit=1")
+
+    def test_publisher_change_evicts_books_embedding_it(self):
+        self.client.get(f"/{self.book.id}")
+        self.client.get("/")
+
+        self.publisher.name = "Renamed Publisher"
+        self.publisher.save()
+
+        response = self.client.get(f"/{self.book.id}")
+        self.assertEqual(response.json()["publisher"]["name"], "Renamed Publisher")
+        response = self.client.get("/")
+        self.assertEqual(
+            response.json()["items"][0]["publisher"]["name"], "Renamed Publisher"
+        )
+
+    def test_selected_fields_are_not_served_stale(self):
+        client = Client()
+        detail_path = f"/api/v2/book/{self.book.id}?fields=title"
+        list_path = "/api/v2/book/?fields=title"
+        client.get(detail_path)
+        client.get(list_path)
+
+        # Neither body has an id to be tagged with
+        self.book.title = "CHANGED"
+        self.book.save()
+
+        self.assertEqual(client.get(detail_path).json(), {"title": "CHANGED"})
+        self.assertEqual(client.get(list_path).json()["items"], [{"title": "CHANGED"}])
+
+    def test_locmem_timeout(self):
+        with override_settings(
+            BOOKS_API_RESPONSE_CACHE={"MAX_ENTRIES": 10, "TIMEOUT": 60}
+        ), mock.patch("books_api.cache.time.monotonic", return_value=1000):
+            self.client.get(f"/{self.book.id}")
+            self.assertCached(f"/{self.book.id}")
+
+            with mock.patch("books_api.cache.time.monotonic", return_value=1060):
+                self.client.get(f"/{self.book.id}")
+            cache = get_response_cache()
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_unrelated_change_keeps_entry(self):
+        self.client.get(f"/{self.book.id}")
+
+        Publisher.objects.create(name="Test Publisher Number 2")
+        Author.objects.create(first_name="New", last_name="Author", year_of_birth=1)
+
+        self.assertCached(f"/{self.book.id}")
+
+    def test_new_object_evicts_lists_only(self):
+        self.client.get(f"/{self.book.id}")
+        self.client.get("/")
+
+        Book.objects.create(
+            title="Another Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+
+        self.assertCached(f"/{self.book.id}")
+        self.assertEqual(len(self.client.get("/").json()["items"]), 2)
+
+    def test_m2m_changes_evict_from_either_side(self):
+        self.client.get(f"/{self.book.id}")
+
+        # The relation is declared on Author, so this is its forward side
+        self.author.books.add(self.book)
+        self.assertEqual(
+            [a["id"] for a in self.client.get(f"/{self.book.id}").json()["authors"]],
+            [self.author.id],
+        )
+
+        self.book.authors.clear()
+        self.assertEqual(self.client.get(f"/{self.book.id}").json()["authors"], [])
+
+    def test_deleting_linked_object_evicts_entry(self):
+        self.author.books.add(self.book)
+        self.client.get(f"/{self.book.id}")
+
+        self.author.delete()
+
+        self.assertEqual(self.client.get(f"/{self.book.id}").json()["authors"], [])
+
+    def test_delete_helpers_evict_cascaded_and_linked_entries(self):
+        self.author.books.add(self.book)
+        self.client.get(f"/{self.book.id}")
+        self.client.get("/")
+
+        delete_object("books_api", "Author", self.author.id)
+        self.assertEqual(self.client.get(f"/{self.book.id}").json()["authors"], [])
+
+        # The Publisher's Books are deleted by its cascade
+        bulk_delete_objects("books_api", "Publisher", [self.publisher.id])
+        self.assertEqual(self.client.get("/").json()["items"], [])
+
+    def test_bulk_helpers_evict_entries(self):
+        self.client.get(f"/{self.book.id}")
+        self.client.get("/")
+
+        bulk_patch_objects(
+            "books_api", "Book", [(self.book.id, BookInPatchSchema(title="Patched"))]
+        )
+        self.assertEqual(self.client.get(f"/{self.book.id}").json()["title"], "Patched")
+
+        bulk_create_objects(
+            "books_api",
+            "Book",
+            [
+                BookBulkInSchema(
+                    title="Bulk Book",
+                    isbn="9999999999999",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher_id=self.publisher.id,
+                )
+            ],
+        )
+        self.assertEqual(len(self.client.get("/").json()["items"]), 2)
+
+    @override_settings(BOOKS_API_RESPONSE_CACHE={"MAX_ENTRIES": 2})
+    def test_least_recently_used_entry_is_evicted(self):
+        self.client.get("/?limit=1")
+        self.client.get("/?limit=2")
+        self.assertCached("/?limit=1")
+        self.client.get("/?limit=3")
+
+        cache = get_response_cache()
+        self.assertEqual(cache.evictions, 1)
+        self.assertCached("/?limit=1")
+        with self.assertNumQueries(2):
+            self.client.get("/?limit=2")
+
+    @override_settings(
+        BOOKS_API_RESPONSE_CACHE={"BACKEND": "django"},
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        },
+    )
+    def test_django_cache_backend(self):
+        self.client.get(f"/{self.book.id}")
+        self.assertCached(f"/{self.book.id}")
+
+        self.publisher.name = "Renamed Publisher"
+        self.publisher.save()
+
+        response = self.client.get(f"/{self.book.id}")
+        self.assertEqual(response.json()["publisher"]["name"], "Renamed Publisher")
+        cache = get_response_cache()
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    @override_settings(BOOKS_API_RESPONSE_CACHE=None)
+    def test_disabled_by_default(self):
+        self.client.get(f"/{self.book.id}")
+
+        with self.assertNumQueries(3):
+            self.client.get(f"/{self.book.id}")
+
+
+class ServeAsyncTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        publisher = Publisher.objects.create(name="Test Publisher Number 1")
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title=f"Book {i}",
+                    isbn=f"{i:013d}",
+                    rrp=BOOK_INITIAL_RRP,
+                    format=BOOK_INITIAL_FORMAT,
+                    publisher=publisher,
+                )
+                for i in range(5)
+            ]
+        )
+
+    def book_router(self):
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        load_related_for_responses(router, "books_api", "Book")
+        conditional_get_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination)
+        return router
+
+    async def test_sync_operations_served_async(self):
+        router = self.book_router()
+        sync_response = await sync_to_async(TestClient(router).get)("/?limit=3")
+
+        serve_async(router)
+        operation = next(iter(router.path_operations.values())).operations[0]
+        self.assertTrue(operation.is_async)
+        response = await TestAsyncClient(router).get("/?limit=3")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response["ETag"], sync_response["ETag"])
+
+    async def test_writes_served_by_async_helpers(self):
+        router = Router()
+
+        @router.patch("/{int:id}", response={200: BookOutSchema, 404: ErrorSchema})
+        def patch_book(request, id: int, payload: BookInPatchSchema):
+            raise AssertionError("Served by apatch_object() instead")
+
+        @router.delete("/{int:id}", response={200: None, 404: ErrorSchema})
+        def delete_book(request, id: int):
+            raise AssertionError("Served by adelete_object() instead")
+
+        report_conflicts(router)
+        serve_writes_async(router, "books_api", "Book")
+        serve_async(router)
+        client = TestAsyncClient(router)
+        book = await Book.objects.order_by("pk").afirst()
+
+        response = await client.patch(f"/{book.pk}", json={"title": "Patched"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Patched")
+        self.assertEqual(response.json()["publisher"]["id"], book.publisher_id)
+
+        response = await client.patch(f"/{book.pk}", json={"isbn": f"{1:013d}"})
+        self.assertEqual(response.status_code, 409)
+
+        response = await client.patch(f"/{book.pk}", json={"rrp": "lots"})
+        self.assertEqual(response.status_code, 422)
+
+        self.assertEqual((await client.delete(f"/{book.pk}")).status_code, 200)
+        self.assertEqual((await client.delete(f"/{book.pk}")).status_code, 404)
+
+
+class ConditionalGetTestCase(TransactionTestCase):
+    def setUp(self):
+        Publisher.objects.all().delete()
+        self.publisher = Publisher.objects.create(name="Test Publisher Number 1")
+        self.author = Author.objects.create(
+            first_name="Testy", last_name="Authorson", year_of_birth=1929
+        )
+        self.book = Book.objects.create(
+            title=BOOK_INITIAL_TITLE,
+            isbn=BOOK_INITIAL_ISBN,
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+        self.author.books.add(self.book)
+
+        router = Router()
+
+        @router.get("/", response=list[BookOutSchema])
+        def list_books(request):
+            return Book.objects.all()
+
+        @router.get("/{int:id}", response=BookOutSchema)
+        def get_book(request, id: int):
+            return get_object_or_404(Book, pk=id)
+
+        load_related_for_responses(router, "books_api", "Book")
+        conditional_get_responses(router, "books_api", "Book")
+        paginate_list_responses(router, CursorPagination)
+        self.client = TestClient(router)
+
+    def conditional_get(self, path, **headers):
+        # Ninja's TestClient doesn't normalise header names for request.META
+        meta = {f"HTTP_{name.upper()}": value for name, value in headers.items()}
+        return self.client.get(path, META=meta)
+
+    def assertNotModified(self, path, **headers):
+        # Answered from the version stamps alone
+        with self.assertNumQueries(1):
+            response = self.conditional_get(path, **headers)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, path, etag):
+        response = self.conditional_get(path, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response
+
+    def test_unchanged_object_not_modified(self):
+        response = self.client.get(f"/{self.book.id}")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertNotModified(f"/{self.book.id}", if_none_match=response["ETag"])
+        self.assertNotModified(
+            f"/{self.book.id}", if_modified_since=response["Last-Modified"]
+        )
+
+    def test_changes_to_rendered_rows_modify_object(self):
+        etag = self.client.get(f"/{self.book.id}")["ETag"]
+
+        self.publisher.name = "Renamed Publisher"
+        self.publisher.save()
+        etag = self.assertModified(f"/{self.book.id}", etag)["ETag"]
+
+        # Linking, and deleting a linked object, without a newer stamp
+        second_author = Author.objects.create(
+            first_name="Another", last_name="McAuthor", year_of_birth=1980
+        )
+        self.book.authors.add(second_author)
+        etag = self.assertModified(f"/{self.book.id}", etag)["ETag"]
+
+        Author.objects.filter(pk=second_author.pk).delete()
+        self.assertModified(f"/{self.book.id}", etag)
+
+    def test_helpers_stamp_changes(self):
+        etag = self.client.get(f"/{self.book.id}")["ETag"]
+
+        patch_object(
+            "books_api", "Book", self.book.id, BookInPatchSchema(title="Patched")
+        )
+        etag = self.assertModified(f"/{self.book.id}", etag)["ETag"]
+
+        bulk_patch_objects(
+            "books_api", "Book", [(self.book.id, BookInPatchSchema(title="Again"))]
+        )
+        self.assertModified(f"/{self.book.id}", etag)
+
+    def test_missing_object(self):
+        response = self.conditional_get("/10000", if_none_match='"etag"')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_collection_etag(self):
+        response = self.client.get("/?limit=1")
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        self.assertNotModified("/?limit=1", if_none_match=etag)
+        self.assertNotEqual(self.client.get("/?limit=2")["ETag"], etag)
+
+        self.author.first_name = "Renamed"
+        self.author.save()
+        etag = self.assertModified("/?limit=1", etag)["ETag"]
+
+        Book.objects.create(
+            title="Another Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher,
+        )
+        self.assertModified("/?limit=1", etag)
+
+
+class APIClientTests(TransactionTestCase):
+    def setUp(self):
+        # Books need publishers
+        Publisher.objects.all().delete()
+        self.publisher_1 = Publisher.objects.create(name="Test Publisher Number 1")
+        self.publisher_2 = Publisher.objects.create(name="Test Publisher Number 2")
+        self.author_1 = Author.objects.create(
+            first_name="Testy", last_name="Authorson", year_of_birth=1929
+        )
+        self.author_2 = Author.objects.create(
+            first_name="Another", last_name="McAuthor", year_of_birth=1980
+        )
+
+        self.book = Book.objects.create(
+            title=BOOK_INITIAL_TITLE,
+            isbn=BOOK_INITIAL_ISBN,
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
+        )
+
+    def test_update_book_via_http(self):
+        """
+        This test method is essentially superfluous, but present to demonstrate the use
+        of Django's Test HTTP client in a fairly simple case.
+        """
+        client = Client()
+
+        # For PUT-based updates, we need to provide all required fields
+        book_update_payload = self.book.__dict__
+        # Pop the '_state' key, because it will upset the JSON serialisation
+        _ = book_update_payload.pop("_state", None)
+
+        # Change the Title
+        book_update_payload["title"] = "PUT-updated title"
+
+        response = client.put(
+            f"/api/books/{self.book.id}",
+            book_update_payload,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response_json = response.json()
+        self.assertEqual(
+            response_json["title"],
+            "PUT-updated title",
+        )
+
+    def test_bulk_patch_books_via_http(self):
+        client = Client()
+
+        response = client.patch(
+            "/api/v2/book/bulk",
+            [
+                {"id": self.book.id, "patch": {"rrp": "4.56"}},
+                {"id": 10000, "patch": {"title": "Missing Book"}},
+            ],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response_json = response.json()
+        self.assertEqual(response_json[0]["status"], 200)
+        self.assertEqual(response_json[0]["response"]["rrp"], "4.56")
+        self.assertEqual(response_json[0]["response"]["title"], BOOK_INITIAL_TITLE)
+        self.assertEqual(response_json[1]["status"], 404)
+        self.assertEqual(
+            response_json[1]["response"]["api_error"],
+            "Requested Book object does not exist",
+        )
+
+    def test_taken_isbn_via_http(self):
+        second_book = Book.objects.create(
+            title="Second Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_1,
+        )
+        client = Client()
+
+        response = client.patch(
+            f"/api/v2/book/{second_book.id}",
+            {"isbn": BOOK_INITIAL_ISBN},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.json(), {"api_error": "Book with this isbn already exists"}
+        )
+
+        response = client.patch(
+            "/api/v2/book/bulk",
+            [{"id": second_book.id, "patch": {"isbn": BOOK_INITIAL_ISBN}}],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["status"], 409)
+
+    def test_export_books_via_http(self):
+        self.author_1.books.add(self.book)
+        category = Category.objects.create(name="Test Category")
+        category.books.add(self.book)
+        Book.objects.create(
+            title="Second Book",
+            isbn="9999999999999",
+            rrp=BOOK_INITIAL_RRP,
+            format=BOOK_INITIAL_FORMAT,
+            publisher=self.publisher_2,
+        )
+        client = Client()
+
+        response = client.get("/api/v2/book/export?chunk_size=1")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        books = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [book["title"] for book in books], [BOOK_INITIAL_TITLE, "Second Book"]
+        )
+        self.assertEqual(books[0]["publisher"]["name"], self.publisher_1.name)
+        self.assertEqual(books[0]["authors"][0]["last_name"], "Authorson")
+        self.assertEqual(
+            [(c["id"], c["name"]) for c in books[0]["categories"]],
+            [(category.id, "Test Category")],
+        )
+        self.assertEqual(books[0]["rrp"], str(BOOK_INITIAL_RRP))
+
+        response = client.get("/api/v2/book/export?format=json&chunk_size=1")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), books)
+
+    def test_bulk_create_books_via_http(self):
+        client = Client()
+        book = {
+            "title": "Bulk Book",
+            "isbn": "978-0-306-40615-7",
+            "rrp": "9.99",
+            "format": BOOK_INITIAL_FORMAT,
+            "publisher_id": self.publisher_2.id,
+            "authors": [self.author_2.id],
+        }
+
+        response = client.post(
+            "/api/v2/book/bulk",
+            [book, {**book, "isbn": BOOK_INITIAL_ISBN}],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response_json = response.json()
+        self.assertEqual(response_json[0]["index"], 0)
+        self.assertEqual(response_json[0]["status"], 201)
+        self.assertEqual(response_json[0]["response"]["isbn"], "9780306406157")
+        self.assertEqual(response_json[1]["index"], 1)
+        self.assertEqual(response_json[1]["status"], 409)
+
+        created_book = Book.objects.get(pk=response_json[0]["response"]["id"])
+        self.assertEqual(list(created_book.authors.all()), [self.author_2])
+
+    def test_bulk_delete_via_http(self):
+        client = Client()
+
+        response = client.delete(
+            "/api/v2/publisher/bulk",
+            {"ids": [self.publisher_2.id, 10000]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"deleted": [self.publisher_2.id], "missing": [10000]}
+        )
+
+        response = client.delete(
+            "/api/v2/book/bulk",
+            {"ids": [self.book.id]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {"deleted": [self.book.id], "missing": []})
+        self.assertFalse(Book.objects.exists())
+
+    def test_search_books_via_http(self):
+        if not search_supported():
+            self.skipTest("The full-text index is SQLite specific")
+
+        self.author_1.books.add(self.book)
+        for number in range(3):
+            Book.objects.create(
+                title=f"Test Book Volume {number}",
+                isbn=f"999999999999{number}",
+                rrp=BOOK_INITIAL_RRP,
+                format=BOOK_INITIAL_FORMAT,
+                publisher=self.publisher_2,
+            )
+        client = Client()
+
+        response = client.get("/api/v2/book/search?q=test+book&limit=3")
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertEqual(len(first_page["items"]), 3)
+        second_page = client.get(
+            f"/api/v2/book/search?q=test+book&limit=3&cursor={first_page['next']}"
+        ).json()
+        self.assertIsNone(second_page["next"])
+
+        ranked = search_books("test book").order_by("rank", "pk")
+        self.assertEqual(
+            [item["id"] for item in first_page["items"] + second_page["items"]],
+            list(ranked.values_list("pk", flat=True)),
+        )
+        book = next(
+            item
+            for item in first_page["items"] + second_page["items"]
+            if item["id"] == self.book.id
+        )
+        self.assertEqual(book["publisher"]["name"], self.publisher_1.name)
+        self.assertEqual(book["authors"][0]["last_name"], "Authorson")
+
+        self.assertEqual(client.get("/api/v2/book/search?q=").status_code, 422)
+
+    @override_settings(BOOKS_API_RESPONSE_CACHE={"MAX_ENTRIES": 10})
+    def test_cached_book_authors_evicted_by_m2m_change(self):
+        client = Client()
+        url = f"/api/v2/book/{self.book.id}/authors"
+
+        self.assertEqual(client.get(url).json(), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url).json(), [])
+
+        self.author_1.books.add(self.book)
+        self.assertEqual(client.get(url).json(), [self.author_1.id])
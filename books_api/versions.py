@@ -0,0 +1,170 @@
+"""
+Version stamps for answering conditional GET requests.
+
+Every model carries an "updated_at" column, stamped by save() and bumped here
+when its many-to-many links change. A response's version is then read with a
+single aggregate query over the stamps of the rows its schema renders,
+rather than by building the response and hashing it:
+
+- For one object, the newest stamp along each of the schema's relation
+  paths, and the number of rows on each multi-valued one (so that rows
+  removed without a newer stamp appearing, such as a deleted Author, still
+  change the version).
+- For a list, the number of rows and the newest stamp of the listed model
+  and of each model its schema renders.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from django.db.models import (
+    Count,
+    DateTimeField,
+    F,
+    Func,
+    IntegerField,
+    Max,
+    Model,
+    Subquery,
+)
+from django.utils import timezone
+from pydantic import BaseModel
+
+from books_api.querysets import related_lookups
+from books_api.write_plans import get_write_plan
+
+VERSION_FIELD = "updated_at"
+
+
+def lookup_path(model_class: type[Model], lookup: str) -> tuple[type[Model], bool]:
+    """
+    The model a related lookup such as "authors__books" ends at, and whether
+    any step along it is multi-valued.
+    """
+    many = False
+    for name in lookup.split("__"):
+        field_meta = model_class._meta.get_field(name)
+        many = many or field_meta.many_to_many or field_meta.one_to_many
+        model_class = field_meta.related_model
+    return model_class, many
+
+
+def version_tag(values: dict) -> str:
+    data = repr(sorted(values.items())).encode()
+    return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+
+def latest(values: dict) -> Optional[datetime]:
+    stamps = [value for value in values.values() if isinstance(value, datetime)]
+    return max(stamps, default=None)
+
+
+def object_version(
+    model_class: type[Model], pk, schema: type[BaseModel]
+) -> Optional[tuple[str, datetime]]:
+    """
+    The (tag, last modified) version of the object with primary key pk,
+    rendered with schema, or None if there is no such object.
+    """
+    select, prefetch = related_lookups(schema, model_class)
+
+    aggregates = {"version": Max(VERSION_FIELD)}
+    for index, lookup in enumerate(select + prefetch):
+        aggregates[f"version_{index}"] = Max(f"{lookup}__{VERSION_FIELD}")
+        if lookup_path(model_class, lookup)[1]:
+            aggregates[f"count_{index}"] = Count(lookup, distinct=True)
+
+    values = model_class.objects.filter(pk=pk).aggregate(**aggregates)
+    if values["version"] is None:
+        return None
+    return version_tag(values), latest(values)
+
+
+def _table_aggregate(
+    model_class: type[Model], function: str, field_name: str, output_field
+) -> Subquery:
+    # Func() rather than Count()/Max(), so that the subquery isn't grouped
+    return Subquery(
+        model_class.objects.order_by()
+        .annotate(value=Func(F(field_name), function=function))
+        .values("value")[:1],
+        output_field=output_field,
+    )
+
+
+def collection_version(model_class: type[Model], schema: type[BaseModel]) -> str:
+    """
+    The version tag of lists of model_class rendered with schema, however
+    they are filtered or paginated.
+    """
+    select, prefetch = related_lookups(schema, model_class)
+    related_models = {
+        lookup_path(model_class, lookup)[0] for lookup in select + prefetch
+    }
+    related_models.discard(model_class)
+
+    aggregates = {"count": Count("pk"), "version": Max(VERSION_FIELD)}
+    for related_model in sorted(related_models, key=lambda m: m._meta.label):
+        label = related_model._meta.label_lower
+        aggregates[f"{label}_count"] = Max(
+            _table_aggregate(related_model, "COUNT", "pk", IntegerField())
+        )
+        aggregates[f"{label}_version"] = Max(
+            _table_aggregate(related_model, "MAX", VERSION_FIELD, DateTimeField())
+        )
+
+    return version_tag(model_class.objects.aggregate(**aggregates))
+
+
+def bump_versions(model_class: type[Model], pks) -> None:
+    """
+    Stamp the objects with the given primary keys as changed, without
+    sending post_save for them.
+    """
+    if pks:
+        model_class.objects.filter(pk__in=pks).update(**{VERSION_FIELD: timezone.now()})
+
+
+def linked_pks(
+    instance: Model, through: Optional[type[Model]] = None
+) -> dict[type[Model], set]:
+    """
+    The primary keys of the objects linked to instance through its
+    many-to-many relations, or only through the given through model, by
+    related model.
+    """
+    model_class = type(instance)
+    plan = get_write_plan(model_class._meta.app_label, model_class._meta.model_name)
+
+    pks: dict[type[Model], set] = {}
+    for handler in plan.m2m_handlers.values():
+        if through is not None and handler.through is not through:
+            continue
+        pks.setdefault(handler.related_model, set()).update(
+            handler.through.objects.filter(
+                **{handler.source_column: instance.pk}
+            ).values_list(handler.target_column, flat=True)
+        )
+    return pks
+
+
+def on_m2m_changed(
+    sender: type[Model],
+    instance: Model,
+    action: str,
+    model: type[Model],
+    pk_set: Optional[set],
+    **kwargs,
+) -> None:
+    # Both ends of a link render it, so both are bumped
+    if instance._meta.app_label != "books_api":
+        return
+
+    if action == "pre_clear":
+        instance._versions_cleared_pks = linked_pks(instance, sender).get(model)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if action == "post_clear":
+            pk_set = getattr(instance, "_versions_cleared_pks", None)
+        bump_versions(type(instance), [instance.pk])
+        bump_versions(model, pk_set)
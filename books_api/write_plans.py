@@ -0,0 +1,196 @@
+"""
+Pre-computed "write plans" for the models handled by the helpers in
+books_api.helpers.
+
+Resolving a model with apps.get_model() and inspecting every payload
+attribute with _meta.get_field() on each request is wasted work, as the
+answers never change while the app registry stays the same. Instead, the
+plan for each model is built once, when the app is ready, and looked up by
+(app_label, model_name) afterwards.
+
+Plans are dropped whenever the app registry changes (a model class being
+(re)created, or INSTALLED_APPS being overridden in tests) and are rebuilt
+lazily on next use.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from django.apps import AppConfig, apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import NOT_PROVIDED, Model
+from django.db.models.fields.related import ForeignKey, ManyToManyField
+
+
+@dataclass(frozen=True)
+class FieldHandler:
+    """
+    How a single payload attribute is written to a model instance.
+
+    Plain fields are assigned with setattr(). Foreign keys additionally
+    need the referenced row to be resolved, so carry the related model and
+    the error message reported when it does not exist.
+    """
+
+    name: str
+    attname: str
+    related_model: Optional[type[Model]] = None
+    related_error: Optional[str] = None
+    db_default: bool = False
+
+    @property
+    def is_foreign_key(self) -> bool:
+        return self.related_model is not None
+
+
+@dataclass(frozen=True)
+class ManyToManyHandler:
+    """
+    How the ids supplied for a many-to-many relation, in either direction,
+    are written: as rows of the relation's through model, linking
+    source_column (this model) to target_column (the related model).
+    """
+
+    name: str
+    related_model: type[Model]
+    through: type[Model]
+    source_column: str
+    target_column: str
+    related_error: str
+
+
+@dataclass(frozen=True)
+class WritePlan:
+    model: type[Model]
+    not_found_error: str
+    handlers: dict[str, FieldHandler]
+    m2m_handlers: dict[str, ManyToManyHandler]
+    unique_fields: list[str]
+    # Fields that save() stamps with the current time, which therefore have
+    # to be written whenever any other field is
+    auto_now_fields: list[str]
+
+    def handler(self, attr: str) -> FieldHandler:
+        try:
+            return self.handlers[attr]
+        except KeyError:
+            raise FieldDoesNotExist(
+                f"{self.model._meta.object_name} has no writable field named '{attr}'"
+            )
+
+
+_write_plans: dict[tuple[str, str], WritePlan] = {}
+
+
+def build_write_plan(model_class: type[Model]) -> WritePlan:
+    handlers: dict[str, FieldHandler] = {}
+
+    for field_meta in model_class._meta.concrete_fields:
+        if field_meta.primary_key:
+            continue
+
+        db_default = field_meta.db_default is not NOT_PROVIDED
+
+        if isinstance(field_meta, ForeignKey):
+            related_model = field_meta.related_model
+            # Ninja treats "fk_field" and "fk_field_id" the same, so both names
+            # are mapped to the same handler. For the purpose of reporting the
+            # attribute name, the "_id" suffixed form is always used.
+            handler = FieldHandler(
+                name=field_meta.name,
+                attname=field_meta.attname,
+                related_model=related_model,
+                related_error=f"{related_model._meta.object_name} referenced by '{field_meta.attname}' does not exist",
+                db_default=db_default,
+            )
+        else:
+            handler = FieldHandler(
+                name=field_meta.name,
+                attname=field_meta.attname,
+                db_default=db_default,
+            )
+
+        handlers[field_meta.name] = handler
+        handlers[field_meta.attname] = handler
+
+    m2m_handlers: dict[str, ManyToManyHandler] = {}
+
+    for field_meta in model_class._meta.get_fields():
+        if not field_meta.many_to_many:
+            continue
+
+        if isinstance(field_meta, ManyToManyField):
+            # Forward relation, e.g. Author.books
+            name = field_meta.name
+            source_column = field_meta.m2m_column_name()
+            target_column = field_meta.m2m_reverse_name()
+        else:
+            # Reverse relation, e.g. Book.authors
+            name = field_meta.get_accessor_name()
+            source_column = field_meta.field.m2m_reverse_name()
+            target_column = field_meta.field.m2m_column_name()
+
+        related_model = field_meta.related_model
+        m2m_handlers[name] = ManyToManyHandler(
+            name=name,
+            related_model=related_model,
+            through=(
+                field_meta.remote_field.through
+                if isinstance(field_meta, ManyToManyField)
+                else field_meta.through
+            ),
+            source_column=source_column,
+            target_column=target_column,
+            related_error=f"{related_model._meta.object_name} referenced by '{name}' does not exist",
+        )
+
+    return WritePlan(
+        model=model_class,
+        not_found_error=f"Requested {model_class._meta.object_name} object does not exist",
+        handlers=handlers,
+        m2m_handlers=m2m_handlers,
+        unique_fields=[
+            field_meta.name
+            for field_meta in model_class._meta.concrete_fields
+            if field_meta.unique and not field_meta.primary_key
+        ],
+        auto_now_fields=[
+            field_meta.name
+            for field_meta in model_class._meta.concrete_fields
+            if getattr(field_meta, "auto_now", False)
+        ],
+    )
+
+
+def get_write_plan(app_label: str, model_name: str) -> WritePlan:
+    """
+    Return the write plan for a model, building it if it hasn't been yet.
+    As with apps.get_model(), model_name is case-insensitive.
+    """
+    key = (app_label, model_name.lower())
+    try:
+        return _write_plans[key]
+    except KeyError:
+        plan = build_write_plan(apps.get_model(app_label, model_name))
+        _write_plans[key] = plan
+        return plan
+
+
+def build_write_plans(app_config: AppConfig) -> None:
+    for model_class in app_config.get_models():
+        _write_plans[(app_config.label, model_class._meta.model_name)] = (
+            build_write_plan(model_class)
+        )
+
+
+def clear_write_plans(**kwargs) -> None:
+    _write_plans.clear()
+
+
+def on_class_prepared(sender: type[Model], **kwargs) -> None:
+    _write_plans.pop((sender._meta.app_label, sender._meta.model_name), None)
+
+
+def on_setting_changed(setting: str, **kwargs) -> None:
+    if setting == "INSTALLED_APPS":
+        clear_write_plans()
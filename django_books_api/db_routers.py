@@ -0,0 +1,114 @@
+"""
+Routing of reads to read replicas, and writes to the primary ("default")
+database.
+
+Replicas are listed, by alias, in the BOOKS_API_DATABASE_REPLICAS setting,
+and each read is sent to one of them at random. Reads go to the primary
+instead when:
+
+- They are made within a transaction on the primary, whose own writes a
+  replica can't see yet.
+- They are pinned to it with books_api.database.pin_to_primary(), as the
+  write helpers in books_api.helpers are.
+- The request is a write, or comes from a client that has written within
+  the last BOOKS_API_READ_YOUR_WRITES_SECONDS (see
+  ReadYourWritesMiddleware), so that clients see their own writes despite
+  replication lag.
+
+Responses cached by books_api.cache may have been built from a replica, so
+may be up to the replication lag older than the write that last evicted
+them.
+"""
+
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+
+from books_api.database import pin_to_primary, primary_pinned
+
+READ_YOUR_WRITES_COOKIE = "books_api_primary_until"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "BOOKS_API_DATABASE_REPLICAS", [])
+        if (
+            not replicas
+            or primary_pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin write requests to the primary database and, via a cookie, the
+    requests a client makes for BOOKS_API_READ_YOUR_WRITES_SECONDS after a
+    successful write. Serves both WSGI and ASGI requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self._pinned(request):
+            return self.get_response(request)
+
+        with pin_to_primary():
+            response = self.get_response(request)
+        self._remember_write(request, response)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self._pinned(request):
+            return await self.get_response(request)
+
+        # Copied into the context of any sync_to_async() the view runs in
+        with pin_to_primary():
+            response = await self.get_response(request)
+        self._remember_write(request, response)
+        return response
+
+    @staticmethod
+    def _pinned(request: HttpRequest) -> bool:
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            pinned_until = float(request.COOKIES.get(READ_YOUR_WRITES_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return pinned_until > time.time()
+
+    @staticmethod
+    def _remember_write(request: HttpRequest, response: HttpResponse) -> None:
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            window = settings.BOOKS_API_READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE,
+                str(time.time() + window),
+                max_age=window,
+                httponly=True,
+                samesite="Lax",
+            )
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,7 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "books_api.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "django_books_api.db_routers.ReadYourWritesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -77,10 +82,78 @@ WSGI_APPLICATION = "django_books_api.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        # Overridden by the load benchmark, to serve its own seeded database
+        "NAME": os.environ.get("BOOKS_API_DATABASE_PATH", BASE_DIR / "db.sqlite3"),
     }
 }
 
+# "development" uses SQLite's defaults and a connection per request.
+# "production" keeps connections open between requests and tunes SQLite for
+# concurrent readers and writers, with the PRAGMAs below applied to every new
+# connection (see books_api.database).
+# "production-asgi" tunes SQLite as "production" does, but with a connection
+# per request, for the ASGI deployment (gunicorn.conf.py). Its views query
+# through sync_to_async(), from threads that outlive the request, and
+# persistent connections left open in those threads are never closed at the
+# end of a request as Django closes them under WSGI.
+BOOKS_API_DATABASE_PROFILE = os.environ.get("BOOKS_API_DATABASE_PROFILE", "development")
+
+if BOOKS_API_DATABASE_PROFILE in ("production", "production-asgi"):
+    DATABASES["default"].update(
+        {
+            # Take the write lock when a transaction begins, so that it waits
+            # for the lock rather than failing (see books_api.backends.sqlite3)
+            "ENGINE": "books_api.backends.sqlite3",
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+            "CONN_MAX_AGE": 600 if BOOKS_API_DATABASE_PROFILE == "production" else 0,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    )
+    BOOKS_API_SQLITE_PRAGMAS = {
+        # Readers no longer block the writer, nor the writer readers
+        "journal_mode": "WAL",
+        # Safe with WAL: a power loss may lose the last commits, but can't
+        # corrupt the database
+        "synchronous": "NORMAL",
+        # Wait up to 20s for another connection's write lock, rather than
+        # failing with "database is locked"
+        "busy_timeout": 20000,
+        "mmap_size": 256 * 1024 * 1024,
+        # Negative sizes are in KiB, so 64 MiB of page cache per connection
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    }
+elif BOOKS_API_DATABASE_PROFILE == "development":
+    BOOKS_API_SQLITE_PRAGMAS = {}
+else:
+    raise ImproperlyConfigured(
+        f"Unknown BOOKS_API_DATABASE_PROFILE '{BOOKS_API_DATABASE_PROFILE}'"
+    )
+
+# Read replicas of the primary ("default") database, by alias. GET requests
+# read from these unless pinned to the primary (see django_books_api.db_routers).
+# For local testing, BOOKS_API_REPLICA_DATABASE_PATHS lists SQLite files
+# (separated by os.pathsep) to use as replicas, copied from the primary's file
+# with, for example, sqlite3 db.sqlite3 ".backup replica.sqlite3".
+BOOKS_API_DATABASE_REPLICAS = []
+for path in filter(
+    None, os.environ.get("BOOKS_API_REPLICA_DATABASE_PATHS", "").split(os.pathsep)
+):
+    alias = f"replica_{len(BOOKS_API_DATABASE_REPLICAS) + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": path,
+        # Tests read the test database through the replica aliases
+        "TEST": {"MIRROR": "default"},
+    }
+    BOOKS_API_DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["django_books_api.db_routers.PrimaryReplicaRouter"]
+
+# How long, in seconds, a client's reads stay pinned to the primary after it
+# writes, so that it sees its own writes however far the replicas lag behind
+BOOKS_API_READ_YOUR_WRITES_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -122,3 +195,49 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Django Ninja
+# https://django-ninja.dev/guides/response/pagination/
+
+# Default and maximum page sizes for paginated list endpoints
+NINJA_PAGINATION_PER_PAGE = 100
+NINJA_PAGINATION_MAX_LIMIT = 1000
+
+
+# Books API
+
+# Cache GET responses, evicting them when the rows they were built from change.
+# Disabled while None; set to, for example, {"BACKEND": "locmem",
+# "MAX_ENTRIES": 1000} to enable it. The "locmem" backend suits single-process
+# deployments only. See books_api.cache for the options.
+BOOKS_API_RESPONSE_CACHE = None
+
+# Serve Book GET responses from JSON documents stored ahead of time, and keep
+# those documents up to date as rows change. Backfill them with the
+# book_documents management command before enabling. See books_api.documents.
+BOOKS_API_BOOK_DOCUMENTS = False
+
+# Cache the results of the statistics endpoints (/api/v2/stats/...) in one of
+# the CACHES, for TIMEOUT seconds or until the next write. See books_api.stats.
+BOOKS_API_STATS_CACHE = {"CACHE_ALIAS": "default", "TIMEOUT": 60}
+
+# Serialise GET responses built from database rows without validating each
+# object with pydantic (see books_api.serialisation). The responses are the
+# same either way.
+BOOKS_API_FAST_SERIALISATION = True
+
+# Log a warning for any request running more than this many database queries,
+# to catch N+1 query regressions; None to never warn. See books_api.metrics.
+BOOKS_API_QUERY_COUNT_WARNING = 20
+
+# Where files uploaded for background jobs, such as feeds to import, are kept
+# until the job has run. Must be shared with the run_jobs workers. See
+# books_api.jobs.
+BOOKS_API_JOB_FILES_DIR = os.environ.get(
+    "BOOKS_API_JOB_FILES_DIR", BASE_DIR / "job_files"
+)
+
+# Serve the API's routes as async views. Set by the ASGI deployment profile
+# (gunicorn.conf.py); leave off when serving with WSGI (uwsgi.ini).
+BOOKS_API_SERVE_ASYNC = os.environ.get("BOOKS_API_SERVE_ASYNC", "") == "1"
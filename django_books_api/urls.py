@@ -15,13 +15,42 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from ninja import NinjaAPI
 
 from autodojo import AutoDojoRouter
 
-from books_api.extra import router as extras_router
+from books_api.extra import (
+    author_router as author_extras_router,
+    category_router as category_extras_router,
+    jobs_router,
+    publisher_router as publisher_extras_router,
+    router as extras_router,
+    stats_router,
+)
+from books_api.metrics import metrics_view
+from books_api.operations import (
+    cache_get_responses,
+    conditional_get_responses,
+    filter_list_responses,
+    load_related_for_responses,
+    paginate_list_responses,
+    report_conflicts,
+    select_response_fields,
+    serialise_get_responses,
+    serve_async,
+    serve_book_documents,
+    serve_writes_async,
+)
+from books_api.pagination import CursorPagination
+from books_api.renderers import ORJSONRenderer
+from books_api.schemas import (
+    AuthorFilterSchema,
+    BookFilterSchema,
+    CategoryFilterSchema,
+)
 
 # Experimental "V2" for auto-generated router, including ModelSchema
 # and views etc.
@@ -49,16 +78,119 @@ authors_adr = AutoDojoRouter(
 categories_adr = AutoDojoRouter(app_label="books_api", model="Category")
 publishers_adr = AutoDojoRouter(app_label="books_api", model="Publisher")
 
-api_v2 = NinjaAPI()
+# Load the related rows needed by each generated GET response up front, so that
+# list responses cost a fixed number of queries, whatever their length.
+load_related_for_responses(books_adr.add_router_args[1], "books_api", "Book")
+load_related_for_responses(authors_adr.add_router_args[1], "books_api", "Author")
+load_related_for_responses(categories_adr.add_router_args[1], "books_api", "Category")
+load_related_for_responses(publishers_adr.add_router_args[1], "books_api", "Publisher")
+
+# Respond 409 when a PATCH or PUT would duplicate a unique value, such as an ISBN
+report_conflicts(books_adr.add_router_args[1])
+report_conflicts(authors_adr.add_router_args[1])
+report_conflicts(categories_adr.add_router_args[1])
+report_conflicts(publishers_adr.add_router_args[1])
+
+# Exact-match filters on the indexed lookup columns
+filter_list_responses(books_adr.add_router_args[1], BookFilterSchema)
+filter_list_responses(authors_adr.add_router_args[1], AuthorFilterSchema)
+filter_list_responses(categories_adr.add_router_args[1], CategoryFilterSchema)
+
+# Serve repeated reads from the response cache, when BOOKS_API_RESPONSE_CACHE
+# enables it. This must come before pagination is applied (see
+# cache_get_responses()).
+cache_get_responses(books_adr.add_router_args[1], "books_api", "Book")
+cache_get_responses(authors_adr.add_router_args[1], "books_api", "Author")
+cache_get_responses(categories_adr.add_router_args[1], "books_api", "Category")
+cache_get_responses(publishers_adr.add_router_args[1], "books_api", "Publisher")
+# Search results can change with any Book, Author, Category or Publisher,
+# rather than only with the objects they render, so aren't cached. Nor are the
+# maps of related ids for many Books, which render no objects to tag them with.
+cache_get_responses(
+    extras_router,
+    "books_api",
+    "Book",
+    path_param_models={"id": "Book"},
+    exclude=["search_books", "get_authors_of_books", "get_categories_of_books"],
+)
+
+# Answer conditional requests from the models' version stamps, with 304 Not
+# Modified when nothing a response renders has changed. Also applied before
+# pagination.
+conditional_get_responses(books_adr.add_router_args[1], "books_api", "Book")
+conditional_get_responses(authors_adr.add_router_args[1], "books_api", "Author")
+conditional_get_responses(categories_adr.add_router_args[1], "books_api", "Category")
+conditional_get_responses(publishers_adr.add_router_args[1], "books_api", "Publisher")
+
+# Page through the generated list endpoints with keyset pagination, rather than
+# returning whole tables.
+paginate_list_responses(books_adr.add_router_args[1], CursorPagination)
+paginate_list_responses(authors_adr.add_router_args[1], CursorPagination)
+paginate_list_responses(categories_adr.add_router_args[1], CursorPagination)
+paginate_list_responses(publishers_adr.add_router_args[1], CursorPagination)
+
+# Send Book responses from their stored documents, when BOOKS_API_BOOK_DOCUMENTS
+# enables them, rather than serialising each Book per request. Applied after
+# pagination (see serve_book_documents()).
+serve_book_documents(books_adr.add_router_args[1])
+
+# Serialise the objects of generated GET responses with extractors compiled from
+# their response schemas, rather than validating each one with pydantic. Also
+# applied after pagination, and after serve_book_documents().
+serialise_get_responses(books_adr.add_router_args[1], "books_api", "Book")
+serialise_get_responses(authors_adr.add_router_args[1], "books_api", "Author")
+serialise_get_responses(categories_adr.add_router_args[1], "books_api", "Category")
+serialise_get_responses(publishers_adr.add_router_args[1], "books_api", "Publisher")
+
+# Let Book and Author clients ask for only the fields they need, with
+# ?fields=id,title,publisher.name, narrowing the queries to match. Applied last
+# of the view function wrappers (see select_response_fields()).
+select_response_fields(books_adr.add_router_args[1], "books_api", "Book")
+select_response_fields(authors_adr.add_router_args[1], "books_api", "Author")
+
+# Serve every route from the event loop, for the ASGI deployment (see
+# gunicorn.conf.py). Under WSGI, async views would only add the cost of an event
+# loop per request.
+if settings.BOOKS_API_SERVE_ASYNC:
+    async_routers = (
+        extras_router,
+        author_extras_router,
+        category_extras_router,
+        publisher_extras_router,
+        stats_router,
+        jobs_router,
+        books_adr.add_router_args[1],
+        authors_adr.add_router_args[1],
+        categories_adr.add_router_args[1],
+        publishers_adr.add_router_args[1],
+    )
+    # The generated writes run through the async helpers of books_api.helpers,
+    # before serve_async() wraps what is left
+    serve_writes_async(books_adr.add_router_args[1], "books_api", "Book")
+    serve_writes_async(authors_adr.add_router_args[1], "books_api", "Author")
+    serve_writes_async(categories_adr.add_router_args[1], "books_api", "Category")
+    serve_writes_async(publishers_adr.add_router_args[1], "books_api", "Publisher")
+    for router in async_routers:
+        serve_async(router)
+
+api_v2 = NinjaAPI(renderer=ORJSONRenderer())
+# Manually written routes are registered ahead of the AutoDojo generated ones
+# so that fixed paths, such as "/book/bulk", are matched before the generated
+# "/book/{id}" detail routes get the chance to.
+api_v2.add_router("/book/", extras_router)
+api_v2.add_router("/author/", author_extras_router)
+api_v2.add_router("/category/", category_extras_router)
+api_v2.add_router("/publisher/", publisher_extras_router)
+api_v2.add_router("/stats/", stats_router)
+api_v2.add_router("/jobs/", jobs_router)
 api_v2.add_router(*books_adr.add_router_args)
 api_v2.add_router(*authors_adr.add_router_args)
 api_v2.add_router(*categories_adr.add_router_args)
 api_v2.add_router(*publishers_adr.add_router_args)
 
-api_v2.add_router("/book/", extras_router)
-
 urlpatterns = [
     path("admin/", admin.site.urls),
     # path("api/v1/", api_v1.urls),
     path("api/v2/", api_v2.urls),
+    path("metrics", metrics_view),
 ]
@@ -0,0 +1,19 @@
+# ASGI deployment profile: gunicorn managing uvicorn workers, each serving
+# the API's async views from an event loop. The WSGI profile is uwsgi.ini.
+#
+#   gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+chdir = "/app"
+wsgi_app = "django_books_api.asgi:application"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+pidfile = "/tmp/books-api-gunicorn.pid"
+max_requests = 1000
+raw_env = [
+    "BOOKS_API_SERVE_ASYNC=1",
+    # Connections aren't kept between requests under ASGI (see settings.py)
+    "BOOKS_API_DATABASE_PROFILE=production-asgi",
+]
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the books API.
+
+Each benchmark is a runnable module, run from the repository root, e.g.:
+
+    python -m testing.bench.export_books --rows 10000 100000
+
+Benchmarks run against a throwaway SQLite database file, created and
+migrated for the run, so they never touch db.sqlite3.
+"""
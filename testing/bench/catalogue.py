@@ -0,0 +1,22 @@
+"""
+Synthetic catalogues for benchmarks, generated by books_api.seeding (whose
+docstring describes their shape), with the sizes benchmarks default to.
+
+Import this once Django is set up (see environment.setup_django()).
+"""
+
+from books_api.seeding import seed_catalogue as seed_synthetic_catalogue
+
+
+def seed_catalogue(
+    books: int,
+    publishers: int = 100,
+    authors: int = 1000,
+    categories: int = 50,
+    seed: int = 0,
+) -> None:
+    """
+    Fill the database with the requested number of books, and the
+    publishers, authors and categories they are spread across.
+    """
+    seed_synthetic_catalogue(books, publishers, authors, categories, seed=seed)
@@ -0,0 +1,57 @@
+"""
+Django setup shared by the benchmark modules.
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def setup_django() -> None:
+    if str(REPOSITORY_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPOSITORY_ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_books_api.settings")
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    # As under the test runner, run without DEBUG, so that every query isn't
+    # also kept in connection.queries
+    settings.DEBUG = False
+
+
+@contextmanager
+def benchmark_database() -> Iterator[Path]:
+    """
+    Create and migrate a temporary SQLite database file for the duration of
+    a benchmark, in the same way the test runner creates its test database.
+    A file is used rather than SQLite's in-memory database so that the
+    database's pages don't count towards the process's memory use.
+    """
+    from django.db import connection
+    from django.test.utils import setup_databases, teardown_databases
+
+    with tempfile.TemporaryDirectory(prefix="books-api-bench-") as directory:
+        database_path = Path(directory) / "bench.sqlite3"
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = str(database_path)
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            yield database_path
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KiB on Linux, but in bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
@@ -0,0 +1,95 @@
+"""
+Benchmark the streaming catalogue export (GET /api/v2/book/export).
+
+For each catalogue size, a fresh process seeds a temporary database and then
+consumes the export body, reporting rows per second and the peak resident
+set size. As the export streams, peak memory should stay roughly flat as the
+number of rows grows.
+
+    python -m testing.bench.export_books --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from testing.bench.environment import benchmark_database, peak_rss_mb, setup_django
+
+
+def run_export(rows: int, export_format: str, chunk_size: int) -> dict:
+    setup_django()
+
+    from books_api.export import iter_book_export
+    from testing.bench.catalogue import seed_catalogue
+
+    with benchmark_database():
+        seed_catalogue(rows)
+        rss_after_seeding = peak_rss_mb()
+
+        body_bytes = 0
+        started = time.perf_counter()
+        for piece in iter_book_export(export_format, chunk_size):
+            body_bytes += len(piece.encode())
+        elapsed = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        "format": export_format,
+        "chunk_size": chunk_size,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed),
+        "body_mb": round(body_bytes / (1024 * 1024), 1),
+        "peak_rss_mb_after_seeding": round(rss_after_seeding, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument(
+        "--single", action="store_true", help="Run one size in this process"
+    )
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_export(args.rows[0], args.format, args.chunk_size)))
+        return
+
+    # Each size runs in its own process, so that peak RSS isn't carried over
+    # from a previous, larger, run.
+    for rows in args.rows:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "testing.bench.export_books",
+                "--single",
+                "--rows",
+                str(rows),
+                "--format",
+                args.format,
+                "--chunk-size",
+                str(args.chunk_size),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+        print(
+            f"{result['rows']:>9} rows: {result['rows_per_second']:>7} rows/s, "
+            f"{result['body_mb']:>7} MiB body, "
+            f"peak RSS {result['peak_rss_mb']} MiB "
+            f"({result['peak_rss_mb_after_seeding']} MiB after seeding)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Load test the API served by the sync (uWSGI) and async (gunicorn + uvicorn)
+deployment profiles, reporting requests per second and latency percentiles.
+
+Both stacks serve the same seeded, temporary database. The client keeps the
+requested number of connections busy for the duration of each run, each
+requesting random book details and author lists back to back.
+
+    python -m testing.bench.load_api --clients 500 --duration 30 --workers 4
+
+uWSGI, gunicorn and uvicorn need to be installed (pip install uwsgi
+gunicorn uvicorn).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from testing.bench.environment import REPOSITORY_ROOT, benchmark_database, setup_django
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(stack: str, port: int, workers: int) -> list[str]:
+    if stack == "sync":
+        # The WSGI profile, with its chdir and socket replaced for the run
+        return [
+            "uwsgi",
+            "--ini",
+            str(REPOSITORY_ROOT / "uwsgi.ini"),
+            "--chdir",
+            str(REPOSITORY_ROOT),
+            "--http",
+            f"127.0.0.1:{port}",
+            "--processes",
+            str(workers),
+            "--disable-logging",
+            "--http-keepalive",
+            # Otherwise uWSGI reloads, rather than exits, on SIGTERM
+            "--die-on-term",
+        ]
+    return [
+        "gunicorn",
+        "--config",
+        str(REPOSITORY_ROOT / "gunicorn.conf.py"),
+        "--chdir",
+        str(REPOSITORY_ROOT),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--workers",
+        str(workers),
+    ]
+
+
+@contextmanager
+def running_server(
+    stack: str, port: int, workers: int, database_path: Path
+) -> Iterator[None]:
+    env = dict(os.environ, BOOKS_API_DATABASE_PATH=str(database_path))
+    if stack == "async":
+        env["BOOKS_API_SERVE_ASYNC"] = "1"
+
+    process = subprocess.Popen(
+        server_command(stack, port, workers),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"The {stack} server didn't start")
+                time.sleep(0.2)
+        yield
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, bool]:
+    """
+    Read one HTTP/1.1 response, returning its status code and whether the
+    server will keep the connection open.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(":") for line in lines[1:] if line)
+    }
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def client(
+    port: int, paths: list[str], stop_at: float, latencies: list[float], errors: list
+) -> None:
+    rng = random.Random()
+    writer = None
+    while time.perf_counter() < stop_at:
+        path = rng.choice(paths)
+        started = time.perf_counter()
+        try:
+            # Connecting is part of the request's latency, as it is for a
+            # client whose connection the server didn't keep open
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1")
+            )
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            errors.append(type(exc).__name__)
+            status, keep_alive = None, False
+        else:
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def generate_load(
+    port: int, paths: list[str], clients: int, duration: float
+) -> dict:
+    latencies: list[float] = []
+    errors: list = []
+    started = time.perf_counter()
+    stop_at = started + duration
+    await asyncio.gather(
+        *(client(port, paths, stop_at, latencies, errors) for _ in range(clients))
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(fraction: float) -> float:
+        if not latencies:
+            return 0.0
+        return round(latencies[int(fraction * (len(latencies) - 1))] * 1000, 1)
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed),
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--stacks", nargs="+", choices=["sync", "async"])
+    args = parser.parse_args()
+
+    setup_django()
+
+    from books_api.models import Book
+    from testing.bench.catalogue import seed_catalogue
+
+    with benchmark_database() as database_path:
+        seed_catalogue(args.books)
+        book_ids = list(Book.objects.values_list("pk", flat=True))
+        paths = [f"/api/v2/book/{pk}" for pk in book_ids] + [
+            f"/api/v2/book/{pk}/authors" for pk in book_ids
+        ]
+
+        for stack in args.stacks or ["sync", "async"]:
+            port = free_port()
+            with running_server(stack, port, args.workers, database_path):
+                result = asyncio.run(
+                    generate_load(port, paths, args.clients, args.duration)
+                )
+            print(json.dumps({"stack": stack, "clients": args.clients, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Replay a weighted mix of requests against the WSGI application, in-process,
+from a number of concurrent worker threads, reporting requests per second
+and p50/p95/p99 latency for each route of the mix.
+
+A temporary database is seeded with a synthetic catalogue of the requested
+size first. The mix is a JSONL file, one route per line:
+
+    {"name": "book_detail", "method": "GET", "path": "/api/v2/book/{book_id}",
+     "weight": 30}
+    {"name": "book_patch", "method": "PATCH", "path": "/api/v2/book/{book_id}",
+     "body": {"rrp": "12.50"}, "weight": 2}
+
+Each {book_id}, {author_id}, {publisher_id}, {category_id} and {title_word}
+in a path is replaced, for each request, by one drawn at random from the
+catalogue. Requests are drawn from the routes in proportion to their
+weights. The default mix is testing/bench/mixes/default.jsonl.
+
+Results are printed, and saved with --output, as JSON. Responses with an
+error status (400 or above) are counted per route, and the run exits with
+status 1 if more than --max-error-rate (a fraction, none by default) of its
+requests failed, as a benchmark of failing requests measures nothing.
+Given the results of an earlier run with --baseline, routes whose p95
+latency or error rate grew, or whose requests per second fell, by more
+than --threshold (a fraction) are reported, and the run also exits with
+status 1:
+
+    python -m testing.bench.replay --books 10000 --workers 8 --requests 20000 \\
+        --output results.json
+    python -m testing.bench.replay --books 10000 --workers 8 --requests 20000 \\
+        --baseline results.json --threshold 0.1
+
+Only the WSGI stack is exercised, without a server in front of it; see
+load_api for serving over HTTP.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+from testing.bench.environment import benchmark_database, setup_django
+
+DEFAULT_MIX = Path(__file__).resolve().parent / "mixes" / "default.jsonl"
+
+# The placeholders paths may have, replaced by values from the catalogue
+PLACEHOLDER = re.compile(r"\{(book_id|author_id|publisher_id|category_id|title_word)\}")
+
+
+def load_mix(path: Path) -> list[dict]:
+    routes = []
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        route = json.loads(line)
+        route.setdefault("name", f"{route['method']} {route['path']}")
+        route.setdefault("weight", 1)
+        routes.append(route)
+    return routes
+
+
+def catalogue_values() -> dict[str, list]:
+    from books_api.models import Author, Book, Category, Publisher
+    from books_api.seeding import TITLE_WORDS
+
+    return {
+        "book_id": list(Book.objects.values_list("pk", flat=True)),
+        "author_id": list(Author.objects.values_list("pk", flat=True)),
+        "publisher_id": list(Publisher.objects.values_list("pk", flat=True)),
+        "category_id": list(Category.objects.values_list("pk", flat=True)),
+        "title_word": list(TITLE_WORDS),
+    }
+
+
+def plan_requests(
+    routes: list[dict], values: dict[str, list], count: int, seed: int
+) -> list[tuple[str, str, str, bytes]]:
+    """count (route name, method, path, body) requests drawn from the mix."""
+    rng = random.Random(seed)
+    weights = [route["weight"] for route in routes]
+    planned = []
+    for route in rng.choices(routes, weights, k=count):
+        path = PLACEHOLDER.sub(
+            lambda match: str(rng.choice(values[match.group(1)])), route["path"]
+        )
+        body = json.dumps(route["body"]).encode() if "body" in route else b""
+        planned.append((route["name"], route["method"], path, body))
+    return planned
+
+
+def call_application(application, method: str, path: str, body: bytes) -> int:
+    """Run one request through a WSGI application, returning its status."""
+    path_info, _, query_string = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": query_string,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    result = application(environ, start_response)
+    try:
+        # Read the whole body, as a server would, streamed or not
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return statuses[0]
+
+
+def percentile(latencies: list[float], fraction: float) -> float:
+    """The latency, in ms, below which fraction of sorted latencies fall."""
+    if not latencies:
+        return 0.0
+    return round(latencies[int(fraction * (len(latencies) - 1))] * 1000, 2)
+
+
+def summarise(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def replay(application, planned: list[tuple], workers: int) -> dict:
+    """
+    Run the planned requests from workers threads, each taking the next
+    request as soon as its last one is answered.
+    """
+    next_index = itertools.count()
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def work() -> None:
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        while (index := next(next_index)) < len(planned):
+            name, method, path, body = planned[index]
+            started = time.perf_counter()
+            status = call_application(application, method, path, body)
+            local_latencies[name].append(time.perf_counter() - started)
+            if status >= 400:
+                local_errors[name] += 1
+        with lock:
+            for name, values in local_latencies.items():
+                latencies[name].extend(values)
+            for name, count in local_errors.items():
+                errors[name] += count
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Each route's rate is its share of the run's throughput
+    return {
+        "total": summarise(
+            [value for values in latencies.values() for value in values],
+            sum(errors.values()),
+            elapsed,
+        ),
+        "routes": {
+            name: summarise(latencies[name], errors[name], elapsed)
+            for name in sorted(latencies)
+        },
+    }
+
+
+def error_rate(summary: dict) -> float:
+    """The fraction of a route's, or the run's, requests that failed."""
+    return summary["errors"] / summary["requests"] if summary["requests"] else 0.0
+
+
+def failures(results: dict, max_error_rate: float) -> list[str]:
+    """
+    The routes, and the run as a whole ("total"), more than max_error_rate
+    of whose requests failed.
+    """
+    current = {"total": results["total"], **results["routes"]}
+    return [
+        f"{name}: {summary['errors']} of {summary['requests']} requests failed"
+        for name, summary in current.items()
+        if error_rate(summary) > max_error_rate
+    ]
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    The routes, and the run as a whole ("total"), whose p95 latency or error
+    rate grew, or whose requests per second fell, by more than threshold
+    since baseline.
+    """
+    found = []
+    current = {"total": results["total"], **results["routes"]}
+    previous = {"total": baseline["total"], **baseline["routes"]}
+    for name in sorted(current.keys() & previous.keys()):
+        now, before = current[name], previous[name]
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+        if error_rate(now) > error_rate(before) * (1 + threshold):
+            found.append(
+                f"{name}: {before['errors']} -> {now['errors']} errors, of "
+                f"{before['requests']} -> {now['requests']} requests"
+            )
+        if now["requests_per_second"] < before["requests_per_second"] * (1 - threshold):
+            found.append(
+                f"{name}: {before['requests_per_second']} -> "
+                f"{now['requests_per_second']} requests/s"
+            )
+    return found
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mix", type=Path, default=DEFAULT_MIX)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--publishers", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    from testing.bench.catalogue import seed_catalogue
+
+    # Without DEBUG, only the listed hosts are answered
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "localhost"]
+    application = get_wsgi_application()
+    routes = load_mix(args.mix)
+
+    with benchmark_database():
+        seed_catalogue(
+            args.books,
+            publishers=args.publishers,
+            authors=args.authors,
+            categories=args.categories,
+            seed=args.seed,
+        )
+        values = catalogue_values()
+
+        replay(application, plan_requests(routes, values, args.warmup, -1), 1)
+        planned = plan_requests(routes, values, args.requests, args.seed)
+        results = {
+            "config": {
+                "mix": str(args.mix),
+                "books": args.books,
+                "requests": args.requests,
+                "workers": args.workers,
+                "seed": args.seed,
+            },
+            **replay(application, planned, args.workers),
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    failed = failures(results, args.max_error_rate)
+    for failure in failed:
+        print(f"Errors: {failure}", file=sys.stderr)
+
+    found = []
+    if args.baseline:
+        found = regressions(
+            results, json.loads(args.baseline.read_text()), args.threshold
+        )
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+
+    if failed or found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
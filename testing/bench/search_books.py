@@ -0,0 +1,110 @@
+"""
+Benchmark book search (GET /api/v2/book/search) against the substring
+("icontains") search it replaces.
+
+A temporary database is seeded with the requested number of books and the
+full-text index rebuilt. Then, for each kind of query, the first page of
+results is fetched both ways, reporting the median and 95th percentile
+latency in milliseconds:
+
+- "common": one title word, matching several percent of all books.
+- "pair": two title words, matching far fewer.
+- "author": an author's last name, shared by a few percent of authors.
+- "missing": a word no book contains, so nothing can be returned early.
+
+    python -m testing.bench.search_books --books 1000000 --queries 20
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from testing.bench.environment import benchmark_database, setup_django
+
+PAGE_SIZE = 20
+
+
+def query_kinds(rng: random.Random) -> dict:
+    from books_api.seeding import AUTHOR_LAST_NAMES, TITLE_WORDS
+
+    return {
+        "common": lambda: rng.choice(TITLE_WORDS),
+        "pair": lambda: " ".join(rng.sample(TITLE_WORDS, 2)),
+        "author": lambda: rng.choice(AUTHOR_LAST_NAMES),
+        "missing": lambda: f"zz{rng.randrange(1000)}",
+    }
+
+
+def time_ms(fetch_page, query: str) -> float:
+    started = time.perf_counter()
+    fetch_page(query)
+    return (time.perf_counter() - started) * 1000
+
+
+def summarise(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from books_api.search import rebuild_index, search_books, substring_search_books
+    from testing.bench.catalogue import seed_catalogue
+
+    def full_text_page(query: str) -> list:
+        return list(search_books(query).order_by("rank", "pk")[:PAGE_SIZE])
+
+    def substring_page(query: str) -> list:
+        return list(substring_search_books(query).order_by("pk")[:PAGE_SIZE])
+
+    with benchmark_database():
+        seed_catalogue(args.books, authors=args.authors)
+
+        started = time.perf_counter()
+        rebuild_index()
+        print(
+            json.dumps(
+                {
+                    "books": args.books,
+                    "index_rebuild_seconds": round(time.perf_counter() - started, 1),
+                }
+            )
+        )
+
+        rng = random.Random(0)
+        for kind, make_query in query_kinds(rng).items():
+            queries = [make_query() for _ in range(args.queries)]
+            # Warm the page cache, so that neither approach pays for reading
+            # the database from disk
+            full_text_page(queries[0])
+            substring_page(queries[0])
+
+            print(
+                json.dumps(
+                    {
+                        "query": kind,
+                        "full_text": summarise(
+                            [time_ms(full_text_page, query) for query in queries]
+                        ),
+                        "substring": summarise(
+                            [time_ms(substring_page, query) for query in queries]
+                        ),
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
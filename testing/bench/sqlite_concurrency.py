@@ -0,0 +1,198 @@
+"""
+Stress the database with concurrent reads and PATCHes under each database
+profile, reporting throughput and "database is locked" errors.
+
+A seeded catalogue is copied for each profile, and a fresh process then runs
+the requested number of threads against its copy, each with its own
+connection, as each worker thread of a server would have. Every operation is
+wrapped in Django's request_started and request_finished signals, so that
+connections are closed or kept between operations just as they would be
+between requests. Operations are a mix of book list reads, single PATCHes
+(patch_object()) and bulk PATCHes (bulk_patch_objects()).
+
+    python -m testing.bench.sqlite_concurrency --threads 16 --duration 10
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from testing.bench.environment import benchmark_database, setup_django
+
+PROFILES = ["development", "production"]
+
+
+def stress(
+    book_ids: list[int],
+    write_fraction: float,
+    bulk_size: int,
+    stop_at: float,
+    counts: Counter,
+    counts_lock: threading.Lock,
+) -> None:
+    from django.core.signals import request_finished, request_started
+    from django.db import OperationalError, connection
+
+    from books_api.helpers import bulk_patch_objects, patch_object
+    from books_api.models import Book
+    from books_api.schemas import BookInPatchSchema
+
+    rng = random.Random()
+    local_counts: Counter = Counter()
+
+    while time.perf_counter() < stop_at:
+        request_started.send(sender=None)
+        try:
+            choice = rng.random()
+            if choice < write_fraction / 2:
+                patch_object(
+                    "books_api",
+                    "Book",
+                    rng.choice(book_ids),
+                    BookInPatchSchema(title=f"Title {rng.random()}"),
+                )
+                local_counts["writes"] += 1
+            elif choice < write_fraction:
+                bulk_patch_objects(
+                    "books_api",
+                    "Book",
+                    [
+                        (pk, BookInPatchSchema(title=f"Title {rng.random()}"))
+                        for pk in rng.sample(book_ids, bulk_size)
+                    ],
+                )
+                local_counts["writes"] += 1
+            else:
+                start = rng.randrange(len(book_ids))
+                list(
+                    Book.objects.select_related("publisher")
+                    .prefetch_related("authors", "categories")
+                    .order_by("pk")[start : start + 50]
+                )
+                local_counts["reads"] += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            local_counts["lock_errors"] += 1
+        finally:
+            request_finished.send(sender=None)
+
+    connection.close()
+    with counts_lock:
+        counts.update(local_counts)
+
+
+def run_profile(
+    threads: int, duration: float, write_fraction: float, bulk_size: int
+) -> dict:
+    setup_django()
+
+    from django.conf import settings
+
+    from books_api.models import Book
+
+    book_ids = list(Book.objects.values_list("pk", flat=True))
+
+    counts: Counter = Counter()
+    counts_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    workers = [
+        threading.Thread(
+            target=stress,
+            args=(book_ids, write_fraction, bulk_size, stop_at, counts, counts_lock),
+        )
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "profile": settings.BOOKS_API_DATABASE_PROFILE,
+        "threads": threads,
+        "reads_per_second": round(counts["reads"] / elapsed),
+        "writes_per_second": round(counts["writes"] / elapsed),
+        "lock_errors": counts["lock_errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--write-fraction",
+        type=float,
+        default=0.5,
+        help="Fraction of operations that are PATCHes, half of them bulk",
+    )
+    parser.add_argument("--bulk-size", type=int, default=20)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    parser.add_argument(
+        "--single", action="store_true", help="Run one profile in this process"
+    )
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_profile(
+            args.threads, args.duration, args.write_fraction, args.bulk_size
+        )
+        print(json.dumps(result))
+        return
+
+    setup_django()
+
+    from django.db import connection
+
+    from testing.bench.catalogue import seed_catalogue
+
+    with benchmark_database() as database_path:
+        seed_catalogue(args.books)
+        connection.close()
+
+        # Each profile runs in its own process, with the profile selected as
+        # it would be for a server, against its own copy of the catalogue, as
+        # switching to WAL journaling is a property of the database file.
+        for profile in args.profiles:
+            profile_path = database_path.with_name(f"{profile}.sqlite3")
+            shutil.copyfile(database_path, profile_path)
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "testing.bench.sqlite_concurrency",
+                    "--single",
+                    "--threads",
+                    str(args.threads),
+                    "--duration",
+                    str(args.duration),
+                    "--write-fraction",
+                    str(args.write_fraction),
+                    "--bulk-size",
+                    str(args.bulk_size),
+                ],
+                env=dict(
+                    os.environ,
+                    BOOKS_API_DATABASE_PATH=str(profile_path),
+                    BOOKS_API_DATABASE_PROFILE=profile,
+                ),
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            print(output.strip())
+
+
+if __name__ == "__main__":
+    main()